@@ -73,6 +73,8 @@ Wants=bluetooth.target
 Type=simple
 User=$USER
 WorkingDirectory=$HOME/feeder
+RuntimeDirectory=feeder
+RuntimeDirectoryMode=0755
 ExecStartPre=/bin/sleep 10
 ExecStart=/usr/bin/python3 $HOME/feeder/feeder_main.py
 Restart=always
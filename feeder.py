@@ -5,106 +5,171 @@ Harmonogram konfigurowany przez plik JSON
 """
 
 import time
-import json
+import os
 import signal
 import sys
+import threading
 from datetime import datetime
-from gpiozero import Servo
-from gpiozero.pins.pigpio import PiGPIOFactory
-import schedule
 import logging
-
-# Konfiguracja logowania
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('feeder.log'),
-        logging.StreamHandler()
-    ]
-)
+from feeder_scheduler import FeedScheduler, DEFAULT_LATE_WARNING
+from feeder_rules import validate_rule
+from feeder_watch import ConfigWatcher
+from feeder_control import ControlServer, DEFAULT_SOCKET
+from feeder_store import ConfigStore, feeder_configs, default_feeder, parse_dose, DEFAULT_FEEDER
+from feeder_history import open_history, DEFAULT_HISTORY_FILE, DEFAULT_LIMIT
+from feeder_status import open_writer, DEFAULT_STATUS_FILE
+from feeder_actuator import QueueFull, FeedTickets, PRIORITY_MANUAL, PRIORITY_SCHEDULED, MAX_RESULT_WAIT
+from feeder_hopper import Hopper, hoppers_idle, reconcile_hoppers, DEFAULT_POWER_BUDGET
+from feeder_reload import ReloadCoordinator, DEFAULT_QUIET_PERIOD, DEFAULT_REQUEST_TIMEOUT
+from feeder_motion import load_profiles, resolve_profile
+from feeder_logging import setup_logging
+from feeder_metrics import FeederMetrics, feeder_lines
+
+log = logging.getLogger('feeder')
 
 
 class SimpleFeeder:
-    def __init__(self, servo_pin=18, config_file='config.json'):
-        """Inicjalizacja karmnika"""
+    def __init__(self, servo_pin=18, config_file='config.json', control_socket=DEFAULT_SOCKET,
+                 queue_size=4, coalesce_window=5.0, history_file=DEFAULT_HISTORY_FILE,
+                 pin_factory=None, power_budget=None):
+        """
+        Inicjalizacja karmnika
+        servo_pin - GPIO zasobnika 'main', gdy config.json nie ma sekcji "feeders"
+        pin_factory - fabryka pinów gpiozero (domyślnie PiGPIOFactory, w testach MockFactory)
+        power_budget - ile servo może ruszać się naraz (domyślnie z config.json)
+        """
         self.servo_pin = servo_pin
         self.config_file = config_file
-        self.servo = None
-        self.schedules = []
+        self.store = ConfigStore(config_file)
+        self.control_socket = control_socket
+        self.queue_size = queue_size
+        self.coalesce_window = coalesce_window
+        self.pin_factory = pin_factory
+        self.power_budget = power_budget
+        self.power = None
+        self.hoppers = {}
+        self.default_feeder = DEFAULT_FEEDER
+        self.scheduler = FeedScheduler()
+        self.watcher = None
+        self.control = None
+        self.listeners = []
+        self.reload_lock = threading.Lock()
+        # Zgłoszenia zmian config.json scalane w jedno przeładowanie, poza cyklem servo
+        self.reloads = ReloadCoordinator(self.reload_config, hold=lambda: hoppers_idle(self.hoppers))
+        # Karmienia API sterującego zlecone bez czekania (wynik przez feed_result)
+        self.feed_tickets = FeedTickets()
+        self.status_writer = None
+        self.history = open_history(history_file)
+        self.started_at = time.time()
+        self.metrics = FeederMetrics(self.started_at)
+        self.metrics.add_collector(lambda: feeder_lines(self))
         self.running = True
 
-        # Inicjalizacja servo
-        self.init_servo()
-
-        # Wczytaj konfigurację
+        # Wczytaj konfigurację, utwórz zasobniki i załaduj harmonogram
         self.load_config()
+        if not self.hoppers:
+            log.error("Żadne servo nie zostało zainicjalizowane")
+            sys.exit(1)
+        self.reloads.start()
 
-        # Załaduj harmonogram
-        self.setup_schedule()
-
-        logging.info("=== Karmnik uruchomiony ===")
+        log.info("=== Karmnik uruchomiony ===")
         self.print_status()
 
-    def init_servo(self):
-        """Inicjalizacja servo"""
+    def create_hopper(self, name, settings, profile=None):
+        """Utwórz zasobnik z własnym servo i wątkiem - None gdy servo niedostępne"""
         try:
-            factory = PiGPIOFactory()
-            self.servo = Servo(
-                self.servo_pin,
-                pin_factory=factory,
-                min_pulse_width=0.5 / 1000,
-                max_pulse_width=2.5 / 1000
+            if self.pin_factory is None:
+                # Import dopiero przy pierwszym zasobniku - nie spowalnia importu modułu
+                from gpiozero.pins.pigpio import PiGPIOFactory
+                self.pin_factory = PiGPIOFactory()
+            hopper = Hopper(
+                name, settings['pin'],
+                pin_factory=self.pin_factory,
+                power=self.power,
+                portions=settings['portions'],
+                profile=profile,
+                queue_size=self.queue_size,
+                coalesce_window=self.coalesce_window,
+                on_complete=self._feed_done
             )
-            logging.info(f"Servo zainicjalizowane na GPIO {self.servo_pin}")
+            hopper.init_servo()
         except Exception as e:
-            logging.error(f"Błąd inicjalizacji servo: {e}")
-            sys.exit(1)
+            log.error(f"[{name}] Błąd inicjalizacji servo: {e}")
+            return None
+        hopper.start()
+        self.hoppers[name] = hopper
+        return hopper
+
+    def get_hopper(self, feeder=None):
+        """Zasobnik o podanym identyfikatorze (domyślny dla None) - ValueError dla nieznanego"""
+        name = feeder or self.default_feeder
+        hopper = self.hoppers.get(name)
+        if hopper is None:
+            raise ValueError(f"Nieznany karmnik: {name}")
+        return hopper
+
+    def add_listener(self, callback):
+        """Zarejestruj odbiorcę zdarzeń callback(event, data)"""
+        self.listeners.append(callback)
+
+    def notify(self, event, **data):
+        """Powiadom odbiorców o zdarzeniu karmnika"""
+        for callback in list(self.listeners):
+            try:
+                callback(event, data)
+            except Exception as e:
+                log.error(f"Błąd odbiorcy zdarzenia {event}: {e}")
 
-    def feed(self):
-        """Wykonaj karmienie - obrót servo"""
-        if self.servo is None:
-            logging.error("Servo nie jest zainicjalizowane")
-            return False
+    def request_feed(self, source='manual', priority=PRIORITY_MANUAL, feeder=None, portions=None):
+        """Zleć karmienie bez czekania - zwraca Future, QueueFull gdy kolejka pełna"""
+        return self.get_hopper(feeder).request_feed(source, priority, portions)
 
+    def feed(self, source='manual', priority=PRIORITY_MANUAL, feeder=None, portions=None):
+        """Wykonaj karmienie i poczekaj na wynik"""
         try:
-            logging.info("Rozpoczynam karmienie...")
-
-            # Pozycja początkowa
-            self.servo.min()
-            time.sleep(0.5)
-
-            # Obrót do pozycji karmienia
-            self.servo.max()
-            time.sleep(1.0)
-
-            # Powrót do pozycji początkowej
-            self.servo.min()
-            time.sleep(0.5)
-
-            # Detach servo
-            self.servo.detach()
-
-            logging.info("Karmienie zakończone")
-            return True
-
-        except Exception as e:
-            logging.error(f"Błąd podczas karmienia: {e}")
+            return self.request_feed(source, priority, feeder, portions).result()
+        except QueueFull as e:
+            log.warning(f"Karmienie odrzucone: {e}")
             return False
 
+    def _feed_done(self, feeder, request, success, duration):
+        """Zakończony cykl servo (wątek zasobnika)"""
+        self.metrics.feeds.inc(feeder, request.source, 'success' if success else 'failure')
+        self.metrics.feed_duration.observe(duration, feeder)
+        if self.history:
+            self.history.record(request.source, success, duration, merged=request.merged,
+                                feeder=feeder, dose=request.portions)
+        if self.status_writer:
+            self.status_writer.record_feed(success)
+        self.publish_status()
+        self.notify('feed', feeder=feeder, source=request.source, success=success,
+                    duration=duration, merged=request.merged, portions=request.portions)
+
+    def read_config(self):
+        """Odczytaj config.json (razem z dziennikiem zmian)"""
+        return self.store.read()
+
     def load_config(self):
-        """Wczytaj konfigurację z pliku JSON"""
+        """Wczytaj konfigurację z pliku JSON i uruchom zasobniki"""
         try:
-            with open(self.config_file, 'r') as f:
-                config = json.load(f)
-                self.schedules = config.get('schedules', [])
-            logging.info(f"Konfiguracja wczytana: {len(self.schedules)} harmonogramów")
+            config = self.read_config()
         except FileNotFoundError:
-            logging.info("Brak pliku konfiguracji, tworzę domyślny...")
-            self.create_default_config()
+            log.info("Brak pliku konfiguracji, tworzę domyślny...")
+            config = self.create_default_config()
         except Exception as e:
-            logging.error(f"Błąd wczytywania konfiguracji: {e}")
-            self.schedules = []
+            log.error(f"Błąd wczytywania konfiguracji: {e}")
+            config = {}
+
+        budget = self.power_budget or config.get('power_budget', DEFAULT_POWER_BUDGET)
+        self.power = threading.BoundedSemaphore(budget)
+
+        with self.reload_lock:
+            self.apply_feeders(config)
+        total = sum(len(hopper.schedules) for hopper in self.hoppers.values())
+        log.info(f"Konfiguracja wczytana: {len(self.hoppers)} zasobników, {total} harmonogramów, "
+                 f"budżet mocy {budget}")
+        if not total:
+            log.warning("Brak harmonogramu karmienia!")
 
     def create_default_config(self):
         """Stwórz domyślny plik konfiguracji"""
@@ -118,88 +183,351 @@ class SimpleFeeder:
         }
 
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(default_config, f, indent=2)
-            self.schedules = default_config['schedules']
-            logging.info(f"Utworzono domyślny config.json z harmonogramem: {', '.join(self.schedules)}")
+            # Jeśli inny proces zdążył utworzyć plik, zostaje jego zawartość
+            config = self.store.update(lambda config: None, default=default_config)
+            log.info(f"Utworzono domyślny config.json z harmonogramem: {', '.join(config.get('schedules', []))}")
+            return config
         except Exception as e:
-            logging.error(f"Błąd tworzenia konfiguracji: {e}")
+            log.error(f"Błąd tworzenia konfiguracji: {e}")
+            return default_config
+
+    def apply_feeders(self, config):
+        """
+        Dopasuj zasobniki i ich harmonogramy do konfiguracji (wymaga reload_lock).
+        Zwraca {id: (dodane, usunięte)} dla zasobników, w których coś się zmieniło.
+        """
+        configs = feeder_configs(config, self.servo_pin)
+        profiles = load_profiles(config)
+        self.default_feeder = default_feeder(config)
+        self.scheduler.set_late_warning(config.get('late_warning', DEFAULT_LATE_WARNING))
+        self.reloads.set_quiet_period(config.get('reload_quiet_period', DEFAULT_QUIET_PERIOD))
+        changes = {}
+
+        for name, schedules in reconcile_hoppers(self.hoppers, configs, self.scheduler).items():
+            if name not in configs:
+                changes[name] = ([], schedules)
+
+        for name, settings in configs.items():
+            hopper = self.hoppers.get(name)
+            profile = resolve_profile(profiles, settings['profile'])
+            if hopper is None:
+                hopper = self.create_hopper(name, settings, profile)
+                if hopper is None:
+                    continue
+            hopper.portions = settings['portions']
+            doses_changed = hopper.doses != settings['doses']
+            hopper.doses = settings['doses']
+            hopper.profile = profile
+
+            added, removed = hopper.apply_schedules(self.scheduler, settings['schedules'], self.scheduled_feed)
+            for feed_time in removed:
+                log.info(f"[{name}] Harmonogram usunięty: {feed_time}")
+            for feed_time in added:
+                log.info(f"[{name}] Harmonogram dodany: {feed_time}")
+            if added or removed:
+                changes[name] = (added, removed)
+            if added or removed or doses_changed:
+                self.notify('schedules', feeder=name, schedules=sorted(hopper.schedules), tag=hopper.tag,
+                            doses=dict(hopper.doses))
+        return changes
+
+    def reload_config(self, detected_at=None):
+        """Przeładuj config.json i zastosuj tylko różnice w harmonogramie"""
+        # Obserwator pliku i API sterujące mogą zgłosić przeładowanie jednocześnie
+        with self.reload_lock:
+            return self._apply_config(detected_at)
+
+    def _apply_config(self, detected_at):
+        """Zastosuj różnice między config.json a aktywnym harmonogramem"""
+        started = time.monotonic()
+        if detected_at is None:
+            detected_at = started
 
-    def setup_schedule(self):
-        """Skonfiguruj harmonogram na podstawie config.json"""
-        schedule.clear()
+        try:
+            config = self.read_config()
+        except Exception as e:
+            log.error(f"Błąd przeładowania konfiguracji, zostaje poprzedni harmonogram: {e}")
+            self.metrics.config_reloads.inc('failure')
+            return False
 
-        if not self.schedules:
-            logging.warning("Brak harmonogramu karmienia!")
-            return
+        changes = self.apply_feeders(config)
+        self.metrics.config_reloads.inc('success')
+        self.publish_status()
+        finished = time.monotonic()
+        added = sum(len(a) for a, _ in changes.values())
+        removed = sum(len(r) for _, r in changes.values())
+        log.info(
+            f"Konfiguracja przeładowana: +{added} -{removed}, "
+            f"opóźnienie {(finished - detected_at) * 1000:.1f} ms "
+            f"(zastosowanie {(finished - started) * 1000:.1f} ms)"
+        )
+        return True
+
+    def config_changed(self, source, detected_at=None):
+        """Zgłoś zmianę konfiguracji - przeładowanie po okresie ciszy (zwraca numer zgłoszenia)"""
+        self.metrics.config_changes.inc(source)
+        return self.reloads.notify(source, detected_at)
+
+    def request_reload(self, wait=True):
+        """
+        Przeładowanie zlecone przez API sterujące; wait - czekaj, aż obejmie je przeładowanie.
+        Gdy trwa karmienie, przeładowanie czeka na koniec cyklu servo - odpowiedź ma wtedy
+        pending i numer zgłoszenia do sprawdzenia przez reload_status
+        """
+        self.metrics.config_changes.inc('control')
+        if not wait:
+            ticket, result = self.reloads.notify('control'), None
+        else:
+            ticket, result = self.reloads.request('control')
+            if result is None:
+                log.info(f"Przeładowanie (zgłoszenie {ticket}) czeka na koniec karmienia - "
+                         f"zostanie zastosowane po cyklu servo")
+        response = {'success': result is not False, 'applied': result is not None, 'pending': result is None,
+                    'ticket': ticket}
+        if result is False:
+            response['message'] = 'Przeładowanie konfiguracji nie powiodło się'
+        return response
+
+    def reload_status(self, ticket, wait=0):
+        """Czy przeładowanie objęło zgłoszenie z request_reload (czeka najwyżej wait s)"""
+        if wait:
+            self.reloads.wait(ticket, min(max(float(wait), 0.0), DEFAULT_REQUEST_TIMEOUT))
+        state = self.reloads.state(ticket)
+        return {'success': state['result'] is not False, 'applied': state['applied'], 'pending': state['pending'],
+                'ticket': ticket}
+
+    def watch_config(self):
+        """Obserwuj config.json i przeładowuj harmonogram bez restartu usługi"""
+        self.watcher = ConfigWatcher(self.config_file, lambda detected_at: self.config_changed('watch', detected_at),
+                                     companions=[self.store.journal_path])
+        self.watcher.start()
+
+    def write_schedules(self, schedules, feeder=None):
+        """Zapisz nową listę godzin do dziennika config.json (pozostałe pola bez zmian)"""
+        for feed_time in schedules:
+            validate_rule(feed_time)
+        self.store.append('replace', sorted(schedules), default={}, feeder=feeder)
+
+    def control_handlers(self):
+        """Komendy dostępne przez gniazdo sterujące"""
+        return {
+            'feed': self.control_feed,
+            'feed_result': self.feed_result,
+            'status': self.status,
+            'history': self.get_history,
+            'ration': self.get_ration,
+            'timing': self.get_timing,
+            'metrics': self.get_metrics,
+            'feeders': self.list_feeders,
+            'get_schedules': self.get_schedules,
+            'set_schedules': self.set_schedules,
+            'reload': self.request_reload,
+            'reload_status': self.reload_status,
+            'reloads': self.get_reloads,
+        }
 
-        for feed_time in self.schedules:
-            try:
-                schedule.every().day.at(feed_time).do(self.scheduled_feed, feed_time)
-                logging.info(f"Harmonogram dodany: {feed_time}")
-            except Exception as e:
-                logging.error(f"Błąd dodawania harmonogramu {feed_time}: {e}")
+    def control_feed(self, feeder=None, portions=None, wait=True):
+        """
+        Karmienie zlecone przez API sterujące. wait=False - odpowiedź od razu z numerem zlecenia
+        i szacowanym czasem (eta, s); wynik przez feed_result albo zdarzenie 'feed'
+        """
+        if portions is not None:
+            portions = parse_dose(portions)
+        hopper = self.get_hopper(feeder)
+        eta = hopper.estimate(portions)
+        try:
+            future = self.request_feed('control', feeder=feeder, portions=portions)
+        except QueueFull:
+            return {'success': False, 'message': 'BUSY'}
+        if wait:
+            return {'success': future.result()}
+        return {'success': True, 'queued': True, 'ticket': self.feed_tickets.add(future),
+                'eta': round(eta, 2), 'feeder': hopper.name}
+
+    def feed_result(self, ticket, wait=0):
+        """Wynik karmienia zleconego z wait=False - czeka najwyżej wait s"""
+        try:
+            done, success = self.feed_tickets.wait(ticket, min(max(float(wait), 0.0), MAX_RESULT_WAIT))
+        except KeyError:
+            return {'success': False, 'done': False, 'message': f'Nieznane zlecenie karmienia: {ticket}'}
+        if not done:
+            return {'success': False, 'done': False, 'message': 'Karmienie jeszcze trwa'}
+        return {'success': success, 'done': True}
+
+    def get_schedules(self, feeder=None):
+        """Harmonogram zasobnika przez API sterujące"""
+        hopper = self.get_hopper(feeder)
+        return {'success': True, 'feeder': hopper.name, 'schedules': sorted(hopper.schedules),
+                'doses': dict(hopper.doses), 'portions': hopper.portions}
+
+    def set_schedules(self, schedules, feeder=None):
+        """Podmień harmonogram przez API sterujące - applied/pending mówią, czy usługa już go stosuje"""
+        self.write_schedules(schedules, feeder)
+        reload = self.request_reload()
+        result = dict(self.get_schedules(feeder), **reload)
+        if reload['pending']:
+            # Zapisany, ale zasobnik dostanie go dopiero po trwającym karmieniu
+            result['schedules'] = sorted(schedules)
+        return result
+
+    def get_reloads(self):
+        """Przeładowania konfiguracji i liczba scalonych w nie zgłoszeń"""
+        return dict(self.reloads.stats(), success=True)
+
+    def list_feeders(self):
+        """Zasobniki obsługiwane przez usługę"""
+        return {
+            'success': True,
+            'default': self.default_feeder,
+            'feeders': {name: hopper.stats() for name, hopper in self.hoppers.items()},
+        }
+
+    def get_history(self, start=None, end=None, limit=DEFAULT_LIMIT, feeder=None):
+        """Karmienia z zakresu dat (od najnowszych)"""
+        if self.history is None:
+            return {'success': False, 'message': 'Dziennik karmień niedostępny'}
+        return {'success': True, 'history': self.history.query(start, end, limit, feeder)}
+
+    def get_ration(self, start=None, end=None, feeder=None):
+        """Dzienne sumy wydanych porcji"""
+        if self.history is None:
+            return {'success': False, 'message': 'Dziennik karmień niedostępny'}
+        return {'success': True, 'rations': self.history.rations(start, end, feeder)}
+
+    def get_timing(self):
+        """Opóźnienia uruchomień harmonogramu (histogramy i ostatnie karmienia)"""
+        return {'success': True, **self.scheduler.timing()}
+
+    def get_metrics(self):
+        """Metryki w formacie Prometheus (panel web serwuje je pod /metrics)"""
+        return {'success': True, 'text': self.metrics.render()}
+
+    def status(self):
+        """Stan karmnika dla panelu web i CLI"""
+        next_run = self.scheduler.next_run()
+        default = self.hoppers.get(self.default_feeder)
+        return {
+            'success': True,
+            'active': self.running,
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started_at,
+            'schedules': sorted(default.schedules) if default else [],
+            'next_run': next_run.isoformat() if next_run else None,
+            'scheduler': self.scheduler.stats(),
+            'reloads': {key: value for key, value in self.reloads.stats().items() if key != 'recent'},
+            'feeders': {name: hopper.stats() for name, hopper in self.hoppers.items()},
+            'ration_today': self.history.ration_today() if self.history else None,
+        }
 
-    def scheduled_feed(self, feed_time):
-        """Zaplanowane karmienie"""
-        logging.info(f"HARMONOGRAM: Karmienie o {feed_time}")
-        self.feed()
+    def publish_status(self):
+        """Zaktualizuj migawkę stanu (następne karmienie)"""
+        if self.status_writer:
+            self.status_writer.update(**self.status_fields())
+
+    def status_fields(self):
+        """Pola migawki odświeżane przy każdym heartbeat"""
+        next_run = self.scheduler.next_run()
+        return {'next_feed': next_run.timestamp() if next_run else 0.0}
+
+    def start_status(self, path=DEFAULT_STATUS_FILE):
+        """Publikuj migawkę stanu dla panelu web i feeder.sh"""
+        self.status_writer = open_writer(path)
+        if self.status_writer:
+            self.publish_status()
+            self.status_writer.start_heartbeat(refresh=self.status_fields)
+
+    def serve_control(self):
+        """Uruchom lokalne API sterujące (gniazdo Unix)"""
+        try:
+            self.control = ControlServer(self.control_socket, self.control_handlers())
+            self.control.start()
+            # Zdarzenia karmnika trafiają do subskrybentów (panel web - SSE)
+            self.add_listener(self.control.publish)
+        except OSError as e:
+            log.error(f"Nie udało się uruchomić API sterującego: {e}")
+            self.control = None
+
+    def scheduled_feed(self, feeder, feed_time):
+        """Zaplanowane karmienie - zwraca Future zlecenia (None gdy odrzucone)"""
+        log.info(f"HARMONOGRAM: Karmienie o {feed_time} ({feeder})")
+        # Nie czekamy na servo - wątek harmonogramu od razu wraca do snu
+        try:
+            hopper = self.get_hopper(feeder)
+            # Future pozwala harmonogramowi zmierzyć koniec karmienia
+            return hopper.request_feed('schedule', PRIORITY_SCHEDULED, hopper.dose_for(feed_time))
+        except (QueueFull, ValueError) as e:
+            log.error(f"Zaplanowane karmienie odrzucone: {e}")
+            return None
 
     def print_status(self):
         """Wyświetl status karmnika"""
-        logging.info("=" * 50)
-        logging.info("STATUS KARMNIKA")
-        logging.info("=" * 50)
-        logging.info(f"GPIO Pin: {self.servo_pin}")
-        logging.info(f"Plik konfiguracji: {self.config_file}")
-        logging.info(f"Liczba harmonogramów: {len(self.schedules)}")
-        if self.schedules:
-            logging.info("Godziny karmienia:")
-            for feed_time in sorted(self.schedules):
-                logging.info(f"  - {feed_time}")
-        else:
-            logging.info("  (brak harmonogramu)")
-        logging.info("=" * 50)
-        logging.info("")
-        logging.info("Komendy:")
-        logging.info("  - Aby zmienić harmonogram, edytuj: config.json")
-        logging.info("  - Aby przeładować config: sudo systemctl restart feeder")
-        logging.info("  - Aby zatrzymać: Ctrl+C")
-        logging.info("")
+        log.info("=" * 50)
+        log.info("STATUS KARMNIKA")
+        log.info("=" * 50)
+        log.info(f"Plik konfiguracji: {self.config_file}")
+        for name, hopper in self.hoppers.items():
+            log.info(f"Zasobnik {name}: GPIO {hopper.pin}, profil {hopper.profile.name}, harmonogramów: {len(hopper.schedules)}")
+            if hopper.schedules:
+                for feed_time in sorted(hopper.schedules):
+                    log.info(f"  - {feed_time}")
+            else:
+                log.info("  (brak harmonogramu)")
+        next_run = self.scheduler.next_run()
+        if next_run:
+            log.info(f"Następne karmienie: {next_run.strftime('%Y-%m-%d %H:%M')}")
+        log.info("=" * 50)
+        log.info("")
+        log.info("Komendy:")
+        log.info("  - Aby zmienić harmonogram, edytuj: config.json")
+        log.info("  - Zmiany w config.json są wczytywane automatycznie")
+        log.info("  - Aby zatrzymać: Ctrl+C")
+        log.info("")
 
     def run(self):
         """Główna pętla programu"""
-        logging.info("Karmnik działa... Naciśnij Ctrl+C aby zatrzymać")
-        logging.info("")
+        log.info("Karmnik działa... Naciśnij Ctrl+C aby zatrzymać")
+        log.info("")
+
+        self.watch_config()
+        self.serve_control()
+        self.start_status()
 
         try:
-            while self.running:
-                schedule.run_pending()
-                time.sleep(1)
+            # Scheduler śpi do najbliższego terminu zamiast budzić się co sekundę
+            self.scheduler.run()
         except KeyboardInterrupt:
-            logging.info("\nOtrzymano sygnał zatrzymania...")
+            log.info("\nOtrzymano sygnał zatrzymania...")
         finally:
             self.cleanup()
 
     def cleanup(self):
         """Cleanup przy zamykaniu"""
         self.running = False
-        if self.servo:
-            try:
-                self.servo.close()
-            except:
-                pass
-        logging.info("Karmnik zatrzymany")
+        self.scheduler.stop()
+        if self.watcher:
+            self.watcher.stop()
+        self.reloads.stop()
+        if self.control:
+            self.control.stop()
+        for hopper in self.hoppers.values():
+            hopper.stop()
+        if self.status_writer:
+            self.status_writer.close()
+        if self.history:
+            self.history.close()
+        log.info("Karmnik zatrzymany")
 
 
 def signal_handler(signum, frame):
     """Obsługa sygnałów systemowych"""
-    logging.info("\nOtrzymano sygnał zatrzymania...")
+    log.info("\nOtrzymano sygnał zatrzymania...")
     sys.exit(0)
 
 
 def main():
     """Główna funkcja"""
+    setup_logging()
+
     # Obsługa Ctrl+C i systemctl stop
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
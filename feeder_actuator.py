@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Wątek wykonawczy servo
+Jedyny właściciel servo, kolejka priorytetowa karmień z łączeniem duplikatów
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+log = logging.getLogger('feeder.actuator')
+
+# Niższa wartość = wyższy priorytet
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 1
+PRIORITY_TEST = 2
+
+# Tyle zleceń API sterującego pamięta wynik do odbioru przez feed_result
+FEED_TICKETS = 64
+# Najdłuższe czekanie serwera na wynik w jednym feed_result (s)
+MAX_RESULT_WAIT = 300.0
+
+
+class QueueFull(Exception):
+    """Kolejka karmień jest pełna - odpowiedź BUSY"""
+
+
+class FeedRequest:
+    def __init__(self, source, priority, seq, portions=1):
+        """Pojedyncze zlecenie karmienia (portions - liczba cykli servo w jednym przebiegu)"""
+        self.source = source
+        self.priority = priority
+        self.seq = seq
+        self.portions = portions
+        self.submitted = time.monotonic()
+        self.merged = 0
+        self.future = Future()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Actuator:
+    def __init__(self, cycle, max_queue=4, coalesce_window=5.0, on_complete=None, name='actuator'):
+        """
+        cycle - funkcja cycle(portions) wykonująca karmienie, zwraca True/False
+        max_queue - ile zleceń może czekać, kolejne dostają QueueFull
+        coalesce_window - zlecenia w tym oknie (s) łączone są w jedno karmienie
+        on_complete - wywoływane jako on_complete(request, success, duration)
+        name - nazwa wątku (widoczna w pomiarach harmonogramu)
+        """
+        self.cycle = cycle
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.on_complete = on_complete
+        self.name = name
+        self.running = True
+        self.current = None
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._holds = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _find_duplicate(self, now, portions):
+        """
+        Zlecenie oczekujące lub trwające, z którym można połączyć nowe.
+        Oczekujące przejmuje większą dawkę; trwające tylko gdy jego dawka wystarcza.
+        """
+        candidates = list(self._queue)
+        if self.current is not None and self.current.portions >= portions:
+            candidates.append(self.current)
+        for request in candidates:
+            if now - request.submitted <= self.coalesce_window:
+                return request
+        return None
+
+    def submit(self, source='manual', priority=PRIORITY_MANUAL, portions=1):
+        """Zleć karmienie - zwraca Future z wynikiem, nie czeka na servo"""
+        with self._cond:
+            if not self.running:
+                raise QueueFull("Wątek servo zatrzymany")
+
+            duplicate = self._find_duplicate(time.monotonic(), portions)
+            if duplicate is not None:
+                duplicate.merged += 1
+                duplicate.portions = max(duplicate.portions, portions)
+                self.coalesced += 1
+                if priority < duplicate.priority and duplicate is not self.current:
+                    duplicate.priority = priority
+                    heapq.heapify(self._queue)
+                log.info(f"Karmienie ({source}) połączone z oczekującym ({duplicate.source})")
+                return duplicate.future
+
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(f"Kolejka karmień pełna ({self.max_queue})")
+
+            request = FeedRequest(source, priority, next(self._seq), portions)
+            heapq.heappush(self._queue, request)
+            self._cond.notify_all()
+            return request.future
+
+    @property
+    def busy(self):
+        """Czy servo jest w trakcie cyklu"""
+        return self.current is not None
+
+    @contextmanager
+    def idle(self):
+        """Na czas bloku nowe cykle czekają w kolejce - wejście czeka na koniec trwającego cyklu"""
+        with self._cond:
+            self._holds += 1
+            try:
+                while self.current is not None and self.running:
+                    self._cond.wait()
+            except BaseException:
+                self._holds -= 1
+                raise
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._holds -= 1
+                self._cond.notify_all()
+
+    def pending(self):
+        """Liczba oczekujących zleceń"""
+        with self._cond:
+            return len(self._queue)
+
+    def backlog(self):
+        """Porcje przed nowym zleceniem: oczekujące i cała dawka trwającego cyklu"""
+        with self._cond:
+            queued = sum(request.portions for request in self._queue)
+            return queued + (self.current.portions if self.current is not None else 0)
+
+    def stats(self):
+        """Liczniki do diagnostyki"""
+        with self._cond:
+            return {
+                'pending': len(self._queue),
+                'busy': self.current is not None,
+                'completed': self.completed,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+            }
+
+    def run(self):
+        """Pętla wątku servo - wykonuje zlecenia po kolei"""
+        while True:
+            with self._cond:
+                while self.running and (not self._queue or self._holds):
+                    self._cond.wait()
+                if not self.running:
+                    break
+                request = heapq.heappop(self._queue)
+                self.current = request
+
+            started = time.monotonic()
+            try:
+                success = bool(self.cycle(request.portions))
+            except Exception as e:
+                log.error(f"Błąd cyklu servo: {e}")
+                success = False
+            duration = time.monotonic() - started
+
+            with self._cond:
+                self.current = None
+                self.completed += 1
+                # Na koniec cyklu może czekać idle()
+                self._cond.notify_all()
+
+            if self.on_complete:
+                try:
+                    self.on_complete(request, success, duration)
+                except Exception as e:
+                    log.error(f"Błąd obsługi zakończenia karmienia: {e}")
+            request.future.set_result(success)
+
+    def start(self):
+        """Uruchom wątek servo"""
+        self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5.0):
+        """Zatrzymaj wątek - trwający cykl kończy się, oczekujące zlecenia dostają False"""
+        with self._cond:
+            self.running = False
+            dropped, self._queue = self._queue, []
+            self._cond.notify_all()
+        for request in dropped:
+            request.future.set_result(False)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+
+class FeedTickets:
+    def __init__(self, limit=FEED_TICKETS):
+        """Zlecenia karmienia przyjęte bez czekania - wynik odbierany później po numerze"""
+        self.limit = limit
+        self._futures = OrderedDict()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, future):
+        """Zapamiętaj zlecenie - zwraca jego numer (najstarsze ponad limit są zapominane)"""
+        with self._lock:
+            ticket = next(self._seq)
+            self._futures[ticket] = future
+            while len(self._futures) > self.limit:
+                self._futures.popitem(last=False)
+            return ticket
+
+    def wait(self, ticket, timeout):
+        """(zakończone, wynik) po najwyżej timeout s - KeyError dla nieznanego numeru"""
+        with self._lock:
+            future = self._futures[ticket]
+        try:
+            return True, future.result(timeout=timeout)
+        except FutureTimeout:
+            return False, None
+
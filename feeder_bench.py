@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+"""
+Benchmark karmnika bez sprzętu
+
+AutoFeeder, SimpleFeeder i BluetoothServer działają na gpiozero MockFactory, a moduł
+bluetooth zastępują gniazda TCP na localhost. Mierzone są:
+
+  bt_feed.*        FEED_NOW przez Bluetooth -> pierwszy ruch servo / odpowiedź FEED_OK
+  simple_feed.*    karmienie przez gniazdo sterujące SimpleFeeder -> pierwszy ruch servo
+  scheduler.jitter opóźnienie uruchomienia zadania względem jego godziny
+  bt.ping_*        przepustowość komend Bluetooth (protokół 1 i 2, kilku klientów)
+  web.*            czasy odpowiedzi panelu Flask (test client)
+  web_load.*       żądania/s serwera panelu (waitress lub werkzeug) przy kilku klientach HTTP keep-alive
+  startup.*        import feeder_main i start harmonogramu w trybie --fast-start (osobny proces)
+  rules.*          kompilacja reguł harmonogramu i wyszukanie najbliższego terminu dla 10-5000 reguł
+
+Użycie:
+    python3 feeder_bench.py                         # wszystkie pomiary, tabela
+    python3 feeder_bench.py -n 200 --json wynik.json
+    python3 feeder_bench.py --compare baza.json     # kod wyjścia 1 przy regresji
+    python3 feeder_bench.py startup --check-budget  # kod wyjścia 1 po przekroczeniu budżetu startu
+    python3 -m pytest tests                         # ten sam budżet jako test
+    python3 feeder_bench.py rules -n 200            # koszt reguł harmonogramu
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+
+# Krótki cykl servo - mierzymy opóźnienia oprogramowania, nie ruch mechaniczny
+BENCH_CONFIG = {
+    'version': 1,
+    'schedules': [],
+    'profile': 'bench',
+    'profiles': {
+        'bench': {
+            'shape': 'trapezoid', 'velocity': 200.0, 'acceleration': 20000.0,
+            'settle': 0.0, 'rate': 200, 'moves': [[1.0, 0.0], [-1.0, 0.0]],
+        },
+    },
+}
+
+BENCHMARKS = ('bt_feed', 'simple_feed', 'scheduler', 'bt_throughput', 'web', 'web_load', 'startup', 'rules')
+# Pomiary bez usług karmnika w tym procesie
+STANDALONE = ('startup', 'rules')
+
+# Budżet szybkiego startu z zapasem ponad pomiary na komputerach deweloperskich (import 60-120 ms,
+# harmonogram 60-120 ms, RSS ok. 20 MB); na Pi Zero czasy mnożymy przez --budget-scale.
+# Pilnuje go tests/test_startup_budget.py
+STARTUP_BUDGET = {
+    'import_ms': 250.0,
+    'online_ms': 300.0,
+    'rss_mb': 32.0,
+}
+# Moduły, których szybki start nie może importować przed pierwszym karmieniem / startem Bluetooth
+DEFERRED_MODULES = ('gpiozero', 'bluetooth', 'flask')
+STARTUP_RUNS = 5
+
+# Uruchamiany w osobnym procesie - bez podstawionych modułów, więc zdradzi każdy zbędny import
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import feeder_main
+imported = time.perf_counter() - started
+from feeder_metrics import resident_memory
+feeder = feeder_main.AutoFeeder(config_file='config.json', history_file='history.db', lazy_hardware=True)
+feeder.load_schedules()
+feeder.scheduler.start()
+online = time.perf_counter() - started
+print(json.dumps({'import': imported, 'online': online, 'rss': resident_memory(),
+                  'modules': [name for name in sys.argv[1:] if name in sys.modules]}))
+feeder.cleanup()
+"""
+
+# Regresja = p95 gorszy o tyle procent (dla przepustowości: niższa o tyle procent).
+# Kolumna "zmiana" ma ten sam znak - dodatnia oznacza pogorszenie.
+DEFAULT_THRESHOLD = 20.0
+
+WEB_LOAD_CLIENTS = 8
+# Nagłówki przeglądarki - strona i JSON wracają skompresowane
+WEB_LOAD_HEADERS = {'Accept-Encoding': 'gzip, deflate, br'}
+WEB_LOAD_PATHS = (
+    ('web_load.index', '/'),
+    ('web_load.schedules', '/api/schedules'),
+    ('web_load.history', '/api/history?limit=100'),
+    ('web_load.status', '/api/status'),
+)
+
+RULE_COUNTS = (10, 100, 1000, 5000)
+# Wyszukiwania rozłożone na tyle dni - część trafia w uzupełnianie tablicy terminów
+RULE_LOOKUP_DAYS = 30
+
+
+def install_stand_ins():
+    """Podstaw MockFactory za PiGPIOFactory i gniazda TCP za moduł bluetooth (przed importem karmnika)"""
+    from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+    pigpio = types.ModuleType('gpiozero.pins.pigpio')
+    pigpio.PiGPIOFactory = lambda *args, **kwargs: MockFactory(pin_class=MockPWMPin)
+    sys.modules['gpiozero.pins.pigpio'] = pigpio
+
+    bluetooth = types.ModuleType('bluetooth')
+
+    class BluetoothError(IOError):
+        pass
+
+    bluetooth.BluetoothError = BluetoothError
+    bluetooth.RFCOMM = 3
+    bluetooth.PORT_ANY = 0
+    bluetooth.SERIAL_PORT_CLASS = 'serial'
+    bluetooth.SERIAL_PORT_PROFILE = 'serial'
+    bluetooth.BluetoothSocket = lambda proto=None: socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bluetooth.advertise_service = lambda *args, **kwargs: None
+    sys.modules['bluetooth'] = bluetooth
+
+
+def mock_factory():
+    from gpiozero.pins.mock import MockFactory, MockPWMPin
+    return MockFactory(pin_class=MockPWMPin)
+
+
+def tcp_listener():
+    """Gniazdo nasłuchujące zamiast RFCOMM"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(8)
+    return sock
+
+
+def summarize(samples):
+    """Statystyki próbek w milisekundach"""
+    if not samples:
+        return {'n': 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'n': len(ordered),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50': round(pct(50), 3),
+        'p95': round(pct(95), 3),
+        'p99': round(pct(99), 3),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+class ServoProbe:
+    def __init__(self, servo):
+        """Pośrednik servo zapamiętujący chwilę pierwszego ruchu po arm()"""
+        self._servo = servo
+        self.first_write = None
+        self._moved = threading.Event()
+
+    def arm(self):
+        self.first_write = None
+        self._moved.clear()
+
+    def wait(self, timeout=10.0):
+        return self._moved.wait(timeout)
+
+    @property
+    def value(self):
+        return self._servo.value
+
+    @value.setter
+    def value(self, position):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+            self._moved.set()
+        self._servo.value = position
+
+    def __getattr__(self, name):
+        return getattr(self._servo, name)
+
+
+def attach_probe(feeder):
+    """Podłącz sondę do servo domyślnego zasobnika"""
+    hopper = feeder.get_hopper()
+    probe = ServoProbe(hopper.servo)
+    hopper.servo = probe
+    return probe
+
+
+class LineClient:
+    def __init__(self, port):
+        """Klient protokołu 1 (linie tekstu)"""
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb')
+        self.readline()  # CONNECTED
+
+    def send(self, line):
+        self.sock.sendall(line.encode('utf-8') + b'\n')
+
+    def readline(self):
+        return self.rfile.readline().decode('utf-8').strip()
+
+    def read_until(self, prefix):
+        """Czytaj linie (np. rozgłaszane FEED_DONE) aż do odpowiedzi z prefiksem"""
+        while True:
+            line = self.readline()
+            if not line or line.startswith(prefix):
+                return line
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def bench_bt_feed(env, iterations):
+    """FEED_NOW -> pierwszy ruch servo i odpowiedź"""
+    probe = env['auto_probe']
+    client = LineClient(env['bt_port'])
+    actuation, reply = [], []
+    try:
+        for _ in range(iterations):
+            probe.arm()
+            started = time.perf_counter()
+            client.send('FEED_NOW')
+            if not probe.wait():
+                raise RuntimeError("Servo nie ruszyło")
+            actuation.append(probe.first_write - started)
+            # Rozgłaszane FEED_DONE może przyjść przed odpowiedzią
+            line = client.read_until('FEED_OK')
+            reply.append(time.perf_counter() - started)
+            if line != 'FEED_OK':
+                raise RuntimeError(f"Nieoczekiwana odpowiedź: {line}")
+    finally:
+        client.close()
+    return {'bt_feed.actuation': summarize(actuation), 'bt_feed.reply': summarize(reply)}
+
+
+def bench_simple_feed(env, iterations):
+    """Gniazdo sterujące SimpleFeeder -> pierwszy ruch servo i zakończenie"""
+    from feeder_control import ControlClient
+
+    probe = env['simple_probe']
+    client = ControlClient(env['control_socket'])
+    actuation, done = [], []
+    try:
+        for _ in range(iterations):
+            probe.arm()
+            started = time.perf_counter()
+            result = client.call('feed')
+            finished = time.perf_counter()
+            if not result.get('success') or probe.first_write is None:
+                raise RuntimeError(f"Karmienie nie powiodło się: {result}")
+            actuation.append(probe.first_write - started)
+            done.append(finished - started)
+    finally:
+        client.close()
+    return {'simple_feed.actuation': summarize(actuation), 'simple_feed.done': summarize(done)}
+
+
+def bench_scheduler(env, iterations):
+    """Opóźnienie uruchomienia zadań względem ich godziny (HH:MM:SS)"""
+    scheduler = env['auto'].scheduler
+    spread = max(2, min(10, iterations // 10))
+    base = datetime.now().replace(microsecond=0) + timedelta(seconds=2)
+    lateness = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def fired(planned):
+        late = time.time() - planned
+        with lock:
+            lateness.append(late)
+            if len(lateness) == iterations:
+                done.set()
+
+    for i in range(iterations):
+        due = base + timedelta(seconds=i % spread)
+        scheduler.add(due.strftime('%H:%M:%S'), fired, due.timestamp(), key=('bench', i))
+    try:
+        done.wait(spread + 10)
+    finally:
+        for i in range(iterations):
+            scheduler.remove(('bench', i))
+    return {'scheduler.jitter': summarize(lateness)}
+
+
+def _ping_legacy(port, count, latencies):
+    client = LineClient(port)
+    try:
+        for i in range(count):
+            started = time.perf_counter()
+            client.send(f'PING:{i}')
+            client.read_until('PONG')
+            latencies.append(time.perf_counter() - started)
+    finally:
+        client.close()
+
+
+def _ping_pipelined(port, count):
+    """Protokół 2: wszystkie żądania naraz, odpowiedzi dopasowane po id"""
+    from feeder_protocol import encode_frame, read_frame
+
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    rfile = sock.makefile('rb')
+    try:
+        rfile.readline()  # CONNECTED
+        sock.sendall(b'HELLO:2\n')
+        rfile.readline()
+        sock.sendall(b''.join(encode_frame({'id': i, 'cmd': 'PING', 'args': {}}) for i in range(count)))
+        buffer = bytearray()
+        received = 0
+        while received < count:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise RuntimeError("Połączenie zamknięte")
+            buffer += chunk
+            offset = 0
+            while True:
+                message, offset = read_frame(buffer, offset)
+                if message is None:
+                    break
+                if 'id' in message:
+                    received += 1
+            del buffer[:offset]
+    finally:
+        rfile.close()
+        sock.close()
+
+
+def bench_bt_throughput(env, iterations, clients=4):
+    """Komendy Bluetooth na sekundę"""
+    port = env['bt_port']
+    results = {}
+
+    latencies = []
+    started = time.perf_counter()
+    _ping_legacy(port, iterations, latencies)
+    elapsed = time.perf_counter() - started
+    results['bt.ping_legacy'] = dict(summarize(latencies), rate=round(iterations / elapsed, 1))
+
+    count = iterations * 10
+    started = time.perf_counter()
+    _ping_pipelined(port, count)
+    elapsed = time.perf_counter() - started
+    results['bt.ping_v2_pipelined'] = {'n': count, 'rate': round(count / elapsed, 1)}
+
+    latencies = []
+    threads = [threading.Thread(target=_ping_legacy, args=(port, iterations, latencies)) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    results[f'bt.ping_{clients}_clients'] = dict(summarize(latencies),
+                                                  rate=round(clients * iterations / elapsed, 1))
+    return results
+
+
+def bench_web(env, iterations):
+    """Czasy odpowiedzi endpointów panelu (bez sieci - test client Flask)"""
+    try:
+        import feeder_web_page
+    except ImportError as e:
+        print(f"Pominięto web: {e}", file=sys.stderr)
+        return {}
+
+    client = feeder_web_page.app.test_client()
+
+    def measure(request):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = request()
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400 and response.status_code != 409:
+                raise RuntimeError(f"HTTP {response.status_code}")
+        return summarize(samples)
+
+    etag = client.get('/api/schedules').headers.get('ETag')
+
+    def add_remove():
+        client.post('/api/schedules', json={'time': '23:59'})
+        return client.delete('/api/schedules', json={'time': '23:59'})
+
+    # Pięć godzin dodanych i usuniętych dwoma żądaniami zbiorczymi (jedno przeładowanie na żądanie)
+    bulk_times = [f'23:5{i}' for i in range(5)]
+
+    def bulk_add_remove():
+        client.post('/api/schedules/bulk', json={'operations': [{'op': 'add', 'times': bulk_times}]})
+        return client.post('/api/schedules/bulk', json={'operations': [{'op': 'remove', 'times': bulk_times}]})
+
+    return {
+        'web.get_schedules': measure(lambda: client.get('/api/schedules')),
+        'web.get_schedules_304': measure(lambda: client.get('/api/schedules', headers={'If-None-Match': etag})),
+        'web.get_feeders': measure(lambda: client.get('/api/feeders')),
+        'web.get_status': measure(lambda: client.get('/api/status')),
+        'web.get_history': measure(lambda: client.get('/api/history?limit=50')),
+        'web.add_remove_schedule': measure(add_remove),
+        'web.bulk_add_remove_5': measure(bulk_add_remove),
+    }
+
+
+def _http_client(port, path, count, latencies, sizes):
+    """Jedno połączenie keep-alive wysyłające kolejno `count` żądań GET"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            conn.request('GET', path, headers=WEB_LOAD_HEADERS)
+            response = conn.getresponse()
+            body = response.read()
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(body))
+            if response.status >= 400:
+                raise RuntimeError(f"HTTP {response.status} dla {path}")
+    finally:
+        conn.close()
+
+
+def bench_web_load(env, iterations, clients=WEB_LOAD_CLIENTS):
+    """Żądania na sekundę serwera panelu przez prawdziwe gniazdo TCP"""
+    try:
+        import feeder_web_page
+        from feeder_http import PanelServer
+    except ImportError as e:
+        print(f"Pominięto web_load: {e}", file=sys.stderr)
+        return {}
+
+    server = PanelServer(feeder_web_page.app, host='127.0.0.1', port=0)
+    threading.Thread(target=server.serve, name='bench-web', daemon=True).start()
+    results = {}
+    try:
+        for name, path in WEB_LOAD_PATHS:
+            # Pierwsze żądanie renderuje i kompresuje stronę - poza pomiarem
+            _http_client(server.port, path, 1, [], [])
+            latencies, sizes = [], []
+            threads = [threading.Thread(target=_http_client, args=(server.port, path, iterations, latencies, sizes))
+                       for _ in range(clients)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            results[name] = dict(summarize(latencies), rate=round(len(latencies) / elapsed, 1),
+                                 bytes=round(sum(sizes) / len(sizes)) if sizes else 0, server=server.kind)
+    finally:
+        server.close()
+    return results
+
+
+def bench_startup(env, iterations):
+    """Czas importu i uruchomienia harmonogramu w trybie szybkiego startu oraz RSS procesu"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='feeder-startup-') as workdir:
+        with open(os.path.join(workdir, 'config.json'), 'w') as f:
+            json.dump(dict(BENCH_CONFIG, schedules=['07:00', '18:00']), f)
+        environ = dict(os.environ, PYTHONPATH=repo)
+        for _ in range(min(iterations, STARTUP_RUNS)):
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_PROBE, *DEFERRED_MODULES],
+                cwd=workdir, env=environ, capture_output=True, text=True, timeout=60, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    rss = sorted(run['rss'] / 2 ** 20 for run in runs)
+    return {
+        'startup.import': summarize([run['import'] for run in runs]),
+        'startup.online': summarize([run['online'] for run in runs]),
+        'startup.rss_mb': {'n': len(rss), 'p50': round(rss[len(rss) // 2], 2),
+                           'p95': round(rss[-1], 2), 'max': round(rss[-1], 2),
+                           'modules': sorted({name for run in runs for name in run['modules']})},
+    }
+
+
+def rule_set(count):
+    """Różne reguły wszystkich rodzajów (bez powtórzeń, żeby nie trafiały w pamięć podręczną parsera)"""
+    kinds = (
+        lambda i: f"{i // 60 % 24:02d}:{i % 60:02d}:{i // 1440 % 60:02d}",
+        lambda i: f"pn-pt {i // 60 % 24:02d}:{i % 60:02d}:{i // 1440 % 60:02d}",
+        lambda i: f"co {15 + i % 240}m {i // 240 % 12:02d}:{i // 5 % 60:02d}-22:00",
+        lambda i: f"cron {i % 60} {i // 60 % 24}-23/{1 + i // 1440 % 6} * * 1-5",
+        lambda i: f"so,nd {i // 60 % 24:02d}:{i % 60:02d}:{i // 1440 % 60:02d} oprócz 12-24..12-26",
+    )
+    return [kinds[i % len(kinds)](i) for i in range(count)]
+
+
+def bench_rules(env, iterations):
+    """Kompilacja reguł i koszt wyszukania najbliższego terminu w zależności od liczby reguł"""
+    import feeder_rules
+    from feeder_scheduler import FeedScheduler
+
+    results = {}
+    start = time.time()
+    step = RULE_LOOKUP_DAYS * 86400 / iterations
+    for count in RULE_COUNTS:
+        texts = rule_set(count)
+        feeder_rules._cached_rule.cache_clear()
+
+        compiled, compile_times = [], []
+        for text in texts:
+            began = time.perf_counter()
+            rule = feeder_rules.compile_rule(text)
+            rule.next_after(start)
+            compile_times.append(time.perf_counter() - began)
+            compiled.append(rule)
+
+        # Próbka = najbliższy termin każdej z reguł; lookup_us - średnio na jedną regułę
+        passes = []
+        for i in range(iterations):
+            ts = start + i * step
+            began = time.perf_counter()
+            for rule in compiled:
+                rule.next_after(ts)
+            passes.append(time.perf_counter() - began)
+
+        # Najbliższe karmienie z całego harmonogramu - wierzchołek kopca, niezależnie od liczby reguł
+        scheduler = FeedScheduler()
+        for i, text in enumerate(texts):
+            scheduler.add(text, lambda: None, key=('bench', i))
+        next_runs = []
+        for _ in range(iterations):
+            began = time.perf_counter()
+            scheduler.next_run()
+            next_runs.append(time.perf_counter() - began)
+
+        results[f'rules.compile.{count}'] = summarize(compile_times)
+        results[f'rules.next_fire.{count}'] = dict(
+            summarize(passes),
+            lookup_us=round(sum(passes) / len(passes) / count * 1e6, 3),
+            refills=sum(rule.fills for rule in compiled) - count)
+        results[f'rules.next_run.{count}'] = summarize(next_runs)
+    return results
+
+
+def check_budget(results, scale=1.0):
+    """Przekroczenia budżetu startu (mediana czasów i RSS) - lista opisów"""
+    violations = []
+    limits = (
+        ('startup.import', 'import_ms', STARTUP_BUDGET['import_ms'] * scale),
+        ('startup.online', 'online_ms', STARTUP_BUDGET['online_ms'] * scale),
+        ('startup.rss_mb', 'rss_mb', STARTUP_BUDGET['rss_mb']),
+    )
+    for name, label, limit in limits:
+        value = results[name]['p50']
+        if value > limit:
+            violations.append(f"{label} {value:.1f} > {limit:.1f}")
+    modules = results['startup.rss_mb']['modules']
+    if modules:
+        violations.append(f"zaimportowano przy starcie: {', '.join(modules)}")
+    return violations
+
+
+def setup_environment(workdir):
+    """Uruchom AutoFeeder z serwerem Bluetooth i SimpleFeeder z gniazdem sterującym"""
+    os.environ['FEEDER_DIR'] = workdir
+    import feeder
+    import feeder_main
+
+    auto_config = os.path.join(workdir, 'auto.json')
+    with open(auto_config, 'w') as f:
+        json.dump(BENCH_CONFIG, f)
+    simple_config = os.path.join(workdir, 'config.json')
+    with open(simple_config, 'w') as f:
+        json.dump(BENCH_CONFIG, f)
+
+    auto = feeder_main.AutoFeeder(
+        config_file=auto_config,
+        history_file=os.path.join(workdir, 'auto.db'),
+        coalesce_window=0,
+        pin_factory=mock_factory()
+    )
+    auto.load_schedules()
+    auto.scheduler.start()
+    server = feeder_main.BluetoothServer(auto, sock_factory=tcp_listener)
+    threading.Thread(target=server.start_server, name='bench-bt', daemon=True).start()
+    while server.server_sock is None:
+        time.sleep(0.01)
+
+    control_socket = os.path.join(workdir, 'feeder.sock')
+    simple = feeder.SimpleFeeder(
+        config_file=simple_config,
+        control_socket=control_socket,
+        history_file=os.path.join(workdir, 'history.db'),
+        coalesce_window=0,
+        pin_factory=mock_factory()
+    )
+    simple.serve_control()
+
+    return {
+        'auto': auto,
+        'server': server,
+        'simple': simple,
+        'bt_port': server.server_sock.getsockname()[1],
+        'control_socket': control_socket,
+        'auto_probe': attach_probe(auto),
+        'simple_probe': attach_probe(simple),
+    }
+
+
+def teardown_environment(env):
+    env['server'].stop()
+    env['auto'].cleanup()
+    env['simple'].cleanup()
+
+
+def run(selected, iterations):
+    """Wykonaj wybrane pomiary - zwraca raport"""
+    install_stand_ins()
+    runners = {
+        'bt_feed': bench_bt_feed,
+        'simple_feed': bench_simple_feed,
+        'scheduler': bench_scheduler,
+        'bt_throughput': bench_bt_throughput,
+        'web': bench_web,
+        'web_load': bench_web_load,
+    }
+    results = {}
+    # Pomiar startu ma własny proces, reguły liczą się bez sprzętu - usługi nie są im potrzebne
+    standalone = {'startup': bench_startup, 'rules': bench_rules}
+    for name in selected:
+        if name in STANDALONE:
+            results.update(standalone[name](None, iterations))
+    selected = [name for name in selected if name not in STANDALONE]
+    if selected:
+        with tempfile.TemporaryDirectory(prefix='feeder-bench-') as workdir:
+            env = setup_environment(workdir)
+            try:
+                for name in selected:
+                    results.update(runners[name](env, iterations))
+            finally:
+                teardown_environment(env)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'node': platform.node(),
+            'iterations': iterations,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Lista regresji względem raportu bazowego"""
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        if 'rate' in current and 'rate' in previous:
+            change = (previous['rate'] - current['rate']) / previous['rate'] * 100
+            metric = 'rate'
+        elif current.get('p95') is not None and previous.get('p95'):
+            change = (current['p95'] - previous['p95']) / previous['p95'] * 100
+            metric = 'p95'
+        else:
+            continue
+        current['change'] = round(change, 1)
+        if change > threshold:
+            regressions.append((name, metric, previous[metric], current[metric], change))
+    return regressions
+
+
+def print_table(report):
+    print(f"{'pomiar':28s} {'n':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s} {'/s':>9s} {'zmiana':>8s}")
+    for name, stats in report['results'].items():
+        def col(key, fmt='{:9.3f}'):
+            value = stats.get(key)
+            return fmt.format(value) if value is not None else f"{'-':>{len(fmt.format(0))}s}"
+        change = f"{stats['change']:+7.1f}%" if 'change' in stats else f"{'':8s}"
+        print(f"{name:28s} {stats.get('n', 0):6d} {col('p50')} {col('p95')} {col('p99')} {col('max')} "
+              f"{col('rate', '{:9.1f}')} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark karmnika bez sprzętu')
+    parser.add_argument('benchmarks', nargs='*', metavar='POMIAR',
+                        help=f"pomiary do wykonania (domyślnie wszystkie: {', '.join(BENCHMARKS)})")
+    parser.add_argument('-n', '--iterations', type=int, default=50, help='liczba powtórzeń pomiaru')
+    parser.add_argument('--json', help="zapisz raport JSON do pliku ('-' = stdout)")
+    parser.add_argument('--compare', help='raport bazowy JSON do porównania')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='dopuszczalne pogorszenie w procentach (domyślnie %(default)s)')
+    parser.add_argument('--check-budget', action='store_true',
+                        help='kod wyjścia 1, gdy start przekracza budżet czasu importu i RSS')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='mnożnik limitów czasu startu dla wolniejszego sprzętu (np. 8 dla Pi Zero)')
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"nieznane pomiary: {', '.join(unknown)}")
+
+    # Logi karmnika zagłuszyłyby wyniki - zostają tylko ostrzeżenia
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    # Serwer werkzeug (bez waitress) loguje każde żądanie
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    report = run(args.benchmarks or list(BENCHMARKS), args.iterations)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    for name, metric, before, after, change in regressions:
+        print(f"REGRESJA {name}: {metric} {before} -> {after} ({change:+.1f}%)", file=sys.stderr)
+
+    violations = []
+    if 'startup.import' in report['results']:
+        violations = check_budget(report['results'], args.budget_scale)
+        for violation in violations:
+            print(f"BUDŻET STARTU: {violation}", file=sys.stderr)
+        if args.check_budget and not violations:
+            print("Budżet startu zachowany", file=sys.stderr)
+    return 1 if regressions or (args.check_budget and violations) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,23 +14,46 @@ show_help() {
     echo "  stop          Zatrzymaj karmnik"
     echo "  restart       Zrestartuj karmnik"
     echo "  status        Pokaż status"
+    echo "  info          Pokaż stan karmnika (ostatnie/następne karmienie)"
     echo "  logs          Pokaż logi na żywo"
-    echo "  test          Test servo (jednorazowe karmienie)"
-    echo "  schedule      Pokaż harmonogram"
+    echo "  test [ID]     Test servo (jednorazowe karmienie)"
+    echo "  schedule [ID] Pokaż harmonogram"
+    echo "  feeders       Pokaż zasobniki (serwa)"
+    echo "  timing        Pokaż opóźnienia zaplanowanych karmień"
     echo "  edit          Edytuj harmonogram"
-    echo "  add [HH:MM]   Dodaj godzinę karmienia"
-    echo "  remove [HH:MM] Usuń godzinę karmienia"
+    echo "  add [HH:MM[xN]] [ID] Dodaj godzinę karmienia (xN - dawka N porcji)"
+    echo "  remove [HH:MM] [ID] Usuń godzinę karmienia"
+    echo ""
+    echo "ID - nazwa zasobnika z sekcji \"feeders\" (domyślnie pierwszy)"
     echo ""
 }
 
 test_feed() {
     echo "Test karmienia..."
     cd "$FEEDER_DIR"
-    python3 << 'EOF'
-from feeder_simple import SimpleFeeder
+    FEEDER_ID="$1" python3 << 'EOF'
+import os
 import sys
-feeder = SimpleFeeder()
-success = feeder.feed()
+from feeder_control import ControlClient, ControlError, ControlUnavailable
+feeder = os.environ.get('FEEDER_ID') or None
+try:
+    # Karmienie przez działającą usługę - czekanie dopasowane do dawki
+    result = ControlClient('feeder.sock').feed(feeder=feeder)
+    success = result.get('success', False)
+    if not success and result.get('message'):
+        print(f"✗ {result['message']}")
+except ControlUnavailable:
+    # Usługa nie działa - bezpośredni dostęp do servo
+    from feeder_simple import SimpleFeeder
+    try:
+        success = SimpleFeeder().feed(feeder=feeder)
+    except ValueError as e:
+        print(e)
+        success = False
+except ControlError as e:
+    # Komenda mogła dotrzeć do usługi - bez drugiego karmienia bezpośrednio
+    print(f"✗ {e}")
+    success = False
 sys.exit(0 if success else 1)
 EOF
     if [ $? -eq 0 ]; then
@@ -49,47 +72,109 @@ show_schedule() {
     echo "Harmonogram karmienia:"
     echo ""
     python3 << EOF
-import json
-with open('$CONFIG_FILE', 'r') as f:
-    config = json.load(f)
-    schedules = config.get('schedules', [])
-    if not schedules:
+import sys
+sys.path.insert(0, '$FEEDER_DIR')
+from feeder_store import ConfigStore, feeder_configs
+feeders = feeder_configs(ConfigStore('$CONFIG_FILE').read())
+selected = '$1'
+if selected and selected not in feeders:
+    print("  ✗ Nieznany karmnik: $1")
+    sys.exit(1)
+for name, settings in feeders.items():
+    if selected and name != selected:
+        continue
+    if len(feeders) > 1:
+        print(f"  [{name}] GPIO {settings['pin']}")
+    if not settings['schedules']:
         print("  (brak harmonogramu)")
-    else:
-        for time in sorted(schedules):
-            print(f"  🕐 {time}")
+    for time in sorted(settings['schedules']):
+        dose = settings['doses'].get(time)
+        print(f"  🕐 {time}" + (f"  × {dose}" if dose else ""))
+EOF
+}
+
+show_feeders() {
+    if [ ! -f "$CONFIG_FILE" ]; then
+        echo "✗ Brak pliku konfiguracji"
+        return
+    fi
+
+    python3 << EOF
+import sys
+sys.path.insert(0, '$FEEDER_DIR')
+from feeder_store import ConfigStore, feeder_configs, default_feeder
+config = ConfigStore('$CONFIG_FILE').read()
+default = default_feeder(config)
+for name, settings in feeder_configs(config).items():
+    mark = ' (domyślny)' if name == default else ''
+    print(f"  {name}{mark}: GPIO {settings['pin']}, porcje {settings['portions']}, godzin {len(settings['schedules'])}")
+EOF
+}
+
+show_timing() {
+    cd "$FEEDER_DIR"
+    python3 << 'EOF'
+from datetime import datetime
+from feeder_control import ControlClient, ControlError
+try:
+    timing = ControlClient('feeder.sock').call('timing')
+except ControlError:
+    print("✗ Karmnik nie działa")
+    raise SystemExit(1)
+for name, label in (('lateness', 'Start po terminie'), ('completion', 'Koniec karmienia po terminie')):
+    hist = timing[name]
+    print(f"{label}: {hist['count']} pomiarów, średnio {hist['mean']:.3f} s, maks. {hist['max']:.3f} s")
+    bounds = [f"<= {b:g} s" for b in hist['bounds']] + [f"> {hist['bounds'][-1]:g} s"]
+    for bound, count in zip(bounds, hist['counts']):
+        if count:
+            print(f"  {bound:>9s}  {count}")
+print(f"Spóźnione starty (> {timing['warn_after']:g} s): {timing['late']}")
+for fire in timing['recent']:
+    planned = datetime.fromtimestamp(fire['planned']).strftime('%m-%d %H:%M:%S')
+    end = f"+{fire['completion']:.2f} s" if fire['completion'] is not None else '-'
+    print(f"  {planned} {fire['job']}: start +{fire['lateness']:.3f} s, koniec {end} "
+          f"({fire['actuation_thread'] or fire['thread']})")
 EOF
 }
 
 add_schedule() {
     if [ -z "$1" ]; then
         echo "✗ Podaj godzinę w formacie HH:MM"
-        echo "Przykład: ./feeder.sh add 14:30"
+        echo "Przykład: ./feeder.sh add 14:30 albo ./feeder.sh add 14:30x2"
         return
     fi
 
-    TIME="$1"
-
-    # Walidacja formatu
-    if ! [[ "$TIME" =~ ^([01][0-9]|2[0-3]):[0-5][0-9]$ ]]; then
+    # Walidacja formatu (opcjonalna dawka po "x")
+    if [[ "$1" =~ ^(([01][0-9]|2[0-3]):[0-5][0-9])(x([1-9]|10))?$ ]]; then
+        TIME="${BASH_REMATCH[1]}"
+        DOSE="${BASH_REMATCH[4]}"
+    else
         echo "✗ Nieprawidłowy format. Użyj HH:MM (np. 14:30)"
         return
     fi
 
     python3 << EOF
-import json
-with open('$CONFIG_FILE', 'r') as f:
-    config = json.load(f)
+import sys
+sys.path.insert(0, '$FEEDER_DIR')
+from feeder_store import ConfigStore, feeder_configs
 
-if '$TIME' in config['schedules']:
-    print("⚠ Godzina $TIME już istnieje w harmonogramie")
-else:
-    config['schedules'].append('$TIME')
-    config['schedules'].sort()
-    with open('$CONFIG_FILE', 'w') as f:
-        json.dump(config, f, indent=2)
+store = ConfigStore('$CONFIG_FILE')
+feeder = '$2' or None
+if feeder and feeder not in feeder_configs(store.read()):
+    print("✗ Nieznany karmnik: $2")
+    sys.exit(1)
+
+# Zmiana trafia do dziennika config.json.journal - plik nie jest przepisywany
+try:
+    store.append('add', ['$TIME'], feeder=feeder, dose=int('$DOSE') if '$DOSE' else None)
+    added = True
+except ValueError:
+    added = False
+if added:
     print("✓ Dodano godzinę $TIME")
-    print("⚠ Pamiętaj zrestartować karmnik: sudo systemctl restart feeder")
+    print("⚠ Karmnik wczyta zmianę automatycznie")
+else:
+    print("⚠ Godzina $TIME już istnieje w harmonogramie")
 EOF
 }
 
@@ -103,16 +188,24 @@ remove_schedule() {
     TIME="$1"
 
     python3 << EOF
-import json
-with open('$CONFIG_FILE', 'r') as f:
-    config = json.load(f)
-
-if '$TIME' in config['schedules']:
-    config['schedules'].remove('$TIME')
-    with open('$CONFIG_FILE', 'w') as f:
-        json.dump(config, f, indent=2)
+import sys
+sys.path.insert(0, '$FEEDER_DIR')
+from feeder_store import ConfigStore, feeder_configs
+
+store = ConfigStore('$CONFIG_FILE')
+feeder = '$2' or None
+if feeder and feeder not in feeder_configs(store.read()):
+    print("✗ Nieznany karmnik: $2")
+    sys.exit(1)
+
+try:
+    store.append('remove', ['$TIME'], feeder=feeder)
+    removed = True
+except ValueError:
+    removed = False
+if removed:
     print("✓ Usunięto godzinę $TIME")
-    print("⚠ Pamiętaj zrestartować karmnik: sudo systemctl restart feeder")
+    print("⚠ Karmnik wczyta zmianę automatycznie")
 else:
     print("✗ Godzina $TIME nie istnieje w harmonogramie")
 EOF
@@ -138,27 +231,35 @@ case "$1" in
     status)
         sudo systemctl status feeder.service
         ;;
+    info)
+        python3 "$FEEDER_DIR/feeder_status.py"
+        ;;
     logs)
         echo "Logi karmnika (Ctrl+C aby wyjść)..."
         sudo journalctl -u feeder.service -f
         ;;
     test)
-        test_feed
+        test_feed "$2"
         ;;
     schedule)
-        show_schedule
+        show_schedule "$2"
+        ;;
+    feeders)
+        show_feeders
+        ;;
+    timing)
+        show_timing
         ;;
     edit)
         nano "$CONFIG_FILE"
         echo ""
-        echo "Zrestartuj karmnik aby zastosować zmiany:"
-        echo "  sudo systemctl restart feeder.service"
+        echo "Karmnik wczyta zmiany automatycznie (bez restartu)"
         ;;
     add)
-        add_schedule "$2"
+        add_schedule "$2" "$3"
         ;;
     remove)
-        remove_schedule "$2"
+        remove_schedule "$2" "$3"
         ;;
     help|--help|-h|"")
         show_help
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Lokalne API sterujące karmnikiem przez gniazdo Unix
+Jedna linia JSON na żądanie i jedna na odpowiedź,
+po komendzie 'subscribe' połączenie dostaje też zdarzenia {"event": ..., "data": ...}
+"""
+
+import grp
+import json
+import logging
+import os
+import socket
+import threading
+
+log = logging.getLogger('feeder.control')
+
+DEFAULT_SOCKET = 'feeder.sock'
+# Grupa użytkowników z dostępem do gniazda (panel web, feeder.sh) - tworzy ją feeder_setup.sh
+DEFAULT_GROUP = 'feeder'
+
+
+# Czekanie na wynik karmienia: szacowany czas kolejki i dawki razy zapas plus stały margines (s)
+FEED_WAIT_FACTOR = 2.0
+FEED_WAIT_MARGIN = 5.0
+
+
+class ControlError(Exception):
+    """Błąd komunikacji z karmnikiem"""
+
+
+class ControlUnavailable(ControlError):
+    """Karmnik nie działa - żadna komenda do niego nie dotarła"""
+
+
+class ControlServer:
+    def __init__(self, path, handlers, group=DEFAULT_GROUP):
+        """
+        path - ścieżka gniazda Unix
+        handlers - słownik {komenda: funkcja(**args) -> dict}
+        group - grupa z prawem do sterowania (poza właścicielem), None - tylko właściciel
+        """
+        self.path = path
+        self.handlers = handlers
+        self.group = group
+        self.sock = None
+        self.running = True
+        self.subscribers = {}
+        self._sub_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Otwórz gniazdo i obsługuj klientów w tle"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        # Panel web działa jako inny użytkownik niż usługa - dostęp przez grupę, nie dla wszystkich
+        os.chmod(self.path, 0o660)
+        self._set_group()
+        self.sock.listen(8)
+
+        self._thread = threading.Thread(target=self._accept_loop, name='control', daemon=True)
+        self._thread.start()
+        log.info(f"API sterujące nasłuchuje na {self.path}")
+
+    def _set_group(self):
+        """Nadaj gniazdu grupę z prawem do sterowania"""
+        if not self.group:
+            return
+        try:
+            os.chown(self.path, -1, grp.getgrnam(self.group).gr_gid)
+        except (KeyError, OSError) as e:
+            log.warning(f"Nie można nadać gniazdu grupy {self.group} ({e}) - dostęp tylko dla właściciela")
+
+    def _accept_loop(self):
+        """Przyjmuj połączenia - każdy klient w osobnym wątku"""
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _serve_client(self, conn):
+        """Obsłuż kolejne żądania z jednego połączenia"""
+        send_lock = threading.Lock()
+        try:
+            with conn, conn.makefile('rb') as rfile:
+                for line in rfile:
+                    if self._is_subscribe(line):
+                        with self._sub_lock:
+                            self.subscribers[conn] = send_lock
+                        response = {'success': True}
+                    else:
+                        response = self.dispatch(line)
+                    if not self._send(conn, send_lock, response):
+                        break
+        finally:
+            with self._sub_lock:
+                self.subscribers.pop(conn, None)
+
+    @staticmethod
+    def _is_subscribe(line):
+        """Czy linia to prośba o subskrypcję zdarzeń"""
+        try:
+            return json.loads(line).get('cmd') == 'subscribe'
+        except (json.JSONDecodeError, AttributeError):
+            return False
+
+    @staticmethod
+    def _send(conn, send_lock, message):
+        """Wyślij jedną linię JSON - False gdy połączenie zerwane"""
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        try:
+            with send_lock:
+                conn.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    def publish(self, event, data):
+        """Wyślij zdarzenie do wszystkich subskrybentów (bezpieczne z dowolnego wątku)"""
+        with self._sub_lock:
+            subscribers = list(self.subscribers.items())
+        for conn, send_lock in subscribers:
+            if not self._send(conn, send_lock, {'event': event, 'data': data}):
+                with self._sub_lock:
+                    self.subscribers.pop(conn, None)
+
+    def dispatch(self, line):
+        """Wykonaj jedną komendę i zwróć odpowiedź"""
+        try:
+            request = json.loads(line)
+            command = request.get('cmd')
+            handler = self.handlers.get(command)
+            if handler is None:
+                return {'success': False, 'message': f'Nieznana komenda: {command}'}
+            return handler(**request.get('args', {}))
+        except json.JSONDecodeError:
+            return {'success': False, 'message': 'Błąd parsowania JSON'}
+        except Exception as e:
+            log.error(f"Błąd komendy sterującej: {e}")
+            return {'success': False, 'message': str(e)}
+
+    def stop(self):
+        """Zamknij gniazdo"""
+        self.running = False
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ControlClient:
+    def __init__(self, path=DEFAULT_SOCKET, timeout=10.0):
+        """Klient API z pulą trwałych połączeń"""
+        self.path = path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Otwórz nowe połączenie z karmnikiem"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise ControlUnavailable(f"Karmnik nie odpowiada ({self.path}): {e}")
+        return sock, sock.makefile('rb')
+
+    def _acquire(self):
+        """Weź wolne połączenie z puli albo otwórz nowe"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        """Oddaj połączenie do puli"""
+        with self._lock:
+            self._idle.append(conn)
+
+    @staticmethod
+    def _discard(conn):
+        """Zamknij zepsute połączenie"""
+        sock, rfile = conn
+        try:
+            rfile.close()
+            sock.close()
+        except OSError:
+            pass
+
+    def call(self, cmd, timeout=None, **args):
+        """Wyślij komendę i poczekaj na odpowiedź (timeout - inny niż domyślny czas czekania)"""
+        payload = (json.dumps({'cmd': cmd, 'args': args}) + '\n').encode('utf-8')
+
+        # Połączenie z puli mogło zostać zamknięte przez restart usługi - jedna ponowna próba,
+        # ale tylko gdy karmnik na pewno nie dostał komendy (ponowny 'feed' to podwójna porcja)
+        for _ in range(2):
+            conn, reused = self._acquire()
+            sock, rfile = conn
+            try:
+                sock.sendall(payload)
+            except OSError as e:
+                self._discard(conn)
+                if reused:
+                    continue
+                raise ControlError(f"Błąd komunikacji z karmnikiem: {e}")
+
+            try:
+                if timeout is not None:
+                    sock.settimeout(timeout)
+                line = rfile.readline()
+                if timeout is not None:
+                    sock.settimeout(self.timeout)
+            except OSError as e:
+                # Także przekroczony czas - komenda mogła się już wykonać
+                self._discard(conn)
+                raise ControlError(f"Brak odpowiedzi karmnika: {e}")
+            if not line:
+                # Zamknięte bez odpowiedzi - stare połączenie z puli, komenda nieodczytana
+                self._discard(conn)
+                if reused:
+                    continue
+                raise ControlError("Błąd komunikacji z karmnikiem: połączenie zamknięte")
+            if not line.endswith(b'\n'):
+                self._discard(conn)
+                raise ControlError("Niepełna odpowiedź karmnika")
+            self._release(conn)
+            return json.loads(line)
+
+        raise ControlError("Błąd komunikacji z karmnikiem")
+
+    def feed(self, feeder=None, portions=None):
+        """
+        Karmienie z czekaniem dopasowanym do dawki i kolejki. Komenda 'feed' wraca od razu,
+        na wynik czeka feed_result - jego ponowienie nie karmi drugi raz.
+        """
+        queued = self.call('feed', feeder=feeder, portions=portions, wait=False)
+        if not queued.get('queued'):
+            return queued
+        wait = queued.get('eta', 0) * FEED_WAIT_FACTOR + FEED_WAIT_MARGIN
+        return self.call('feed_result', timeout=wait + self.timeout, ticket=queued['ticket'], wait=wait)
+
+    def subscribe(self):
+        """Generator zdarzeń z osobnego połączenia - ControlError po jego zerwaniu"""
+        sock, rfile = self._connect()
+        sock.settimeout(None)
+        try:
+            sock.sendall(b'{"cmd": "subscribe"}\n')
+            if not rfile.readline():
+                raise ControlError("Subskrypcja odrzucona")
+            yield 'subscribed', {}
+            for line in rfile:
+                message = json.loads(line)
+                if 'event' in message:
+                    yield message['event'], message.get('data', {})
+        except OSError as e:
+            raise ControlError(f"Subskrypcja przerwana: {e}")
+        finally:
+            self._discard((sock, rfile))
+        raise ControlError("Karmnik zamknął połączenie")
+
+    def close(self):
+        """Zamknij wszystkie połączenia"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Rozgłaszanie zdarzeń karmnika do wielu odbiorców (Server-Sent Events)
+Jedno połączenie z usługą niezależnie od liczby otwartych paneli,
+strumienie przeglądarek obsługiwane przez jeden wątek z selektorem
+"""
+
+import json
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from feeder_control import ControlError
+
+log = logging.getLogger('feeder.web')
+
+# Co tyle sekund strumień w puli serwera sprawdza, czy karta nie została zamknięta
+DISCONNECT_POLL = 1.0
+
+
+class EventHub:
+    def __init__(self, client, queue_size=64, reconnect_delay=3.0):
+        """
+        client - ControlClient używany do subskrypcji zdarzeń usługi
+        queue_size - bufor zdarzeń jednego odbiorcy; wolny odbiorca gubi najstarsze
+        """
+        self.client = client
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.active = None
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, limit=None):
+        """Nowy odbiorca - zwraca kolejkę zdarzeń (event, data), None gdy jest już limit odbiorców"""
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscriber)
+        self.ensure_started()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Usuń odbiorcę"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def add_listener(self, listener):
+        """Funkcja listener(event, data) wołana przy każdym zdarzeniu - musi wracać od razu"""
+        with self._lock:
+            self._listeners.append(listener)
+        self.ensure_started()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Przekaż zdarzenie wszystkim odbiorcom bez blokowania"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event, data)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Odbiorca nie nadąża - zrób miejsce kosztem najstarszego zdarzenia
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event, data))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _set_active(self, active):
+        """Zmiana dostępności usługi jako zdarzenie 'status'"""
+        if active != self.active:
+            self.active = active
+            self.publish('status', {'active': active})
+
+    def _upstream(self):
+        """Utrzymuj subskrypcję zdarzeń usługi, wznawiaj po restarcie"""
+        while True:
+            try:
+                events = self.client.subscribe()
+                for event, data in events:
+                    if event == 'subscribed':
+                        self._set_active(True)
+                    else:
+                        self.publish(event, data)
+            except ControlError as e:
+                if self.active:
+                    log.info(f"Utracono strumień zdarzeń karmnika: {e}")
+            self._set_active(False)
+            time.sleep(self.reconnect_delay)
+
+    def ensure_started(self):
+        """Uruchom wątek subskrypcji przy pierwszym odbiorcy"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._upstream, name='event-hub', daemon=True)
+                self._thread.start()
+
+    def stream(self, subscriber, keepalive=15.0, disconnected=None):
+        """
+        Generator treści text/event-stream dla odbiorcy z subscribe()
+        disconnected - funkcja sprawdzająca zamknięcie połączenia (waitress), zwalnia wątek
+                       zamkniętej karty bez czekania na nieudany zapis
+        """
+        # Stan znany w chwili subskrypcji - późniejsze zmiany przyjdą przez kolejkę
+        initial = self.active
+        poll = min(keepalive, DISCONNECT_POLL) if disconnected is not None else keepalive
+        try:
+            yield 'retry: 3000\n\n'
+            if initial is not None:
+                yield format_event('status', {'active': initial})
+            idle = 0.0
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=poll)
+                except queue.Empty:
+                    if disconnected is not None and disconnected():
+                        return
+                    idle += poll
+                    if idle >= keepalive:
+                        # Komentarz utrzymuje połączenie przez proxy i wykrywa zamknięte karty
+                        idle = 0.0
+                        yield ': keepalive\n\n'
+                    continue
+                idle = 0.0
+                yield format_event(event, data)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class EventStreamServer:
+    # Nagłówki odpowiedzi - strona panelu jest na innym porcie, stąd CORS
+    HEADERS = (
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: text/event-stream\r\n'
+        b'Cache-Control: no-cache\r\n'
+        b'X-Accel-Buffering: no\r\n'
+        b'Access-Control-Allow-Origin: *\r\n'
+        b'Connection: keep-alive\r\n\r\n'
+        b'retry: 3000\n\n'
+    )
+    MAX_REQUEST = 8192
+
+    def __init__(self, hub, host='0.0.0.0', port=5001, max_clients=256, max_buffer=65536, keepalive=15.0):
+        """
+        Strumienie /api/events bez wątku na odbiorcę - jeden wątek rozsyła zdarzenia do wszystkich gniazd
+        max_buffer - tyle bajtów może czekać na wolnego odbiorcę, potem jest rozłączany
+        (przeglądarka wznawia strumień sama)
+        """
+        self.hub = hub
+        self.max_clients = max_clients
+        self.max_buffer = max_buffer
+        self.keepalive = keepalive
+        self.running = True
+        self.sock = socket.create_server((host, port))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ, 'accept')
+        # Zdarzenia z wątku EventHub trafiają do pętli przez kolejkę i budzik
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._selector.register(self._wake_recv, selectors.EVENT_READ, 'wake')
+        self._pending = deque()
+        self._requests = {}
+        self._clients = {}
+        self._thread = None
+
+    def client_count(self):
+        return len(self._clients)
+
+    def _on_event(self, event, data):
+        """Listener EventHub - przekaż zdarzenie do pętli (dowolny wątek)"""
+        self._pending.append(format_event(event, data).encode('utf-8'))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_send.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Pełny bufor budzika - pętla i tak się obudzi
+            pass
+
+    def _accept(self):
+        try:
+            conn, _ = self.sock.accept()
+        except (BlockingIOError, OSError):
+            return
+        conn.setblocking(False)
+        self._requests[conn] = bytearray()
+        self._selector.register(conn, selectors.EVENT_READ, 'request')
+
+    def _read_request(self, conn):
+        """Nagłówek żądania - po komplecie gniazdo staje się odbiorcą zdarzeń"""
+        try:
+            data = conn.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        buffer = self._requests[conn]
+        buffer += data
+        if not data or len(buffer) > self.MAX_REQUEST:
+            self._drop(conn)
+            return
+        if b'\r\n\r\n' not in buffer:
+            return
+
+        del self._requests[conn]
+        method, _, rest = bytes(buffer).partition(b' ')
+        path = rest.split(b' ', 1)[0].split(b'?', 1)[0]
+        if method != b'GET' or path != b'/api/events':
+            self._reject(conn, b'404 Not Found')
+        elif len(self._clients) >= self.max_clients:
+            self._reject(conn, b'503 Service Unavailable')
+        else:
+            out = bytearray(self.HEADERS)
+            if self.hub.active is not None:
+                out += format_event('status', {'active': self.hub.active}).encode('utf-8')
+            self._clients[conn] = out
+            self._selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, 'client')
+
+    def _reject(self, conn, status):
+        """Krótka odpowiedź błędu i zamknięcie (gniazdo ma pusty bufor - sendall nie blokuje)"""
+        try:
+            conn.send(b'HTTP/1.1 ' + status + b'\r\nContent-Length: 0\r\n'
+                      b'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n')
+        except OSError:
+            pass
+        self._drop(conn)
+
+    def _drop(self, conn):
+        self._requests.pop(conn, None)
+        self._clients.pop(conn, None)
+        try:
+            self._selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+    def _broadcast(self, message):
+        """Dopisz wiadomość do bufora każdego odbiorcy - zbyt wolnych rozłącz"""
+        for conn, out in list(self._clients.items()):
+            if not out:
+                self._selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, 'client')
+            out += message
+            if len(out) > self.max_buffer:
+                # Przed rozłączeniem oddaj ile się da do bufora gniazda
+                self._write(conn)
+                if conn in self._clients and len(out) > self.max_buffer:
+                    log.info("Odbiorca strumienia zdarzeń nie nadąża - rozłączam")
+                    self._drop(conn)
+
+    def _write(self, conn):
+        out = self._clients[conn]
+        try:
+            sent = conn.send(out)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(conn)
+            return
+        del out[:sent]
+        if not out:
+            self._selector.modify(conn, selectors.EVENT_READ, 'client')
+
+    def _read_client(self, conn):
+        """Odbiorca nic nie wysyła - odczyt oznacza zamknięcie karty"""
+        try:
+            data = conn.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(conn)
+
+    def run(self):
+        """Pętla selektora: przyjmowanie, rozsyłanie zdarzeń i keepalive"""
+        self.hub.add_listener(self._on_event)
+        next_keepalive = time.monotonic() + self.keepalive
+        while self.running:
+            timeout = max(0.0, next_keepalive - time.monotonic())
+            for key, mask in self._selector.select(timeout):
+                conn, kind = key.fileobj, key.data
+                if kind == 'accept':
+                    self._accept()
+                elif kind == 'wake':
+                    try:
+                        while self._wake_recv.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                elif kind == 'request':
+                    self._read_request(conn)
+                elif conn in self._clients:
+                    if mask & selectors.EVENT_READ:
+                        self._read_client(conn)
+                    if mask & selectors.EVENT_WRITE and conn in self._clients:
+                        self._write(conn)
+
+            while self._pending:
+                self._broadcast(self._pending.popleft())
+            if time.monotonic() >= next_keepalive:
+                # Komentarz utrzymuje połączenie przez proxy i wykrywa zamknięte karty
+                self._broadcast(b': keepalive\n\n')
+                next_keepalive = time.monotonic() + self.keepalive
+
+        for conn in list(self._requests) + list(self._clients):
+            self._drop(conn)
+        self._selector.close()
+        self.sock.close()
+        self._wake_recv.close()
+        self._wake_send.close()
+
+    def start(self):
+        """Uruchom pętlę w osobnym wątku"""
+        self._thread = threading.Thread(target=self.run, name='event-stream', daemon=True)
+        self._thread.start()
+        log.info(f"Strumień zdarzeń na porcie {self.port}")
+        return self._thread
+
+    def stop(self):
+        self.running = False
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+
+def format_event(event, data):
+    """Jedna wiadomość w formacie Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
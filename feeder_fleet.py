@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Tryb floty - jeden panel dla wielu karmników (Raspberry Pi z feeder_web_page)
+Zapytania do węzłów idą równolegle po trwałych połączeniach HTTP, wyniki są krótko buforowane
+"""
+
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlencode, urlsplit
+
+log = logging.getLogger('feeder.fleet')
+
+DEFAULT_TIMEOUT = 3.0
+DEFAULT_CACHE_TTL = 2.0
+DEFAULT_WORKERS = 16
+POOL_SIZE = 4
+
+
+class FleetError(Exception):
+    """Węzeł floty nie odpowiedział albo zwrócił błąd HTTP"""
+
+
+def load_nodes(value):
+    """
+    Lista węzłów {nazwa: url} z pliku JSON albo z tekstu "nazwa=url,url2,...".
+    Plik może zawierać słownik {nazwa: url} albo listę adresów.
+    """
+    if not value:
+        return {}
+    if os.path.isfile(value):
+        with open(value) as f:
+            entries = json.load(f)
+    else:
+        entries = [item.strip() for item in value.split(',') if item.strip()]
+
+    if isinstance(entries, dict):
+        items = entries.items()
+    else:
+        items = [entry.split('=', 1) if '=' in entry else (None, entry) for entry in entries]
+
+    nodes = {}
+    for name, url in items:
+        if '://' not in url:
+            url = 'http://' + url
+        nodes[name or urlsplit(url).netloc] = url.rstrip('/')
+    return nodes
+
+
+class NodeClient:
+    def __init__(self, name, url, timeout=DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        """Klient jednego węzła z pulą połączeń keep-alive"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Nieobsługiwany adres węzła: {url}")
+        self.name = name
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Nowe połączenie HTTP z węzłem"""
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        """Weź wolne połączenie z puli albo otwórz nowe"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        """Oddaj połączenie do puli (nadmiarowe zamknij)"""
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, path, params=None, body=None):
+        """Wyślij żądanie i zwróć odpowiedź JSON - FleetError przy błędzie"""
+        url = self.base + path
+        if params:
+            url += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'identity'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        # Połączenie z puli mogło zostać zamknięte przez węzeł - jedna ponowna próba
+        for _ in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused and not isinstance(e, TimeoutError):
+                    continue
+                raise FleetError(f"{self.name}: {e}")
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+
+            if response.status >= 400 and response.status != 409:
+                raise FleetError(f"{self.name}: HTTP {response.status}")
+            try:
+                return json.loads(data)
+            except ValueError:
+                raise FleetError(f"{self.name}: nieprawidłowa odpowiedź")
+
+        raise FleetError(f"{self.name}: brak połączenia")
+
+    def close(self):
+        """Zamknij połączenia z puli"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class Fleet:
+    def __init__(self, nodes, timeout=DEFAULT_TIMEOUT, cache_ttl=DEFAULT_CACHE_TTL,
+                 max_workers=DEFAULT_WORKERS):
+        """
+        nodes - {nazwa: url} węzłów z feeder_web_page
+        timeout - limit czasu odpowiedzi jednego węzła (s)
+        cache_ttl - jak długo (s) wynik zapytania jest aktualny
+        """
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.clients = {name: NodeClient(name, url, timeout) for name, url in nodes.items()}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(self.clients))),
+            thread_name_prefix='fleet'
+        )
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def names(self, selected=None):
+        """Węzły do zapytania - wszystkie albo wybrane (ValueError dla nieznanych)"""
+        if not selected:
+            return list(self.clients)
+        unknown = [name for name in selected if name not in self.clients]
+        if unknown:
+            raise ValueError(f"Nieznane węzły: {', '.join(unknown)}")
+        return list(dict.fromkeys(selected))
+
+    def _cached(self, key, loader):
+        """Wynik z bufora albo świeży odczyt (błędy nie są buforowane)"""
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        return value
+
+    def invalidate(self, names=None):
+        """Usuń z bufora wyniki podanych węzłów (wszystkich dla None)"""
+        with self._cache_lock:
+            if names is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[0] in names]:
+                    del self._cache[key]
+
+    def fanout(self, func, names):
+        """
+        Wywołaj func(client) równolegle na węzłach.
+        Zwraca {nazwa: {'ok', 'result'|'error', 'elapsed'}}; węzeł, który nie zdążył, dostaje błąd.
+        """
+        started = time.monotonic()
+
+        def run(client):
+            t0 = time.monotonic()
+            return func(client), time.monotonic() - t0
+
+        futures = {name: self._executor.submit(run, self.clients[name]) for name in names}
+        # Limit na węzeł plus zapas na kolejkę w puli wątków
+        wait(futures.values(), timeout=self.timeout * 2 + 1)
+
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                results[name] = {'ok': False, 'error': 'Przekroczono czas odpowiedzi',
+                                 'elapsed': round(time.monotonic() - started, 3)}
+                continue
+            try:
+                result, elapsed = future.result()
+                results[name] = {'ok': True, 'result': result, 'elapsed': round(elapsed, 3)}
+            except (FleetError, ValueError) as e:
+                results[name] = {'ok': False, 'error': str(e)}
+            except Exception as e:
+                log.error(f"Błąd zapytania do węzła {name}: {e}")
+                results[name] = {'ok': False, 'error': str(e)}
+        return results
+
+    def overview(self, feeder=None):
+        """Stan i harmonogram wszystkich węzłów"""
+        def node_overview(client):
+            return self._cached((client.name, 'overview', feeder), lambda: {
+                'status': client.request('GET', '/api/status'),
+                'schedules': client.request('GET', '/api/schedules', {'feeder': feeder}),
+            })
+        return self.fanout(node_overview, self.names())
+
+    def history(self, start=None, end=None, limit=None, feeder=None, names=None):
+        """Karmienia z wielu węzłów połączone w jedną listę od najnowszych"""
+        params = {'from': start, 'to': end, 'limit': limit, 'feeder': feeder}
+        key = tuple(sorted(params.items()))
+
+        def node_history(client):
+            return self._cached((client.name, 'history', key),
+                                lambda: client.request('GET', '/api/history', params))
+
+        results = self.fanout(node_history, self.names(names))
+        merged = []
+        errors = {}
+        for name, result in results.items():
+            if not result['ok']:
+                errors[name] = result['error']
+            elif not result['result'].get('success'):
+                errors[name] = result['result'].get('message', 'Błąd węzła')
+            else:
+                merged.extend(dict(entry, node=name) for entry in result['result'].get('history', []))
+        merged.sort(key=lambda entry: entry.get('ts', 0), reverse=True)
+        if limit:
+            merged = merged[:int(limit)]
+        return merged, errors
+
+    def push_schedules(self, names, op, times, feeder=None):
+        """Wyślij tę samą zmianę harmonogramu równolegle do wybranych węzłów"""
+        methods = {'add': 'POST', 'remove': 'DELETE', 'replace': 'PUT'}
+        if op not in methods:
+            raise ValueError(f"Nieznana operacja: {op}")
+        names = self.names(names)
+        body = {'feeder': feeder}
+        body['schedules' if op == 'replace' else 'times'] = list(times)
+
+        results = self.fanout(lambda client: client.request(methods[op], '/api/schedules', body=body), names)
+        self.invalidate(set(names))
+        for name, result in results.items():
+            if not result['ok']:
+                log.warning(f"Zmiana harmonogramu nie dotarła do {name}: {result['error']}")
+        return results
+
+    def close(self):
+        """Zatrzymaj pulę wątków i zamknij połączenia"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients.values():
+            client.close()
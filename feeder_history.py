@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Dziennik karmień w SQLite (WAL) z indeksem po czasie
+Zapytania po zakresie dat zamiast przeszukiwania feeder.log
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger('feeder.history')
+
+DEFAULT_HISTORY_FILE = 'history.db'
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    merged INTEGER NOT NULL DEFAULT 0,
+    feeder TEXT NOT NULL DEFAULT 'main',
+    dose INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS feeds_ts ON feeds (ts);
+"""
+
+COLUMNS = ('ts', 'kind', 'source', 'duration', 'success', 'merged', 'feeder', 'dose')
+
+# Kolumny dodane po pierwszej wersji bazy
+MIGRATIONS = {
+    'feeder': "ALTER TABLE feeds ADD COLUMN feeder TEXT NOT NULL DEFAULT 'main'",
+    'dose': "ALTER TABLE feeds ADD COLUMN dose INTEGER NOT NULL DEFAULT 1",
+}
+
+DEFAULT_RATION_DAYS = 7
+
+
+def feed_kind(source):
+    """Zaplanowane czy ręczne"""
+    return 'scheduled' if source == 'schedule' else 'manual'
+
+
+def parse_timestamp(value):
+    """Znacznik czasu z liczby sekund, daty 'RRRR-MM-DD' albo ISO 8601; None dla pustej wartości"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Nieprawidłowa data: {value}")
+
+
+class FeedHistory:
+    def __init__(self, path=DEFAULT_HISTORY_FILE):
+        """Otwórz (lub utwórz) bazę dziennika"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Przy WAL utrata zasilania może zgubić ostatni wpis, ale nie uszkodzi bazy
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Dodaj kolumny brakujące w bazach z poprzednich wersji"""
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(feeds)')}
+        for column, sql in MIGRATIONS.items():
+            if column not in existing:
+                self._conn.execute(sql)
+
+    def record(self, source, success, duration, ts=None, merged=0, feeder='main', dose=1):
+        """Dopisz zdarzenie karmienia (dose - wydane porcje)"""
+        if ts is None:
+            ts = time.time() - duration
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO feeds (ts, kind, source, duration, success, merged, feeder, dose) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (ts, feed_kind(source), source, duration, 1 if success else 0, merged, feeder, dose)
+            )
+
+    def query(self, start=None, end=None, limit=DEFAULT_LIMIT, feeder=None):
+        """Karmienia z zakresu [start, end), od najnowszych - przeszukiwanie indeksu po ts"""
+        limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+        start = parse_timestamp(start)
+        end = parse_timestamp(end)
+
+        sql = f'SELECT {", ".join(COLUMNS)} FROM feeds WHERE ts >= ?'
+        params = [start if start is not None else 0.0]
+        if end is not None:
+            sql += ' AND ts < ?'
+            params.append(end)
+        if feeder:
+            sql += ' AND feeder = ?'
+            params.append(feeder)
+        sql += ' ORDER BY ts DESC LIMIT ?'
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        history = []
+        for row in rows:
+            entry = dict(zip(COLUMNS, row))
+            entry['success'] = bool(entry['success'])
+            entry['time'] = datetime.fromtimestamp(entry['ts']).isoformat(timespec='seconds')
+            history.append(entry)
+        return history
+
+    def rations(self, start=None, end=None, feeder=None):
+        """
+        Dzienna racja: suma porcji udanych karmień na dzień (czas lokalny) i zasobnik.
+        Domyślnie ostatnie DEFAULT_RATION_DAYS dni, od najnowszego.
+        """
+        start = parse_timestamp(start)
+        end = parse_timestamp(end)
+        if start is None:
+            midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start = midnight.timestamp() - (DEFAULT_RATION_DAYS - 1) * 86400
+
+        sql = ("SELECT date(ts, 'unixepoch', 'localtime') AS day, feeder, SUM(dose), COUNT(*) "
+               "FROM feeds WHERE ts >= ? AND success = 1")
+        params = [start]
+        if end is not None:
+            sql += ' AND ts < ?'
+            params.append(end)
+        if feeder:
+            sql += ' AND feeder = ?'
+            params.append(feeder)
+        sql += ' GROUP BY day, feeder ORDER BY day DESC, feeder'
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{'day': day, 'feeder': name, 'portions': portions, 'feeds': feeds}
+                for day, name, portions, feeds in rows]
+
+    def ration_today(self, feeder=None):
+        """Suma porcji wydanych dzisiaj"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        return sum(entry['portions'] for entry in self.rations(today, feeder=feeder) if entry['day'] == today)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_history(path=DEFAULT_HISTORY_FILE):
+    """Utwórz FeedHistory lub None, gdy baza jest niedostępna"""
+    try:
+        return FeedHistory(path)
+    except sqlite3.Error as e:
+        log.error(f"Dziennik karmień wyłączony ({path}): {e}")
+        return None
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Zasobnik karmnika - jedno servo z własnym wątkiem wykonawczym i listą godzin
+Kilka zasobników w jednym procesie, ruch servo ograniczony wspólnym budżetem mocy
+"""
+
+import logging
+import threading
+from contextlib import contextmanager, ExitStack
+from functools import partial
+from feeder_actuator import Actuator, PRIORITY_MANUAL
+from feeder_motion import resolve_profile
+from feeder_store import schedule_tag
+
+log = logging.getLogger('feeder.actuator')
+
+# Domyślnie porusza się jedno servo naraz - kilka serw ruszających jednocześnie
+# potrafi zbić napięcie zasilania Raspberry Pi
+DEFAULT_POWER_BUDGET = 1
+
+
+class Hopper:
+    def __init__(self, name, pin, pin_factory=None, power=None, portions=1, profile=None,
+                 queue_size=4, coalesce_window=5.0, on_complete=None, servo_init=None):
+        """
+        name - identyfikator zasobnika w API (np. 'main', 'koty')
+        pin - GPIO servo
+        pin_factory - fabryka pinów gpiozero (PiGPIOFactory, w testach MockFactory)
+        power - semafor budżetu mocy wspólny dla wszystkich zasobników
+        portions - domyślna dawka (liczba obrotów) jednego karmienia
+        profile - MotionProfile jednego obrotu (domyślnie 'gentle')
+        on_complete - wywoływane jako on_complete(name, request, success, duration)
+        servo_init - wywoływane jako servo_init(hopper) przy pierwszym karmieniu, gdy servo
+                     nie jest jeszcze zainicjalizowane (tryb szybkiego startu)
+        """
+        self.name = name
+        self.pin = pin
+        self.pin_factory = pin_factory
+        self.power = power or threading.BoundedSemaphore(DEFAULT_POWER_BUDGET)
+        self.portions = portions
+        self.profile = profile or resolve_profile({}, None)
+        self.last_motion = None
+        self.schedules = []
+        # Dawki wybranych godzin {godzina: porcje}
+        self.doses = {}
+        self.servo = None
+        self.servo_init = servo_init
+
+        # Tylko wątek zasobnika porusza jego servo - pozostałe wątki zlecają karmienie
+        self.actuator = Actuator(
+            self.cycle,
+            max_queue=queue_size,
+            coalesce_window=coalesce_window,
+            on_complete=partial(on_complete, name) if on_complete else None,
+            name=f'actuator-{name}'
+        )
+
+    def init_servo(self):
+        """Inicjalizacja servo - wyjątek, gdy pin jest niedostępny"""
+        # gpiozero importowane dopiero tutaj - import trwa na Pi Zero kilkaset ms
+        from gpiozero import Servo
+        self.servo = Servo(
+            self.pin,
+            pin_factory=self.pin_factory,
+            min_pulse_width=0.5 / 1000,
+            max_pulse_width=2.5 / 1000
+        )
+        log.info(f"[{self.name}] Servo zainicjalizowane na GPIO {self.pin}")
+
+    def start(self):
+        """Uruchom wątek wykonawczy zasobnika"""
+        self.actuator.start()
+
+    def request_feed(self, source='manual', priority=PRIORITY_MANUAL, portions=None):
+        """Zleć karmienie bez czekania - zwraca Future, QueueFull gdy kolejka pełna"""
+        return self.actuator.submit(source, priority, portions or self.portions)
+
+    def estimate(self, portions=None):
+        """Szacowany czas (s) do końca nowego karmienia: kolejka zasobnika i jego dawka"""
+        portions = max(1, portions or self.portions)
+        return (self.actuator.backlog() + portions) * self.profile.duration
+
+    def dose_for(self, time_str):
+        """Dawka zaplanowanego karmienia o podanej godzinie"""
+        return self.doses.get(time_str, self.portions)
+
+    def cycle(self, portions=None):
+        """Jedno karmienie (wątek zasobnika) - czeka na wolne miejsce w budżecie mocy"""
+        with self.power:
+            return self.run_servo(portions)
+
+    def run_servo(self, portions=None):
+        """Obroty servo dla całej dawki jeden po drugim, detach dopiero po ostatnim"""
+        if self.servo is None and self.servo_init is not None:
+            self.servo_init(self)
+        if self.servo is None:
+            log.error(f"[{self.name}] Servo nie jest zainicjalizowane")
+            return False
+
+        try:
+            profile = self.profile
+            portions = max(1, portions or self.portions)
+            log.info(f"[{self.name}] Rozpoczynam karmienie: {portions} porcji (profil {profile.name})...")
+
+            for _ in range(portions):
+                self.last_motion = profile.play(self.servo)
+                log.debug(f"[{self.name}] Ruch {profile.name}: {self.last_motion['actual']:.3f} s, "
+                          f"błąd {self.last_motion['error'] * 1000:.1f} ms, "
+                          f"maks. opóźnienie próbki {self.last_motion['max_late'] * 1000:.1f} ms")
+
+            # Detach servo aby nie trzymało pozycji
+            self.servo.detach()
+
+            log.info(f"[{self.name}] Karmienie zakończone")
+            return True
+
+        except Exception as e:
+            log.error(f"[{self.name}] Błąd podczas karmienia: {e}")
+            return False
+
+    @property
+    def tag(self):
+        """Skrót aktualnej listy godzin"""
+        return schedule_tag(self.schedules)
+
+    def job_key(self, time_str):
+        """Klucz zadania we wspólnym harmonogramie"""
+        return (self.name, time_str)
+
+    def apply_schedules(self, scheduler, new_schedules, callback):
+        """
+        Wprowadź do harmonogramu tylko różnicę względem obecnej listy.
+        callback(name, time_str) wywoływany o każdej godzinie. Zwraca (dodane, usunięte).
+        """
+        added = []
+        removed = [t for t in self.schedules if t not in new_schedules]
+
+        for time_str in removed:
+            scheduler.remove(self.job_key(time_str))
+        for time_str in new_schedules:
+            if time_str in self.schedules or time_str in added:
+                continue
+            try:
+                scheduler.add(time_str, callback, self.name, time_str, key=self.job_key(time_str))
+                added.append(time_str)
+            except ValueError as e:
+                log.error(f"[{self.name}] Błąd dodawania harmonogramu {time_str}: {e}")
+
+        kept = set(self.schedules) | set(added)
+        self.schedules = [t for t in dict.fromkeys(new_schedules) if t in kept]
+        return added, removed
+
+    def stats(self):
+        """Stan zasobnika dla API"""
+        return {
+            'pin': self.pin,
+            'portions': self.portions,
+            'profile': self.profile.name,
+            'servo_ready': self.servo is not None,
+            'schedules': sorted(self.schedules),
+            'doses': dict(self.doses),
+            'actuator': self.actuator.stats(),
+        }
+
+    def stop(self, scheduler=None):
+        """Zatrzymaj wątek, usuń zadania z harmonogramu i zwolnij servo"""
+        if scheduler is not None:
+            for time_str in self.schedules:
+                scheduler.remove(self.job_key(time_str))
+        self.actuator.stop()
+        if self.servo:
+            try:
+                self.servo.close()
+            except Exception:
+                pass
+
+
+def reconcile_hoppers(hoppers, configs, scheduler):
+    """
+    Usuń z {id: Hopper} zasobniki, których nie ma w configs (feeder_configs) albo którym zmienił się pin.
+    Usunięte są zatrzymywane razem z zadaniami harmonogramu - te ze zmienionym pinem
+    wywołujący tworzy od nowa. Zwraca {id: godziny usuniętego zasobnika}.
+    """
+    removed = {}
+    for name, hopper in list(hoppers.items()):
+        settings = configs.get(name)
+        if settings is None:
+            log.info(f"[{name}] Zasobnik usunięty z konfiguracji")
+        elif hopper.pin != settings['pin']:
+            log.info(f"[{name}] Zmiana GPIO {hopper.pin} -> {settings['pin']}")
+        else:
+            continue
+        hoppers.pop(name).stop(scheduler)
+        removed[name] = list(hopper.schedules)
+    return removed
+
+
+@contextmanager
+def hoppers_idle(hoppers):
+    """Wstrzymaj cykle wszystkich zasobników {id: Hopper} - wejście czeka na trwające karmienia"""
+    with ExitStack() as stack:
+        for hopper in list(hoppers.values()):
+            stack.enter_context(hopper.actuator.idle())
+        yield
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Serwowanie panelu: strony skompresowane z góry, ETag/Cache-Control, kompresja JSON
+i wielowątkowy serwer WSGI (waitress, bez niego wątkowy serwer werkzeug)
+"""
+
+import gzip
+import hashlib
+import logging
+
+log = logging.getLogger('feeder.web')
+
+# Odpowiedzi mniejsze od tego nie zyskują na kompresji
+MIN_COMPRESS_SIZE = 512
+JSON_GZIP_LEVEL = 6
+COMPRESSIBLE = ('application/json', 'text/plain')
+DEFAULT_THREADS = 16
+# Wątki waitress zawsze wolne dla zwykłych żądań - strumienie /api/events w puli dostają resztę
+RESERVED_THREADS = 8
+# Strona może zmienić się po aktualizacji - przeglądarka zawsze pyta, ale z ETag dostaje 304
+PAGE_CACHE_CONTROL = 'no-cache'
+
+
+def _brotli():
+    """Moduł brotli albo None (opcjonalny: pip3 install brotli)"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def accepted_encodings(header):
+    """Kodowania z Accept-Encoding z q > 0, np. {'gzip', 'br'}"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def stream_limit(threads):
+    """Ile strumieni zdarzeń może zająć wątki serwera panelu"""
+    return max(1, threads - RESERVED_THREADS)
+
+
+def weak_etag(response):
+    """ETag odpowiedzi skompresowanej - słaby, bo treść bajtowa różni się od nieskompresowanej"""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+class StaticPage:
+    def __init__(self, body, content_type='text/html; charset=utf-8'):
+        """Treść strony wyrenderowana raz, z wersjami gzip i brotli policzonymi z góry"""
+        self.content_type = content_type
+        raw = body.encode('utf-8') if isinstance(body, str) else body
+        self.bodies = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+        brotli = _brotli()
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(raw, quality=11)
+        self.etag = hashlib.sha1(raw).hexdigest()[:16]
+
+    def encoding_for(self, header):
+        """Najmniejsza wersja, którą klient przyjmie"""
+        accepted = accepted_encodings(header)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return 'identity'
+
+    def response(self, request, response_class):
+        """Odpowiedź z ETag zależnym od kodowania - 304, gdy przeglądarka ma aktualną wersję"""
+        encoding = self.encoding_for(request.headers.get('Accept-Encoding'))
+        response = response_class(self.bodies[encoding], content_type=self.content_type)
+        response.set_etag(self.etag if encoding == 'identity' else f"{self.etag}-{encoding}")
+        response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response.make_conditional(request)
+
+
+def compress_response(request, response):
+    """after_request: gzip dla JSON i metryk, gdy klient go przyjmuje (strumienie SSE bez zmian)"""
+    if (response.status_code != 200 or response.is_streamed or response.mimetype not in COMPRESSIBLE
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in accepted_encodings(request.headers.get('Accept-Encoding')):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=JSON_GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    weak_etag(response)
+    return response
+
+
+class PanelServer:
+    def __init__(self, app, host='0.0.0.0', port=5000, threads=DEFAULT_THREADS):
+        """
+        Serwer WSGI panelu - waitress, a bez niego wątkowy serwer werkzeug.
+        Strumienie zdarzeń obsługuje EventStreamServer poza tą pulą; /api/events w panelu
+        (bez --events-port) może zająć najwyżej stream_limit(threads) wątków.
+        """
+        try:
+            from waitress import create_server
+        except ImportError:
+            from werkzeug.serving import make_server
+            log.warning("Brak waitress (pip3 install waitress) - używam wątkowego serwera werkzeug")
+            self.kind = 'werkzeug'
+            self._server = make_server(host, port, app, threaded=True)
+            self.port = self._server.server_port
+        else:
+            self.kind = 'waitress'
+            # Odczyt z wyprzedzeniem daje waitress.client_disconnected - strumień zamkniętej karty zwalnia wątek
+            self._server = create_server(app, host=host, port=port, threads=threads, ident='feeder',
+                                         channel_request_lookahead=5)
+            self.port = self._server.effective_port
+
+    def serve(self):
+        """Obsługuj żądania do close()"""
+        log.info(f"Panel na porcie {self.port} ({self.kind})")
+        if self.kind == 'waitress':
+            self._server.run()
+        else:
+            self._server.serve_forever()
+
+    def close(self):
+        if self.kind == 'waitress':
+            self._server.close()
+        else:
+            self._server.shutdown()
+            self._server.server_close()
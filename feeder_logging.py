@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Konfiguracja logowania karmnika
+Zapis na kartę SD w osobnym wątku (QueueHandler/QueueListener), rotacja z kompresją,
+opcjonalny format JSON i poziomy logowania per podsystem
+
+Zmienne środowiskowe (np. Environment= w usłudze systemd):
+  FEEDER_LOG_FILE     ścieżka pliku logu (domyślnie feeder.log obok skryptu)
+  FEEDER_LOG_LEVEL    poziom główny (INFO)
+  FEEDER_LOG_LEVELS   poziomy podsystemów, np. "bluetooth=WARNING,scheduler=DEBUG"
+  FEEDER_LOG_FORMAT   text lub json
+  FEEDER_LOG_ROTATE   size (domyślnie) lub daily
+  FEEDER_LOG_MAX_BYTES, FEEDER_LOG_BACKUPS  parametry rotacji
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feeder.log')
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Jedna linia JSON na wpis - do przetwarzania maszynowego"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_rotator(source, dest):
+    """Kompresuj zrotowany plik"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def parse_levels(spec):
+    """'bluetooth=WARNING,scheduler=DEBUG' -> {'feeder.bluetooth': 30, ...}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, level = item.partition('=')
+        name = name.strip()
+        if not name.startswith('feeder'):
+            name = f'feeder.{name}'
+        levels[name] = logging.getLevelName(level.strip().upper())
+        if not isinstance(levels[name], int):
+            raise ValueError(f"Nieznany poziom logowania: {item}")
+    return levels
+
+
+def _file_handler(log_file, rotate, max_bytes, backup_count):
+    """Plik logu z rotacją rozmiarową lub dobową"""
+    if rotate == 'daily':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when='midnight', backupCount=backup_count, encoding='utf-8')
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    handler.rotator = _gzip_rotator
+    handler.namer = _gzip_namer
+    return handler
+
+
+def setup_logging(log_file=None, level=None, levels=None, json_format=None,
+                  rotate=None, max_bytes=None, backup_count=None):
+    """Skonfiguruj logowanie; argumenty mają pierwszeństwo przed zmiennymi środowiskowymi"""
+    global _listener
+
+    env = os.environ
+    log_file = log_file or env.get('FEEDER_LOG_FILE', DEFAULT_LOG_FILE)
+    level = level or env.get('FEEDER_LOG_LEVEL', 'INFO')
+    levels = levels if levels is not None else parse_levels(env.get('FEEDER_LOG_LEVELS'))
+    if json_format is None:
+        json_format = env.get('FEEDER_LOG_FORMAT', 'text') == 'json'
+    rotate = rotate or env.get('FEEDER_LOG_ROTATE', 'size')
+    max_bytes = max_bytes or int(env.get('FEEDER_LOG_MAX_BYTES', 1024 * 1024))
+    backup_count = backup_count if backup_count is not None else int(env.get('FEEDER_LOG_BACKUPS', 5))
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    try:
+        handlers.append(_file_handler(log_file, rotate, max_bytes, backup_count))
+    except OSError as e:
+        print(f"Nie można otworzyć pliku logu {log_file}: {e}")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+
+    # Wątki karmnika tylko wrzucają wpis do kolejki - zapis robi wątek listenera
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    for name, subsystem_level in levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Opróżnij kolejkę i zamknij pliki (wywoływane też przy wyjściu)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
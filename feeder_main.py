@@ -4,335 +4,1131 @@ Automatyczny karmnik - główny skrypt dla Raspberry Pi
 Obsługuje komunikację Bluetooth i sterowanie servo
 """
 
-import bluetooth
+import time
+
+# Początek importów - pierwsza faza osi czasu startu
+IMPORT_STARTED = time.monotonic()
+
+import argparse
 import socket
+import selectors
 import json
 import threading
-import time
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
-from gpiozero import Servo
-from gpiozero.pins.pigpio import PiGPIOFactory
-import schedule
 import logging
+import os
 import sys
+from feeder_scheduler import FeedScheduler, DEFAULT_LATE_WARNING
+from feeder_rules import validate_rule
+from feeder_control import ControlServer, DEFAULT_SOCKET
+from feeder_store import (ConfigStore, apply_schedule_op, apply_dose_op, parse_dose,
+                          feeder_configs, default_feeder, DEFAULT_FEEDER)
+from feeder_history import open_history, DEFAULT_HISTORY_FILE, DEFAULT_LIMIT
+from feeder_status import open_writer, DEFAULT_STATUS_FILE
+from feeder_actuator import QueueFull, FeedTickets, PRIORITY_MANUAL, PRIORITY_SCHEDULED, PRIORITY_TEST, MAX_RESULT_WAIT
+from feeder_hopper import Hopper, hoppers_idle, reconcile_hoppers, DEFAULT_POWER_BUDGET
+from feeder_reload import ReloadCoordinator, DEFAULT_QUIET_PERIOD, DEFAULT_REQUEST_TIMEOUT
+from feeder_motion import load_profiles, resolve_profile
+from feeder_logging import setup_logging
+from feeder_metrics import FeederMetrics, StartupTimeline, feeder_lines, sample_lines
+from feeder_protocol import negotiate, encode_frame, read_frame, read_line, ProtocolError
 
-# Konfiguracja logowania
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('feeder.log'),
-        logging.StreamHandler()
-    ]
-)
+log = logging.getLogger('feeder')
+bt_log = logging.getLogger('feeder.bluetooth')
 
 
 class AutoFeeder:
-    def __init__(self, servo_pin=18):
-        """Inicjalizacja karmnika"""
+    def __init__(self, servo_pin=18, queue_size=4, coalesce_window=5.0, config_file='config.json',
+                 history_file=DEFAULT_HISTORY_FILE, pin_factory=None, power_budget=None,
+                 lazy_hardware=False):
+        """
+        Inicjalizacja karmnika
+        servo_pin - GPIO zasobnika 'main', gdy config.json nie ma sekcji "feeders"
+        pin_factory - fabryka pinów gpiozero (domyślnie PiGPIOFactory, w testach MockFactory)
+        power_budget - ile servo może ruszać się naraz (domyślnie z config.json)
+        lazy_hardware - servo i połączenie z pigpiod dopiero przy pierwszym karmieniu
+        """
         self.servo_pin = servo_pin
-        self.servo = None
-        self.schedules = []
+        self.lazy_hardware = lazy_hardware
+        self.hardware_lock = threading.Lock()
+        self.startup = None
+        # Ten sam config.json co panel web i feeder.sh
+        self.store = ConfigStore(config_file)
+        self.queue_size = queue_size
+        self.coalesce_window = coalesce_window
+        self.pin_factory = pin_factory
+        self.hoppers = {}
+        self.default_feeder = DEFAULT_FEEDER
         self.schedule_lock = threading.Lock()
+        self.scheduler = FeedScheduler()
+        self.listeners = []
+        self.status_writer = None
+        self.history = open_history(history_file)
+        self.started_at = time.time()
+        self.metrics = FeederMetrics(self.started_at)
+        self.metrics.add_collector(lambda: feeder_lines(self))
         self.running = True
+        # Przeładowania zlecane przez API sterujące scalane w jedno, poza cyklem servo
+        self.reloads = ReloadCoordinator(lambda detected_at: self.load_schedules(),
+                                         hold=lambda: hoppers_idle(self.hoppers))
+        # Karmienia API sterującego zlecone bez czekania (wynik przez feed_result)
+        self.feed_tickets = FeedTickets()
 
-        # Inicjalizacja servo
-        self.init_servo()
-
-        logging.info("Karmnik dziala")
-
-    def init_servo(self):
-        """Inicjalizacja servo"""
         try:
-            factory = PiGPIOFactory()
-            self.servo = Servo(
-                self.servo_pin,
-                pin_factory=factory,
-                min_pulse_width=0.5 / 1000,
-                max_pulse_width=2.5 / 1000
-            )
-            logging.info(f"Inicjalizacja serwo {self.servo_pin}")
+            config = self.store.read()
+        except FileNotFoundError:
+            config = {}
         except Exception as e:
-            logging.error(f"Błąd inicjalizacji servo: {e}")
+            log.error(f"Błąd wczytywania konfiguracji: {e}")
+            config = {}
 
-    def feed(self):
-        """Wykonaj karmienie - obrót servo"""
-        if self.servo is None:
-            logging.error("Servo nie jest zainicjalizowane")
-            return False
+        budget = power_budget or config.get('power_budget', DEFAULT_POWER_BUDGET)
+        self.power = threading.BoundedSemaphore(budget)
 
-        try:
-            logging.info("Rozpoczynam karmienie...")
+        # Każdy zasobnik ma własne servo i wątek - wspólny jest tylko budżet mocy
+        self.init_hoppers(config)
+        self.reloads.start()
 
-            # Pozycja początkowa
-            self.servo.min()
-            time.sleep(0.5)
+        log.info("Karmnik dziala")
 
-            # Obrót do pozycji karmienia
-            self.servo.max()
-            time.sleep(1.0)
+    def init_hoppers(self, config):
+        """
+        Dopasuj zasobniki do konfiguracji: usunięte z config.json są zatrzymywane razem z zadaniami,
+        zasobnik ze zmienionym pinem powstaje od nowa, nowe są tworzone
+        """
+        self.default_feeder = default_feeder(config)
+        self.scheduler.set_late_warning(config.get('late_warning', DEFAULT_LATE_WARNING))
+        self.reloads.set_quiet_period(config.get('reload_quiet_period', DEFAULT_QUIET_PERIOD))
+        profiles = load_profiles(config)
+        configs = feeder_configs(config, self.servo_pin)
+        with self.schedule_lock:
+            reconcile_hoppers(self.hoppers, configs, self.scheduler)
+        for name, settings in configs.items():
+            profile = resolve_profile(profiles, settings['profile'])
+            if name in self.hoppers:
+                self.hoppers[name].portions = settings['portions']
+                self.hoppers[name].doses = settings['doses']
+                self.hoppers[name].profile = profile
+                continue
+            hopper = Hopper(
+                name, settings['pin'],
+                pin_factory=self.pin_factory,
+                power=self.power,
+                portions=settings['portions'],
+                profile=profile,
+                queue_size=self.queue_size,
+                coalesce_window=self.coalesce_window,
+                on_complete=self._feed_done,
+                servo_init=self.init_servo if self.lazy_hardware else None
+            )
+            hopper.doses = settings['doses']
+            if not self.lazy_hardware:
+                self.init_servo(hopper)
+            hopper.start()
+            self.hoppers[name] = hopper
 
-            # Powrót do pozycji początkowej
-            self.servo.min()
-            time.sleep(0.5)
+    def init_servo(self, hopper):
+        """Inicjalizacja servo (przy starcie albo w trybie szybkiego startu przy pierwszym karmieniu)"""
+        # Wątki kilku zasobników mogą naraz potrzebować wspólnej fabryki pinów
+        with self.hardware_lock:
+            if hopper.servo is not None:
+                return
+            started = time.monotonic()
+            try:
+                if self.pin_factory is None:
+                    from gpiozero.pins.pigpio import PiGPIOFactory
+                    self.pin_factory = PiGPIOFactory()
+                hopper.pin_factory = self.pin_factory
+                hopper.init_servo()
+            except Exception as e:
+                log.error(f"[{hopper.name}] Błąd inicjalizacji servo: {e}")
+                return
+            if self.lazy_hardware:
+                log.info(f"[{hopper.name}] Servo zainicjalizowane przy pierwszym karmieniu "
+                         f"({(time.monotonic() - started) * 1000:.0f} ms)")
 
-            # Detach servo aby nie trzymało pozycji
-            self.servo.detach()
+    def get_hopper(self, feeder=None):
+        """Zasobnik o podanym identyfikatorze (domyślny dla None) - ValueError dla nieznanego"""
+        name = feeder or self.default_feeder
+        hopper = self.hoppers.get(name)
+        if hopper is None:
+            raise ValueError(f"Nieznany karmnik: {name}")
+        return hopper
 
-            logging.info("Karmienie zakończone")
-            return True
+    def add_listener(self, callback):
+        """Zarejestruj odbiorcę zdarzeń callback(event, data)"""
+        self.listeners.append(callback)
 
-        except Exception as e:
-            logging.error(f"Błąd podczas karmienia: {e}")
+    def notify(self, event, **data):
+        """Powiadom odbiorców o zdarzeniu karmnika"""
+        for callback in list(self.listeners):
+            try:
+                callback(event, data)
+            except Exception as e:
+                log.error(f"Błąd odbiorcy zdarzenia {event}: {e}")
+
+    def request_feed(self, source='manual', priority=PRIORITY_MANUAL, feeder=None, portions=None):
+        """Zleć karmienie bez czekania - zwraca Future, QueueFull gdy kolejka pełna"""
+        return self.get_hopper(feeder).request_feed(source, priority, portions)
+
+    def feed(self, source='manual', priority=PRIORITY_MANUAL, feeder=None, portions=None):
+        """Wykonaj karmienie i poczekaj na wynik"""
+        try:
+            return self.request_feed(source, priority, feeder, portions).result()
+        except QueueFull as e:
+            log.warning(f"Karmienie odrzucone: {e}")
             return False
 
-    def update_schedules(self, new_schedules):
-        """Aktualizuj harmonogram karmienia"""
+    def _feed_done(self, feeder, request, success, duration):
+        """Zakończony cykl servo (wątek zasobnika)"""
+        self.metrics.feeds.inc(feeder, request.source, 'success' if success else 'failure')
+        self.metrics.feed_duration.observe(duration, feeder)
+        if self.history:
+            self.history.record(request.source, success, duration, merged=request.merged,
+                                feeder=feeder, dose=request.portions)
+        if self.status_writer:
+            self.status_writer.record_feed(success)
+        self.publish_status()
+        self.notify('feed', feeder=feeder, source=request.source, success=success,
+                    duration=duration, merged=request.merged, portions=request.portions)
+
+    def update_schedules(self, new_schedules, persist=True, feeder=None):
+        """Podmień cały harmonogram zasobnika (stosowana jest tylko różnica)"""
+        return self.change_schedules('replace', new_schedules, persist, feeder)
+
+    def change_schedules(self, op, times, persist=True, feeder=None, dose=None):
+        """
+        Zmień harmonogram zasobnika operacją add/remove/replace.
+        Scheduler dostaje tylko różnicę - pozostałe zadania nie są ruszane,
+        więc karmienie tuż przed zmianą nie przepada. ValueError dla błędnej reguły.
+        dose - liczba porcji dla dodawanych godzin (None - domyślna zasobnika)
+        """
+        times = list(times)
+        if dose is not None:
+            dose = parse_dose(dose)
         with self.schedule_lock:
-            # Wyczyść stary harmonogram
-            schedule.clear()
-            self.schedules = new_schedules
+            hopper = self.get_hopper(feeder)
+            new_schedules = apply_schedule_op(hopper.schedules, op, times, strict=(op != 'replace'))
+            for time_str in new_schedules:
+                validate_rule(time_str)
+            old_doses = hopper.doses
+            hopper.doses = apply_dose_op(old_doses, op, times, dose)
 
-            # Dodaj nowe zadania
-            for time_str in self.schedules:
-                schedule.every().day.at(time_str).do(self.scheduled_feed)
-                logging.info(f"Dodano harmonogram: {time_str}")
+            added, removed = hopper.apply_schedules(self.scheduler, new_schedules, self.scheduled_feed)
+            for time_str in removed:
+                log.info(f"[{hopper.name}] Usunięto harmonogram: {time_str}")
+            for time_str in added:
+                log.info(f"[{hopper.name}] Dodano harmonogram: {time_str}")
 
-            self.save_schedules()
+            if persist and (added or removed or hopper.doses != old_doses):
+                self.save_change(op, times, hopper.name, dose)
 
-    def scheduled_feed(self):
-        """Zaplanowane karmienie"""
-        logging.info("Wykonuję zaplanowane karmienie")
-        self.feed()
+        if added or removed or hopper.doses != old_doses:
+            self.publish_status()
+            self.notify('schedules', feeder=hopper.name, schedules=list(hopper.schedules),
+                        tag=hopper.tag, doses=dict(hopper.doses), added=added, removed=removed)
+        return list(hopper.schedules)
 
-    def save_schedules(self):
-        """Zapisz harmonogram do pliku"""
+    def scheduled_feed(self, feeder, time_str):
+        """Zaplanowane karmienie - zwraca Future zlecenia (None gdy odrzucone)"""
+        log.info(f"Wykonuję zaplanowane karmienie {time_str} ({feeder})")
+        # Nie czekamy na servo - wątek harmonogramu od razu wraca do snu
         try:
-            with open('schedules.json', 'w') as f:
-                json.dump({'schedules': self.schedules}, f)
-            logging.info("Harmonogram zapisany")
+            hopper = self.get_hopper(feeder)
+            # Future pozwala harmonogramowi zmierzyć koniec karmienia
+            return hopper.request_feed('schedule', PRIORITY_SCHEDULED, hopper.dose_for(time_str))
+        except (QueueFull, ValueError) as e:
+            log.error(f"Zaplanowane karmienie odrzucone: {e}")
+            return None
+
+    def save_change(self, op, times, feeder=None, dose=None):
+        """Dopisz zmianę harmonogramu do dziennika config.json"""
+        try:
+            # Plik mógł zmienić ktoś inny (panel web) - zapisujemy bez sprawdzania duplikatów
+            self.store.append(op, times, default={}, strict=False, feeder=feeder, dose=dose)
+            log.info("Harmonogram zapisany")
         except Exception as e:
-            logging.error(f"Błąd zapisu harmonogramu: {e}")
+            log.error(f"Błąd zapisu harmonogramu: {e}")
 
     def load_schedules(self):
         """Wczytaj harmonogram z pliku"""
+        try:
+            data = self.store.read()
+            # Zasobniki dopisane, usunięte lub przeniesione na inny pin od startu - jak w SimpleFeeder
+            self.init_hoppers(data)
+            for name, settings in feeder_configs(data, self.servo_pin).items():
+                self.update_schedules(settings['schedules'], persist=False, feeder=name)
+            log.info("Harmonogram wczytany")
+            self.metrics.config_reloads.inc('success')
+            return True
+        except FileNotFoundError:
+            return self.import_legacy_schedules()
+        except Exception as e:
+            log.error(f"Błąd wczytywania harmonogramu: {e}")
+        self.metrics.config_reloads.inc('failure')
+        return False
+
+    def import_legacy_schedules(self):
+        """Przenieś harmonogram ze starego schedules.json do config.json"""
         try:
             with open('schedules.json', 'r') as f:
                 data = json.load(f)
-                self.update_schedules(data.get('schedules', []))
-            logging.info("Harmonogram wczytany")
         except FileNotFoundError:
-            logging.info("Brak zapisanego harmonogramu")
-        except Exception as e:
-            logging.error(f"Błąd wczytywania harmonogramu: {e}")
+            log.info("Brak zapisanego harmonogramu")
+            return False
+        self.update_schedules(data.get('schedules', []))
+        log.info("Zaimportowano harmonogram z schedules.json")
+        return True
+
+    def control_handlers(self):
+        """Komendy dostępne przez gniazdo sterujące"""
+        return {
+            'feed': self.control_feed,
+            'feed_result': self.feed_result,
+            'status': self.status,
+            'history': self.get_history,
+            'ration': self.get_ration,
+            'timing': self.get_timing,
+            'metrics': self.get_metrics,
+            'feeders': self.list_feeders,
+            'get_schedules': self.get_schedules,
+            'set_schedules': self.set_schedules,
+            'reload': self.request_reload,
+            'reload_status': self.reload_status,
+            'reloads': self.get_reloads,
+        }
+
+    def request_reload(self, wait=True):
+        """
+        Przeładowanie zlecone przez API sterujące; wait - czekaj, aż obejmie je przeładowanie.
+        Gdy trwa karmienie, przeładowanie czeka na koniec cyklu servo - odpowiedź ma wtedy
+        pending i numer zgłoszenia do sprawdzenia przez reload_status
+        """
+        self.metrics.config_changes.inc('control')
+        if not wait:
+            ticket, result = self.reloads.notify('control'), None
+        else:
+            ticket, result = self.reloads.request('control')
+            if result is None:
+                log.info(f"Przeładowanie (zgłoszenie {ticket}) czeka na koniec karmienia - "
+                         f"zostanie zastosowane po cyklu servo")
+        response = {'success': result is not False, 'applied': result is not None, 'pending': result is None,
+                    'ticket': ticket}
+        if result is False:
+            response['message'] = 'Przeładowanie konfiguracji nie powiodło się'
+        return response
+
+    def reload_status(self, ticket, wait=0):
+        """Czy przeładowanie objęło zgłoszenie z request_reload (czeka najwyżej wait s)"""
+        if wait:
+            self.reloads.wait(ticket, min(max(float(wait), 0.0), DEFAULT_REQUEST_TIMEOUT))
+        state = self.reloads.state(ticket)
+        return {'success': state['result'] is not False, 'applied': state['applied'], 'pending': state['pending'],
+                'ticket': ticket}
+
+    def get_reloads(self):
+        """Przeładowania konfiguracji i liczba scalonych w nie zgłoszeń"""
+        return dict(self.reloads.stats(), success=True)
+
+    def control_feed(self, feeder=None, portions=None, wait=True):
+        """
+        Karmienie zlecone przez API sterujące. wait=False - odpowiedź od razu z numerem zlecenia
+        i szacowanym czasem (eta, s); wynik przez feed_result albo zdarzenie 'feed'
+        """
+        if portions is not None:
+            portions = parse_dose(portions)
+        hopper = self.get_hopper(feeder)
+        eta = hopper.estimate(portions)
+        try:
+            future = self.request_feed('control', feeder=feeder, portions=portions)
+        except QueueFull:
+            return {'success': False, 'message': 'BUSY'}
+        if wait:
+            return {'success': future.result()}
+        return {'success': True, 'queued': True, 'ticket': self.feed_tickets.add(future),
+                'eta': round(eta, 2), 'feeder': hopper.name}
+
+    def feed_result(self, ticket, wait=0):
+        """Wynik karmienia zleconego z wait=False - czeka najwyżej wait s"""
+        try:
+            done, success = self.feed_tickets.wait(ticket, min(max(float(wait), 0.0), MAX_RESULT_WAIT))
+        except KeyError:
+            return {'success': False, 'done': False, 'message': f'Nieznane zlecenie karmienia: {ticket}'}
+        if not done:
+            return {'success': False, 'done': False, 'message': 'Karmienie jeszcze trwa'}
+        return {'success': success, 'done': True}
+
+    def get_schedules(self, feeder=None):
+        """Harmonogram zasobnika przez API sterujące"""
+        hopper = self.get_hopper(feeder)
+        return {'success': True, 'feeder': hopper.name, 'schedules': sorted(hopper.schedules),
+                'doses': dict(hopper.doses), 'portions': hopper.portions}
+
+    def set_schedules(self, schedules, feeder=None):
+        """Podmień harmonogram przez API sterujące"""
+        self.update_schedules(schedules, feeder=feeder)
+        return self.get_schedules(feeder)
+
+    def list_feeders(self):
+        """Zasobniki obsługiwane przez usługę"""
+        return {
+            'success': True,
+            'default': self.default_feeder,
+            'feeders': {name: hopper.stats() for name, hopper in self.hoppers.items()},
+        }
+
+    def get_history(self, start=None, end=None, limit=DEFAULT_LIMIT, feeder=None):
+        """Karmienia z zakresu dat (od najnowszych)"""
+        if self.history is None:
+            return {'success': False, 'message': 'Dziennik karmień niedostępny'}
+        return {'success': True, 'history': self.history.query(start, end, limit, feeder)}
+
+    def get_ration(self, start=None, end=None, feeder=None):
+        """Dzienne sumy wydanych porcji"""
+        if self.history is None:
+            return {'success': False, 'message': 'Dziennik karmień niedostępny'}
+        return {'success': True, 'rations': self.history.rations(start, end, feeder)}
+
+    def get_timing(self):
+        """Opóźnienia uruchomień harmonogramu (histogramy i ostatnie karmienia)"""
+        return {'success': True, **self.scheduler.timing()}
+
+    def get_metrics(self):
+        """Metryki w formacie Prometheus (panel web serwuje je pod /metrics)"""
+        return {'success': True, 'text': self.metrics.render()}
+
+    def status(self):
+        """Stan karmnika dla panelu web i CLI"""
+        next_run = self.scheduler.next_run()
+        default = self.hoppers.get(self.default_feeder)
+        return {
+            'success': True,
+            'active': self.running,
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started_at,
+            'schedules': sorted(default.schedules) if default else [],
+            'next_run': next_run.isoformat() if next_run else None,
+            'scheduler': self.scheduler.stats(),
+            'reloads': {key: value for key, value in self.reloads.stats().items() if key != 'recent'},
+            'feeders': {name: hopper.stats() for name, hopper in self.hoppers.items()},
+            'ration_today': self.history.ration_today() if self.history else None,
+            'startup': self.startup.summary() if self.startup else None,
+        }
+
+    def publish_status(self):
+        """Zaktualizuj migawkę stanu (następne karmienie)"""
+        if self.status_writer:
+            self.status_writer.update(**self.status_fields())
+
+    def status_fields(self):
+        """Pola migawki odświeżane przy każdym heartbeat"""
+        next_run = self.scheduler.next_run()
+        return {'next_feed': next_run.timestamp() if next_run else 0.0}
+
+    def start_status(self, path=DEFAULT_STATUS_FILE):
+        """Publikuj migawkę stanu dla panelu web i feeder.sh"""
+        self.status_writer = open_writer(path)
+        if self.status_writer:
+            self.publish_status()
+            self.status_writer.start_heartbeat(refresh=self.status_fields)
 
     def run_scheduler(self):
         """Uruchom scheduler w osobnym wątku"""
-        while self.running:
-            schedule.run_pending()
-            time.sleep(1)
+        # Wątek śpi do najbliższego terminu, update_schedules budzi go od razu
+        self.scheduler.run()
 
     def cleanup(self):
         """Cleanup przy zamykaniu"""
         self.running = False
-        if self.servo:
-            self.servo.close()
-        logging.info("Cleanup zakończony")
+        self.scheduler.stop()
+        self.reloads.stop()
+        for hopper in self.hoppers.values():
+            hopper.stop()
+        if self.status_writer:
+            self.status_writer.close()
+        if self.history:
+            self.history.close()
+        log.info("Cleanup zakończony")
+
+
+class UnknownCommand(Exception):
+    """Komenda spoza tabeli"""
+
+
+def error_code(error):
+    """Kod błędu odpowiedzi protokołu 2"""
+    if isinstance(error, QueueFull):
+        return 'BUSY'
+    if isinstance(error, UnknownCommand):
+        return 'UNKNOWN_COMMAND'
+    if isinstance(error, json.JSONDecodeError):
+        return 'JSON_ERROR'
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return 'BAD_REQUEST'
+    return 'ERROR'
+
+
+def legacy_error(error):
+    """Odpowiedź błędu w protokole 1 - takie same kody jak dotychczas"""
+    code = error_code(error)
+    if code in ('BUSY', 'UNKNOWN_COMMAND', 'JSON_ERROR'):
+        return code
+    return f"ERROR:{error}"
+
+
+def parse_legacy_command(command):
+    """
+    Linia protokołu 1 -> (nazwa komendy, argumenty).
+    Zasobnik inny niż domyślny podaje się po '@': FEED_NOW@koty, ADD_SCHEDULE@koty:07:00
+    """
+    if command.startswith("{"):
+        # JSON z harmonogramem (opcjonalnie "feeder")
+        data = json.loads(command)
+        args = {'schedules': data.get('schedules', [])}
+        if data.get('feeder'):
+            args['feeder'] = data['feeder']
+        return 'SET_SCHEDULES', args
+
+    head, _, rest = command.partition(":")
+    name, _, feeder = head.partition("@")
+    args = {'feeder': feeder} if feeder else {}
+
+    if name == 'GET_HISTORY' and rest:
+        # GET_HISTORY[:od[,do[,limit]]]
+        values = rest.split(",")
+        args.update(zip(('start', 'end', 'limit'), (v or None for v in values)))
+    elif name == 'PING' and rest:
+        args['token'] = rest
+    elif name in ('FEED_NOW', 'TEST') and rest:
+        # FEED_NOW:3 - dawka w porcjach
+        args['portions'] = rest
+    elif name == 'GET_RATION' and rest:
+        # GET_RATION[:od[,do]]
+        args.update(zip(('start', 'end'), (v or None for v in rest.split(","))))
+    elif name in ('ADD_SCHEDULE', 'REMOVE_SCHEDULE', 'REPLACE_SCHEDULES'):
+        # ADD_SCHEDULE:07:00[,18:00][=dawka] - godziny zawierają ':' więc dzielimy tylko pierwszy.
+        # Reguły z przecinkami (so,nd 09:00) rozdziela się średnikiem: ADD_SCHEDULE:so,nd 09:00;pn-pt 07:00
+        rest, _, dose = rest.partition("=")
+        separator = ";" if ";" in rest else ","
+        args['times'] = [t.strip() for t in rest.split(separator) if t.strip()]
+        if dose:
+            args['dose'] = dose
+    elif name == 'GET_SCHEDULES_IF_CHANGED':
+        args['tag'] = rest
+    elif rest:
+        # Nieznany argument - komenda w całości trafi do tabeli i dostanie UNKNOWN_COMMAND
+        return command, {}
+    return name, args
+
+
+def _time_list(times):
+    """Lista godzin z argumentu komendy (pojedyncza godzina też jest dozwolona)"""
+    if isinstance(times, str):
+        return [times]
+    if not isinstance(times, list):
+        raise ValueError("times musi być listą godzin")
+    return times
+
+
+# Odpowiedzi protokołu 1 budowane z wyniku komendy
+LEGACY_REPLIES = {
+    'PING': lambda r: f"PONG:{r['token']}" if 'token' in r else "PONG",
+    'TEST': lambda r: "TEST_OK" if r['success'] else "TEST_FAILED",
+    'FEED_NOW': lambda r: "FEED_OK" if r['success'] else "FEED_FAILED",
+    'GET_SCHEDULES': lambda r: json.dumps(r),
+    'GET_SCHEDULES_IF_CHANGED': lambda r: "NOT_MODIFIED" if r.get('not_modified') else json.dumps(r),
+    'SET_SCHEDULES': lambda r: f"SCHEDULES_UPDATED:{len(r['schedules'])}",
+    'ADD_SCHEDULE': lambda r: f"SCHEDULES_UPDATED:{len(r['schedules'])}",
+    'REMOVE_SCHEDULE': lambda r: f"SCHEDULES_UPDATED:{len(r['schedules'])}",
+    'REPLACE_SCHEDULES': lambda r: f"SCHEDULES_UPDATED:{len(r['schedules'])}",
+    'GET_HISTORY': lambda r: json.dumps({'history': r['history']}),
+    'GET_FEEDERS': lambda r: json.dumps(r),
+    'GET_RATION': lambda r: json.dumps(r),
+    'GET_TIMING': lambda r: json.dumps(r),
+}
+
+
+class ClientConnection:
+    def __init__(self, sock, address):
+        """Stan pojedynczego klienta Bluetooth"""
+        self.sock = sock
+        self.address = address
+        self.inbuf = bytearray()
+        self.outqueue = deque()
+        self.closed = False
+        # Odpowiedzi na komendy z jednego odczytu idą jednym send() po ich przetworzeniu
+        self.corked = False
+        self.writing = False
+        # 1 - linie tekstu (aplikacja Android), 2 - ramki po HELLO
+        self.protocol = 1
+
+    def fileno(self):
+        return self.sock.fileno()
 
 
 class BluetoothServer:
-    def __init__(self, feeder):
-        """Inicjalizacja serwera Bluetooth"""
+    def __init__(self, feeder, sock_factory=None):
+        """
+        Inicjalizacja serwera Bluetooth
+        sock_factory - funkcja zwracająca nasłuchujące gniazdo (domyślnie RFCOMM),
+                       pozwala podstawić np. gniazdo TCP w testach
+        """
         self.feeder = feeder
+        self.sock_factory = sock_factory or self.create_rfcomm_socket
         self.server_sock = None
-        self.client_sock = None
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}
+        self.commands = self.command_table()
         self.running = True
 
+        # Zadania zlecone z innych wątków (scheduler, karmienie) wykonywane w pętli zdarzeń
+        self._pending = deque()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
         # UUID dla SPP (Serial Port Profile)
         self.uuid = "00001101-0000-1000-8000-00805F9B34FB"
 
-    def start_server(self):
-        """Uruchom serwer Bluetooth"""
-        try:
-            logging.info("Tworzenie socketu Bluetooth RFCOMM...")
-            self.server_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+    def create_rfcomm_socket(self):
+        """Utwórz i zareklamuj gniazdo RFCOMM"""
+        # PyBluez importowany dopiero tutaj - harmonogram działa, zanim wstanie stos Bluetooth
+        import bluetooth
+        bt_log.info("Tworzenie socketu Bluetooth RFCOMM...")
+        server_sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
 
-            # Ustawienie opcji socketu
-            self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Ustawienie opcji socketu
+        server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-            logging.info("Bindowanie socketu...")
-            # Użyj PORT_ANY aby system przydzielił wolny port
-            self.server_sock.bind(("", bluetooth.PORT_ANY))
+        bt_log.info("Bindowanie socketu...")
+        # Użyj PORT_ANY aby system przydzielił wolny port
+        server_sock.bind(("", bluetooth.PORT_ANY))
 
-            logging.info("Ustawianie nasłuchiwania...")
-            self.server_sock.listen(1)
+        bt_log.info("Ustawianie nasłuchiwania...")
+        server_sock.listen(5)
 
-            port = self.server_sock.getsockname()[1]
+        port = server_sock.getsockname()[1]
 
-            logging.info("Reklamowanie usługi...")
-            bluetooth.advertise_service(
-                self.server_sock,
-                "RaspberryPiFeeder",
-                service_id=self.uuid,
-                service_classes=[self.uuid, bluetooth.SERIAL_PORT_CLASS],
-                profiles=[bluetooth.SERIAL_PORT_PROFILE]
-            )
+        bt_log.info("Reklamowanie usługi...")
+        bluetooth.advertise_service(
+            server_sock,
+            "RaspberryPiFeeder",
+            service_id=self.uuid,
+            service_classes=[self.uuid, bluetooth.SERIAL_PORT_CLASS],
+            profiles=[bluetooth.SERIAL_PORT_PROFILE]
+        )
+
+        bt_log.info(f"Serwer Bluetooth nasłuchuje na porcie RFCOMM {port}")
+        return server_sock
 
-            logging.info(f"Serwer Bluetooth nasłuchuje na porcie RFCOMM {port}")
-            logging.info("Czekam na połączenie...")
-
-            while self.running:
-                try:
-                    self.server_sock.settimeout(1.0)  # Timeout aby móc sprawdzać self.running
-                    try:
-                        self.client_sock, client_info = self.server_sock.accept()
-                        logging.info(f"Połączono z {client_info}")
-
-                        self.send_message("CONNECTED")
-                        self.handle_client()
-                    except bluetooth.BluetoothError as e:
-                        if "timed out" not in str(e):
-                            raise
-                        continue
-
-                except bluetooth.BluetoothError as e:
-                    if self.running:
-                        logging.error(f"Błąd Bluetooth: {e}")
-                except Exception as e:
-                    if self.running:
-                        logging.error(f"Błąd: {e}")
-                finally:
-                    if self.client_sock:
-                        try:
-                            self.client_sock.close()
-                        except:
-                            pass
-                        self.client_sock = None
-                        logging.info("Klient rozłączony")
+    def start_server(self, on_ready=None):
+        """Uruchom serwer Bluetooth (on_ready wywoływane, gdy gniazdo już nasłuchuje)"""
+        try:
+            self.server_sock = self.sock_factory()
+            self.server_sock.setblocking(False)
+            self.selector.register(self.server_sock, selectors.EVENT_READ, self._accept)
+            self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_pending)
+            self.feeder.add_listener(self.on_feeder_event)
+            self.feeder.metrics.add_collector(self.metric_lines)
+            if on_ready:
+                on_ready()
+
+            bt_log.info("Czekam na połączenia...")
+            self.serve_forever()
 
         except PermissionError as e:
-            logging.error(f"Brak uprawnień: {e}")
-            logging.error("Uruchom skrypt jako root: sudo python3 feeder_main.py")
+            bt_log.error(f"Brak uprawnień: {e}")
+            bt_log.error("Uruchom skrypt jako root: sudo python3 feeder_main.py")
             sys.exit(1)
         except Exception as e:
-            logging.error(f"Błąd uruchamiania serwera: {e}")
+            bt_log.error(f"Błąd uruchamiania serwera: {e}")
             import traceback
-            logging.error(traceback.format_exc())
+            bt_log.error(traceback.format_exc())
         finally:
             self.cleanup()
 
-    def handle_client(self):
-        """Obsługa połączonego klienta"""
-        buffer = ""
+    def serve_forever(self):
+        """Pętla zdarzeń - obsługuje wszystkich klientów naraz"""
+        while self.running:
+            for key, mask in self.selector.select():
+                callback = key.data
+                if isinstance(callback, ClientConnection):
+                    self._service_client(callback, mask)
+                else:
+                    callback()
+
+    def call_soon(self, callback, *args):
+        """Zleć wykonanie w wątku pętli zdarzeń (bezpieczne z innych wątków)"""
+        self._pending.append((callback, args))
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Bufor pełny - pętla i tak zostanie wybudzona
+            pass
 
+    def _drain_pending(self):
+        """Wykonaj zadania zlecone przez inne wątki"""
         try:
-            while self.running:
-                data = self.client_sock.recv(1024)
-                if not data:
-                    break
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        while self._pending:
+            callback, args = self._pending.popleft()
+            try:
+                callback(*args)
+            except Exception as e:
+                bt_log.error(f"Błąd zadania pętli Bluetooth: {e}")
 
-                buffer += data.decode('utf-8')
+    def _accept(self):
+        """Przyjmij nowego klienta"""
+        try:
+            client_sock, client_info = self.server_sock.accept()
+        except OSError as e:
+            # bluetooth.BluetoothError dziedziczy po OSError
+            if self.running and not isinstance(e, BlockingIOError):
+                bt_log.error(f"Błąd Bluetooth: {e}")
+            return
 
-                # Przetwarzaj kompletne linie
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    self.process_command(line.strip())
+        client_sock.setblocking(False)
+        if getattr(client_sock, 'family', None) in (socket.AF_INET, socket.AF_INET6):
+            # Gniazdo TCP (testy, pomiary) - odpowiedzi łączymy sami, Nagle tylko by je opóźniał
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = ClientConnection(client_sock, client_info)
+        self.clients[client.fileno()] = client
+        self.selector.register(client_sock, selectors.EVENT_READ, client)
+        self.feeder.metrics.bt_connections.inc()
+        bt_log.info(f"Połączono z {client_info} (klientów: {len(self.clients)})")
 
-        except bluetooth.BluetoothError:
-            logging.info("Klient rozłączony")
-        except Exception as e:
-            logging.error(f"Błąd obsługi klienta: {e}")
+        self.send_message(client, "CONNECTED")
 
-    def process_command(self, command):
-        """Przetwórz komendę od klienta"""
-        logging.info(f"Otrzymano komendę: {command}")
+    def _service_client(self, client, mask):
+        """Obsłuż gotowość gniazda klienta"""
+        if mask & selectors.EVENT_READ:
+            self._read_client(client)
+        if not client.closed and mask & selectors.EVENT_WRITE:
+            self._flush_client(client)
 
+    def _read_client(self, client):
+        """Odczytaj dane i przetwórz kompletne linie lub ramki"""
         try:
-            if command == "TEST":
-                # Test servo
-                success = self.feeder.feed()
-                self.send_message("TEST_OK" if success else "TEST_FAILED")
-
-            elif command.startswith("{"):
-                # JSON z harmonogramem
-                data = json.loads(command)
-                schedules = data.get('schedules', [])
-                self.feeder.update_schedules(schedules)
-                self.send_message(f"SCHEDULES_UPDATED:{len(schedules)}")
-
-            elif command == "GET_SCHEDULES":
-                # Wyślij aktualny harmonogram
-                response = json.dumps({'schedules': self.feeder.schedules})
-                self.send_message(response)
-
-            elif command == "FEED_NOW":
-                # Natychmiastowe karmienie
-                success = self.feeder.feed()
-                self.send_message("FEED_OK" if success else "FEED_FAILED")
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            bt_log.info(f"Klient rozłączony: {e}")
+            self.close_client(client)
+            return
 
+        if not data:
+            self.close_client(client)
+            return
+
+        client.inbuf += data
+
+        # Przesuwamy tylko offset, bufor skracamy raz po przetworzeniu wszystkiego
+        offset = 0
+        client.corked = True
+        try:
+            while not client.closed:
+                # Wersja może zmienić się w trakcie (HELLO) - reszta bufora to już ramki
+                if client.protocol >= 2:
+                    message, offset = read_frame(client.inbuf, offset)
+                    if message is None:
+                        break
+                    self.process_frame(client, message)
+                else:
+                    line, offset = read_line(client.inbuf, offset)
+                    if line is None:
+                        break
+                    self.process_command(client, line)
+        except ProtocolError as e:
+            bt_log.warning(f"Błąd protokołu od {client.address}: {e}")
+            self.feeder.metrics.bt_json_errors.inc()
+            self.close_client(client)
+            return
+        finally:
+            client.corked = False
+        del client.inbuf[:offset]
+        if client.outqueue and not client.closed:
+            self._flush_client(client)
+
+    def _flush_client(self, client):
+        """Wyślij zaległe wiadomości z kolejki klienta"""
+        if len(client.outqueue) > 1:
+            # Jedno send() zamiast osobnego na każdą odpowiedź
+            data = b''.join(client.outqueue)
+            client.outqueue.clear()
+            client.outqueue.append(data)
+        if client.outqueue:
+            chunk = client.outqueue[0]
+            try:
+                sent = client.sock.send(chunk)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                bt_log.error(f"Błąd wysyłania: {e}")
+                self.close_client(client)
+                return
+            if sent < len(chunk):
+                client.outqueue[0] = chunk[sent:]
             else:
-                logging.warning(f"Nieznana komenda: {command}")
-                self.send_message("UNKNOWN_COMMAND")
+                client.outqueue.popleft()
+
+        # Zmiana zdarzeń selektora to wywołanie systemowe - tylko gdy naprawdę się zmieniają
+        writing = bool(client.outqueue)
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE if writing else selectors.EVENT_READ
+            self.selector.modify(client.sock, events, client)
 
-        except json.JSONDecodeError:
-            logging.error("Błąd parsowania JSON")
-            self.send_message("JSON_ERROR")
+    def close_client(self, client):
+        """Rozłącz klienta"""
+        if client.closed:
+            return
+        client.closed = True
+        self.clients.pop(client.fileno(), None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            client.sock.close()
+        except:
+            pass
+        bt_log.info(f"Klient rozłączony {client.address} (klientów: {len(self.clients)})")
+
+    def command_table(self):
+        """Komendy wspólne dla obu wersji protokołu: nazwa -> handler(**args)"""
+        return {
+            'PING': self.cmd_ping,
+            'TEST': self.cmd_test,
+            'FEED_NOW': self.cmd_feed_now,
+            'GET_SCHEDULES': self.cmd_get_schedules,
+            'GET_SCHEDULES_IF_CHANGED': self.cmd_get_schedules_if_changed,
+            'SET_SCHEDULES': self.cmd_set_schedules,
+            'ADD_SCHEDULE': self.cmd_add_schedule,
+            'REMOVE_SCHEDULE': self.cmd_remove_schedule,
+            'REPLACE_SCHEDULES': self.cmd_replace_schedules,
+            'GET_HISTORY': self.cmd_get_history,
+            'GET_FEEDERS': self.cmd_get_feeders,
+            'GET_RATION': self.cmd_get_ration,
+            'GET_TIMING': self.cmd_get_timing,
+        }
+
+    def run_command(self, name, args, respond):
+        """
+        Wykonaj komendę z tabeli. respond(result, error) wołane jest w wątku pętli -
+        od razu albo po zakończeniu karmienia, więc kilka komend może czekać naraz.
+        """
+        respond = self._counted(name, respond)
+        try:
+            handler = self.commands.get(name)
+            if handler is None:
+                raise UnknownCommand(f"Nieznana komenda: {name}")
+            result = handler(**args)
         except Exception as e:
-            logging.error(f"Błąd przetwarzania komendy: {e}")
-            self.send_message(f"ERROR:{str(e)}")
+            if isinstance(e, UnknownCommand):
+                bt_log.warning(str(e))
+            elif not isinstance(e, QueueFull):
+                bt_log.error(f"Błąd przetwarzania komendy {name}: {e}")
+            respond(None, e)
+            return
 
-    def send_message(self, message):
-        """Wyślij wiadomość do klienta"""
-        if self.client_sock:
+        if not isinstance(result, Future):
+            respond(result, None)
+            return
+
+        def done(future):
             try:
-                self.client_sock.send((message + "\n").encode('utf-8'))
-                logging.info(f"Wysłano: {message}")
+                value, error = future.result(), None
             except Exception as e:
-                logging.error(f"Błąd wysyłania: {e}")
+                value, error = None, e
+            self.call_soon(respond, value, error)
+
+        result.add_done_callback(done)
+
+    def _counted(self, name, respond):
+        """respond() zliczający komendę wg typu i wyniku (nieznane nazwy pod jedną etykietą)"""
+        command = name if name in self.commands else 'UNKNOWN'
+
+        def counted(result, error):
+            self.feeder.metrics.bt_commands.inc(command, 'OK' if error is None else error_code(error))
+            respond(result, error)
+        return counted
+
+    def process_command(self, client, command):
+        """Przetwórz komendę tekstową (protokół 1)"""
+        bt_log.debug("Otrzymano komendę od %s: %s", client.address, command)
+
+        if command.startswith("HELLO:"):
+            self.negotiate(client, command[len("HELLO:"):])
+            return
+
+        try:
+            name, args = parse_legacy_command(command)
+        except Exception as e:
+            bt_log.error(f"Błąd parsowania komendy: {e}")
+            if isinstance(e, json.JSONDecodeError):
+                self.feeder.metrics.bt_json_errors.inc()
+            self.send_message(client, legacy_error(e))
+            return
+
+        def respond(result, error):
+            if error is None:
+                self.send_message(client, LEGACY_REPLIES[name](result))
+            else:
+                self.send_message(client, legacy_error(error))
+
+        self.run_command(name, args, respond)
+
+    def process_frame(self, client, message):
+        """Przetwórz ramkę (protokół 2) - odpowiedź niesie id żądania"""
+        bt_log.debug("Otrzymano ramkę od %s: %s", client.address, message)
+        request_id = message.get('id')
+        name = message.get('cmd')
+        args = message.get('args') or {}
+
+        def respond(result, error):
+            if error is None:
+                self.send_frame(client, {'id': request_id, 'ok': True, 'result': result})
+            else:
+                self.send_frame(client, {'id': request_id, 'ok': False,
+                                         'error': error_code(error), 'message': str(error)})
+
+        if not isinstance(name, str) or not isinstance(args, dict):
+            respond(None, ValueError("Ramka wymaga pola cmd (tekst) i args (obiekt)"))
+            return
+        self.run_command(name, args, respond)
+
+    def negotiate(self, client, requested):
+        """HELLO:<wersja> - uzgodnij wersję protokołu"""
+        try:
+            version = negotiate(requested)
+        except ValueError as e:
+            self.send_message(client, f"ERROR:{e}")
+            return
+        # Odpowiedź HELLO idzie jeszcze linią, dalej już w uzgodnionej wersji
+        self.send_message(client, f"HELLO:{version}")
+        client.protocol = version
+        bt_log.info(f"Klient {client.address} używa protokołu {version}")
+
+    def cmd_ping(self, **echo):
+        """Pomiar czasu odpowiedzi - zwraca przesłane pola i czas serwera"""
+        return dict(echo, server_time=time.time())
+
+    def cmd_test(self, feeder=None, portions=None):
+        """Test servo"""
+        return self._feed('test', PRIORITY_TEST, feeder, portions)
+
+    def cmd_feed_now(self, feeder=None, portions=None):
+        """Natychmiastowe karmienie (portions - dawka, domyślnie ustawiona dla zasobnika)"""
+        return self._feed('bluetooth', PRIORITY_MANUAL, feeder, portions)
+
+    def _feed(self, source, priority, feeder, portions=None):
+        """Zleć karmienie wątkowi zasobnika - Future z wynikiem po zakończeniu cyklu"""
+        hopper = self.feeder.get_hopper(feeder)
+        portions = parse_dose(portions) if portions is not None else hopper.portions
+        future = hopper.request_feed(source, priority, portions)
+        result = Future()
+        future.add_done_callback(
+            lambda f: result.set_result({'success': f.result(), 'source': source, 'feeder': hopper.name,
+                                         'portions': portions}))
+        return result
+
+    def cmd_get_feeders(self):
+        """Lista zasobników"""
+        result = self.feeder.list_feeders()
+        return {'default': result['default'], 'feeders': result['feeders']}
+
+    def cmd_get_schedules(self, feeder=None):
+        """Aktualny harmonogram ze skrótem do późniejszego porównania"""
+        with self.feeder.schedule_lock:
+            hopper = self.feeder.get_hopper(feeder)
+            return {'feeder': hopper.name, 'schedules': list(hopper.schedules), 'tag': hopper.tag,
+                    'doses': dict(hopper.doses)}
+
+    def cmd_get_schedules_if_changed(self, tag=None, feeder=None):
+        """Harmonogram tylko gdy różni się od wersji klienta - inaczej sama odpowiedź NOT_MODIFIED"""
+        if tag and tag == self.feeder.get_hopper(feeder).tag:
+            return {'not_modified': True, 'tag': tag}
+        return self.cmd_get_schedules(feeder)
+
+    def cmd_set_schedules(self, schedules, feeder=None):
+        """Podmień harmonogram (pełna lista - starsza wersja aplikacji)"""
+        return self.cmd_replace_schedules(schedules, feeder)
+
+    def cmd_add_schedule(self, times, feeder=None, dose=None):
+        """Dodaj godziny do harmonogramu (dose - dawka tych godzin)"""
+        return self._change_schedules('add', times, feeder, dose)
+
+    def cmd_remove_schedule(self, times, feeder=None):
+        """Usuń godziny z harmonogramu"""
+        return self._change_schedules('remove', times, feeder)
+
+    def cmd_replace_schedules(self, times, feeder=None, dose=None):
+        """Podmień cały harmonogram - stosowana jest tylko różnica"""
+        return self._change_schedules('replace', times, feeder, dose)
+
+    def _change_schedules(self, op, times, feeder, dose=None):
+        schedules = self.feeder.change_schedules(op, _time_list(times), feeder=feeder, dose=dose)
+        return {'feeder': feeder or self.feeder.default_feeder, 'schedules': schedules}
+
+    def cmd_get_history(self, start=None, end=None, limit=DEFAULT_LIMIT, feeder=None):
+        """Historia karmień z zakresu dat"""
+        result = self.feeder.get_history(start, end, limit or DEFAULT_LIMIT, feeder)
+        if not result['success']:
+            raise RuntimeError(result['message'])
+        return {'history': result['history']}
+
+    def cmd_get_ration(self, start=None, end=None, feeder=None):
+        """Dzienne sumy wydanych porcji"""
+        result = self.feeder.get_ration(start, end, feeder)
+        if not result['success']:
+            raise RuntimeError(result['message'])
+        return {'rations': result['rations']}
+
+    def cmd_get_timing(self):
+        """Opóźnienia uruchomień harmonogramu"""
+        result = self.feeder.get_timing()
+        result.pop('success')
+        return result
+
+    def on_feeder_event(self, event, data):
+        """Zdarzenie karmnika (dowolny wątek) - rozgłoś do wszystkich klientów"""
+        if event in ('schedules', 'feed'):
+            self.call_soon(self.broadcast_event, event, data)
+
+    def broadcast_event(self, event, data):
+        """Wyślij zdarzenie każdemu klientowi w jego wersji protokołu"""
+        if event == 'schedules':
+            payload = {'feeder': data['feeder'], 'schedules': data['schedules'], 'tag': data['tag'],
+                       'doses': data.get('doses', {})}
+            line = f"SCHEDULES_CHANGED:{json.dumps(payload)}"
+        else:
+            line = f"FEED_DONE:{data['source']}:{'OK' if data['success'] else 'FAILED'}"
+            if data['feeder'] != self.feeder.default_feeder:
+                line += f":{data['feeder']}"
+        for client in list(self.clients.values()):
+            if client.protocol >= 2:
+                self.send_frame(client, {'event': event, 'data': data})
+            else:
+                self.send_message(client, line)
+
+    def send_message(self, client, message):
+        """Dodaj linię do kolejki klienta (tylko z wątku pętli zdarzeń)"""
+        if client.closed:
+            return
+        client.outqueue.append((message + "\n").encode('utf-8'))
+        bt_log.debug("Wysłano do %s: %s", client.address, message)
+        if not client.corked:
+            self._flush_client(client)
+
+    def send_frame(self, client, message):
+        """Dodaj ramkę do kolejki klienta (tylko z wątku pętli zdarzeń)"""
+        if client.closed:
+            return
+        try:
+            frame = encode_frame(message)
+        except ProtocolError as e:
+            bt_log.error(f"Nie można wysłać odpowiedzi: {e}")
+            frame = encode_frame({'id': message.get('id'), 'ok': False,
+                                  'error': 'ERROR', 'message': str(e)})
+        client.outqueue.append(frame)
+        bt_log.debug("Wysłano ramkę do %s: %s", client.address, message)
+        if not client.corked:
+            self._flush_client(client)
+
+    def metric_lines(self):
+        """Liczba połączonych klientów (czytana przy odczycie /metrics)"""
+        return sample_lines('feeder_bt_clients', 'gauge', 'Połączeni klienci Bluetooth', len(self.clients))
+
+    def stop(self):
+        """Zatrzymaj pętlę zdarzeń (bezpieczne z innych wątków)"""
+        self.running = False
+        self.call_soon(lambda: None)
 
     def cleanup(self):
         """Cleanup przy zamykaniu"""
         self.running = False
-        if self.client_sock:
+        for client in list(self.clients.values()):
+            self.close_client(client)
+        if self.server_sock:
             try:
-                self.client_sock.close()
-            except:
+                self.selector.unregister(self.server_sock)
+            except (KeyError, ValueError):
                 pass
-        if self.server_sock:
             try:
                 self.server_sock.close()
             except:
                 pass
-        logging.info("Serwer Bluetooth zamknięty")
+            self.server_sock = None
+        self.feeder.metrics.remove_collector(self.metric_lines)
+        bt_log.info("Serwer Bluetooth zamknięty")
 
 
 def main():
     """Główna funkcja programu"""
-    logging.info("Automatyczny Karmnik - Start")
+    parser = argparse.ArgumentParser(description='Automatyczny karmnik z Bluetooth')
+    parser.add_argument('--fast-start', action='store_true',
+                        help='servo i pigpiod dopiero przy pierwszym karmieniu (szybszy restart, mniej RAM)')
+    args = parser.parse_args()
+
+    timeline = StartupTimeline(IMPORT_STARTED)
+    timeline.mark('imports')
+
+    setup_logging()
+    log.info("Automatyczny Karmnik - Start" + (" (szybki start)" if args.fast_start else ""))
 
     # Inicjalizacja karmnika
-    feeder = AutoFeeder(servo_pin=18)
+    feeder = AutoFeeder(servo_pin=18, lazy_hardware=args.fast_start)
+    feeder.startup = timeline
+    feeder.metrics.add_collector(timeline.lines)
+    timeline.mark('hoppers')
 
     # Wczytaj zapisany harmonogram
     feeder.load_schedules()
+    timeline.mark('schedules')
 
-    # Uruchom scheduler w osobnym wątku
-    scheduler_thread = threading.Thread(target=feeder.run_scheduler, daemon=True)
+    # Scheduler rusza przed Bluetooth - zaplanowane karmienia nie czekają na stos BT
+    scheduler_thread = threading.Thread(target=feeder.run_scheduler, name='scheduler', daemon=True)
     scheduler_thread.start()
-    logging.info("Scheduler uruchomiony")
+    log.info("Scheduler uruchomiony")
+    timeline.mark('scheduler')
+
+    # Migawka stanu w /run/feeder
+    feeder.start_status()
+    timeline.mark('status')
+
+    # Lokalne API dla panelu web i feeder.sh
+    control = ControlServer(DEFAULT_SOCKET, feeder.control_handlers())
+    try:
+        control.start()
+        # Zdarzenia karmnika trafiają do subskrybentów (panel web - SSE)
+        feeder.add_listener(control.publish)
+    except OSError as e:
+        log.error(f"Nie udało się uruchomić API sterującego: {e}")
+    timeline.mark('control')
+
+    def bluetooth_ready():
+        timeline.mark('bluetooth')
+        log.info(f"Start zakończony: {timeline.describe()}")
 
     # Uruchom serwer Bluetooth
     bt_server = BluetoothServer(feeder)
 
     try:
-        bt_server.start_server()
+        bt_server.start_server(on_ready=bluetooth_ready)
     except KeyboardInterrupt:
-        logging.info("Zatrzymywanie programu...")
+        log.info("Zatrzymywanie programu...")
     finally:
         feeder.cleanup()
         bt_server.cleanup()
-        logging.info("Program zakończony")
+        control.stop()
+        log.info("Program zakończony")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
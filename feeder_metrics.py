@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Metryki karmnika w formacie tekstowym Prometheus
+Liczniki zwiększane są w gorących ścieżkach (karmienie, komendy Bluetooth), więc każda
+rodzina ma własną, krótko trzymaną blokadę; stan harmonogramu i procesu czytany jest
+dopiero przy odczycie /metrics.
+"""
+
+import os
+import resource
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Czas jednego karmienia (s) - cykl servo to 1-3 s na porcję, dawka do 10 porcji
+FEED_DURATION_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        """Histogram o stałych przedziałach; ostatni licznik zbiera wartości powyżej największej granicy"""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Dodaj pomiar (przedział: pierwsza granica >= wartość)"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        """Stan histogramu dla API"""
+        return {
+            'bounds': list(self.bounds),
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'max': round(self.max, 4),
+        }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    """{a="1",b="2"} albo pusty tekst"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def sample_lines(name, kind, help_text, samples, label_names=()):
+    """Rodzina licznika lub wskaźnika z {wartości etykiet: liczba} albo jednej liczby"""
+    if not isinstance(samples, dict):
+        samples = {(): samples}
+    lines = header(name, kind, help_text)
+    for values, value in sorted(samples.items()):
+        lines.append(f'{name}{_labels(label_names, values)} {_number(value)}')
+    return lines
+
+
+def histogram_lines(name, help_text, snapshots, label_names=()):
+    """Rodzina histogramu z {wartości etykiet: Histogram.snapshot()} - przedziały skumulowane"""
+    if 'counts' in snapshots:
+        # Jeden histogram bez etykiet
+        snapshots = {(): snapshots}
+    lines = header(name, 'histogram', help_text)
+    for values, snap in sorted(snapshots.items()):
+        total = 0
+        for bound, count in zip(list(snap['bounds']) + [float('inf')], snap['counts']):
+            total += count
+            le = 'le="' + _number(float(bound)) + '"'
+            lines.append(f'{name}_bucket{_labels(label_names, values, le)} {total}')
+        lines.append(f'{name}_sum{_labels(label_names, values)} {_number(float(snap["sum"]))}')
+        lines.append(f'{name}_count{_labels(label_names, values)} {snap["count"]}')
+    return lines
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        """Licznik z etykietami - inc() trzyma blokadę tylko na czas dodawania"""
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def value(self, *values):
+        with self._lock:
+            return self._values.get(values, 0)
+
+    def render(self):
+        with self._lock:
+            samples = dict(self._values)
+        # Licznik bez etykiet ma wartość 0 od startu
+        if not self.labels and not samples:
+            samples = {(): 0}
+        return sample_lines(self.name, self.kind, self.help, samples, self.labels)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *values, value):
+        with self._lock:
+            self._values[values] = value
+
+
+class LabeledHistogram:
+    def __init__(self, name, help_text, bounds, labels=()):
+        """Histogram z etykietami (jeden Histogram na zestaw wartości etykiet)"""
+        self.name = name
+        self.help = help_text
+        self.bounds = bounds
+        self.labels = tuple(labels)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        with self._lock:
+            histogram = self._histograms.get(values)
+            if histogram is None:
+                histogram = self._histograms[values] = Histogram(self.bounds)
+            histogram.observe(value)
+
+    def render(self):
+        with self._lock:
+            snapshots = {values: histogram.snapshot() for values, histogram in self._histograms.items()}
+        return histogram_lines(self.name, self.help, snapshots, self.labels)
+
+
+class Registry:
+    def __init__(self):
+        """Zbiór metryk i funkcji zbierających stan w chwili odczytu"""
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, bounds, labels=()):
+        return self.register(LabeledHistogram(name, help_text, bounds, labels))
+
+    def add_collector(self, collect):
+        """collect() zwraca listę linii - wywoływane przy każdym odczycie"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def remove_collector(self, collect):
+        with self._lock:
+            if collect in self._collectors:
+                self._collectors.remove(collect)
+
+    def render(self):
+        """Wszystkie metryki jako tekst Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory():
+    """RSS procesu w bajtach (/proc, poza Linuksem szczytowe RSS z getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_lines(started):
+    """RSS, czas startu i czas działania procesu"""
+    return (
+        sample_lines('process_resident_memory_bytes', 'gauge', 'Pamięć rezydentna procesu', resident_memory())
+        + sample_lines('process_start_time_seconds', 'gauge', 'Czas startu procesu (unix)', started)
+        + sample_lines('feeder_uptime_seconds', 'gauge', 'Czas działania usługi', round(time.time() - started, 3))
+    )
+
+
+class StartupTimeline:
+    def __init__(self, started=None):
+        """Oś czasu startu usługi - czas trwania kolejnych faz od `started` (zegar monotoniczny)"""
+        self.started = started if started is not None else time.monotonic()
+        self.phases = []
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Zakończ fazę - jej czas liczony jest od końca poprzedniej"""
+        now = time.monotonic()
+        with self._lock:
+            self.phases.append((phase, now - self._last))
+            self._last = now
+
+    @property
+    def total(self):
+        with self._lock:
+            return self._last - self.started
+
+    def summary(self):
+        """Fazy w kolejności wykonania (s) i czas całkowity dla API"""
+        with self._lock:
+            return {
+                'phases': {phase: round(duration, 4) for phase, duration in self.phases},
+                'total': round(self._last - self.started, 4),
+            }
+
+    def describe(self):
+        """Jednolinijkowy opis do logu"""
+        with self._lock:
+            phases = ', '.join(f"{phase} {duration * 1000:.0f} ms" for phase, duration in self.phases)
+            return f"{phases} (razem {(self._last - self.started) * 1000:.0f} ms)"
+
+    def lines(self):
+        with self._lock:
+            phases = {(phase,): round(duration, 6) for phase, duration in self.phases}
+            total = round(self._last - self.started, 6)
+        return (sample_lines('feeder_startup_phase_seconds', 'gauge', 'Czas faz startu usługi', phases, ('phase',))
+                + sample_lines('feeder_startup_seconds', 'gauge', 'Czas startu usługi', total))
+
+
+class FeederMetrics:
+    def __init__(self, started=None):
+        """Metryki usługi karmnika (feeder_simple lub feeder_main)"""
+        self.started = started or time.time()
+        self.registry = Registry()
+        registry = self.registry
+        self.feeds = registry.counter(
+            'feeder_feeds_total', 'Zakończone karmienia wg zasobnika, źródła i wyniku',
+            ('feeder', 'source', 'outcome'))
+        self.feed_duration = registry.histogram(
+            'feeder_feed_duration_seconds', 'Czas karmienia (cała dawka)',
+            FEED_DURATION_BUCKETS, ('feeder',))
+        self.config_reloads = registry.counter(
+            'feeder_config_reloads_total', 'Przeładowania konfiguracji wg wyniku', ('outcome',))
+        self.config_changes = registry.counter(
+            'feeder_config_changes_total', 'Zgłoszenia zmian konfiguracji wg źródła (scalane w przeładowania)',
+            ('source',))
+        self.bt_connections = registry.counter(
+            'feeder_bt_connections_total', 'Przyjęte połączenia Bluetooth')
+        self.bt_commands = registry.counter(
+            'feeder_bt_commands_total', 'Komendy Bluetooth wg typu i wyniku', ('command', 'outcome'))
+        self.bt_json_errors = registry.counter(
+            'feeder_bt_json_errors_total', 'Nieprawidłowy JSON lub ramka od klienta Bluetooth')
+
+    def add_collector(self, collect):
+        self.registry.add_collector(collect)
+
+    def remove_collector(self, collect):
+        self.registry.remove_collector(collect)
+
+    def render(self):
+        return self.registry.render()
+
+
+def feeder_lines(feeder):
+    """Stan harmonogramu i zasobników czytany w chwili odczytu (SimpleFeeder i AutoFeeder)"""
+    scheduler = feeder.scheduler.stats()
+    timing = feeder.scheduler.timing()
+    hoppers = {name: hopper.stats()['actuator'] for name, hopper in list(feeder.hoppers.items())}
+    next_run = feeder.scheduler.next_run()
+
+    lines = []
+    lines += sample_lines('feeder_scheduler_jobs', 'gauge', 'Zadania w harmonogramie', scheduler['jobs'])
+    lines += sample_lines('feeder_scheduler_fires_total', 'counter', 'Uruchomione zadania', scheduler['fires'])
+    lines += sample_lines('feeder_scheduler_wakeups_total', 'counter', 'Wybudzenia wątku harmonogramu',
+                          scheduler['wakeups'])
+    lines += sample_lines('feeder_scheduler_resyncs_total', 'counter', 'Przeliczenia po skoku zegara',
+                          scheduler['resyncs'])
+    lines += sample_lines('feeder_scheduler_late_total', 'counter', 'Uruchomienia spóźnione ponad próg',
+                          scheduler['late'])
+    lines += histogram_lines('feeder_scheduler_lag_seconds', 'Opóźnienie startu zadania względem terminu',
+                             timing['lateness'])
+    lines += histogram_lines('feeder_scheduler_completion_seconds', 'Od terminu do końca karmienia',
+                             timing['completion'])
+    lines += sample_lines('feeder_next_feed_timestamp_seconds', 'gauge', 'Najbliższe karmienie (unix)',
+                          next_run.timestamp() if next_run else 0)
+    lines += sample_lines('feeder_queue_pending', 'gauge', 'Zlecenia czekające na servo',
+                          {(name,): stats['pending'] for name, stats in hoppers.items()}, ('feeder',))
+    lines += sample_lines('feeder_servo_busy', 'gauge', 'Servo w trakcie cyklu',
+                          {(name,): int(stats['busy']) for name, stats in hoppers.items()}, ('feeder',))
+    lines += sample_lines('feeder_feeds_coalesced_total', 'counter', 'Zlecenia połączone z innym karmieniem',
+                          {(name,): stats['coalesced'] for name, stats in hoppers.items()}, ('feeder',))
+    lines += sample_lines('feeder_feeds_rejected_total', 'counter', 'Zlecenia odrzucone (pełna kolejka)',
+                          {(name,): stats['rejected'] for name, stats in hoppers.items()}, ('feeder',))
+    lines += process_lines(feeder.started_at)
+    return lines
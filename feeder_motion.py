@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Profile ruchu servo - płynne przejścia zamiast skoków min()/max()
+
+Profil to lista ruchów (pozycja docelowa, postój po ruchu) wykonywanych z ograniczoną
+prędkością i przyspieszeniem. Trajektoria jest liczona raz do tablicy pozycji
+próbkowanej ze stałą częstotliwością i odtwarzana według zegara monotonicznego.
+
+Pozycje w zakresie gpiozero Servo.value: -1 (min) .. 1 (max).
+
+Użycie:
+    python3 feeder_motion.py --list
+    python3 feeder_motion.py gentle fast           # symulacja, raport błędu czasu
+    python3 feeder_motion.py gentle --pin 18       # odtworzenie na prawdziwym servo
+"""
+
+import argparse
+import json
+import logging
+import math
+import time
+from array import array
+from functools import lru_cache
+
+log = logging.getLogger('feeder.motion')
+
+# Serwa hobbystyczne czytają impuls co 20 ms - częstsze zmiany nic nie dają
+DEFAULT_RATE = 50
+DEFAULT_PROFILE = 'gentle'
+SHAPES = ('trapezoid', 'scurve')
+
+# MG90S: ok. 0.1 s / 60° przy 4.8 V, czyli pełne 180° (2 jednostki) w 0.3 s
+SERVO_MAX_SPEED = 6.6
+
+BUILTIN_PROFILES = {
+    # Łagodny start i hamowanie (minimalny jerk) - najmniej zacięć ślimaka
+    'gentle': {
+        'shape': 'scurve', 'velocity': 6.0, 'acceleration': 30.0, 'settle': 0.15,
+        'moves': [[1.0, 0.3], [-1.0, 0.1]],
+    },
+    # Najkrótszy cykl w granicach prędkości servo
+    'fast': {
+        'shape': 'trapezoid', 'velocity': 6.5, 'acceleration': 45.0, 'settle': 0.1,
+        'moves': [[1.0, 0.15], [-1.0, 0.05]],
+    },
+    # Kilka krótkich ruchów w tył i w przód luzuje karmę, potem normalne karmienie
+    'unjam-wiggle': {
+        'shape': 'scurve', 'velocity': 6.0, 'acceleration': 40.0, 'settle': 0.1,
+        'moves': [[-0.4, 0.0], [-1.0, 0.0], [-0.4, 0.0], [-1.0, 0.05], [1.0, 0.3], [-1.0, 0.1]],
+    },
+}
+
+
+def _move_duration(shape, distance, velocity, acceleration):
+    """Czas ruchu o zadany dystans przy ograniczeniach prędkości i przyspieszenia"""
+    if distance <= 0:
+        return 0.0
+    if shape == 'scurve':
+        # Minimalny jerk: v_max = 1.875 d/T, a_max = 5.774 d/T^2
+        return max(1.875 * distance / velocity, math.sqrt(5.774 * distance / acceleration))
+    t_acc = velocity / acceleration
+    if acceleration * t_acc * t_acc >= distance:
+        # Profil trójkątny - servo nie osiąga prędkości maksymalnej
+        return 2 * math.sqrt(distance / acceleration)
+    return 2 * t_acc + (distance - acceleration * t_acc * t_acc) / velocity
+
+
+def _move_fraction(shape, t, duration, distance, velocity, acceleration):
+    """Przebyta część dystansu (0..1) w chwili t ruchu"""
+    if shape == 'scurve':
+        tau = t / duration
+        return tau * tau * tau * (10 - 15 * tau + 6 * tau * tau)
+
+    t_acc = min(velocity / acceleration, duration / 2)
+    peak = acceleration * t_acc
+    if t < t_acc:
+        s = 0.5 * acceleration * t * t
+    elif t < duration - t_acc:
+        s = 0.5 * acceleration * t_acc * t_acc + peak * (t - t_acc)
+    else:
+        s = distance - 0.5 * acceleration * (duration - t) ** 2
+    return s / distance
+
+
+@lru_cache(maxsize=32)
+def build_table(shape, start, settle, moves, velocity, acceleration, rate):
+    """
+    Tablica pozycji próbkowana co 1/rate s (próbka k odpowiada chwili k/rate).
+    Wynik jest buforowany - ten sam profil liczony jest raz na proces.
+    """
+    table = array('d', [start] * max(1, round(settle * rate)))
+    position = start
+    for target, dwell in moves:
+        distance = abs(target - position)
+        duration = _move_duration(shape, distance, velocity, acceleration)
+        steps = math.ceil(duration * rate)
+        sign = 1.0 if target >= position else -1.0
+        table.extend(
+            position + sign * distance * _move_fraction(shape, k / rate, duration, distance, velocity, acceleration)
+            for k in range(1, steps)
+        )
+        table.extend([target] * (1 + round(dwell * rate)))
+        position = target
+    return table
+
+
+class MotionProfile:
+    def __init__(self, name, moves, shape='scurve', velocity=6.0, acceleration=30.0,
+                 start=-1.0, settle=0.1, rate=DEFAULT_RATE):
+        """
+        moves - lista (pozycja docelowa, postój w s) wykonywana po kolei
+        velocity / acceleration - ograniczenia w jednostkach Servo.value na s / s^2
+        settle - czas utrzymania pozycji startowej przed pierwszym ruchem
+        """
+        if shape not in SHAPES:
+            raise ValueError(f"Nieznany kształt profilu {name}: {shape}")
+        if velocity <= 0 or acceleration <= 0 or rate <= 0:
+            raise ValueError(f"Profil {name}: prędkość, przyspieszenie i częstotliwość muszą być dodatnie")
+        moves = tuple((float(target), float(dwell)) for target, dwell in moves)
+        if not moves:
+            raise ValueError(f"Profil {name} nie zawiera ruchów")
+        for target, dwell in moves:
+            if not -1.0 <= target <= 1.0 or dwell < 0:
+                raise ValueError(f"Profil {name}: nieprawidłowy ruch ({target}, {dwell})")
+
+        self.name = name
+        self.shape = shape
+        self.moves = moves
+        self.velocity = float(velocity)
+        self.acceleration = float(acceleration)
+        self.start = float(start)
+        self.settle = float(settle)
+        self.rate = int(rate)
+
+    @classmethod
+    def from_spec(cls, name, spec, rate=DEFAULT_RATE):
+        """Profil z opisu w config.json"""
+        return cls(
+            name, spec['moves'],
+            shape=spec.get('shape', 'scurve'),
+            velocity=spec.get('velocity', 6.0),
+            acceleration=spec.get('acceleration', 30.0),
+            start=spec.get('start', -1.0),
+            settle=spec.get('settle', 0.1),
+            rate=spec.get('rate', rate),
+        )
+
+    @property
+    def table(self):
+        """Tablica pozycji (z bufora)"""
+        return build_table(self.shape, self.start, self.settle, self.moves,
+                           self.velocity, self.acceleration, self.rate)
+
+    @property
+    def duration(self):
+        """Planowany czas odtwarzania (s)"""
+        return len(self.table) / self.rate
+
+    def play(self, servo, clock=time.monotonic, sleep=time.sleep):
+        """Odtwórz profil na servo - zwraca raport błędu czasu"""
+        return play_table(servo, self.table, self.rate, self.name, clock, sleep)
+
+
+def play_table(servo, table, rate, name='', clock=time.monotonic, sleep=time.sleep):
+    """
+    Ustawiaj kolejne pozycje w stałych odstępach 1/rate.
+    Terminy liczone są od startu, więc opóźnienie jednej próbki nie przesuwa kolejnych.
+    """
+    period = 1.0 / rate
+    writes = 0
+    late_total = 0.0
+    late_max = 0.0
+    last = None
+
+    started = clock()
+    for k, position in enumerate(table):
+        deadline = started + k * period
+        delay = deadline - clock()
+        if delay > 0:
+            sleep(delay)
+        if position != last:
+            servo.value = position
+            last = position
+            late = max(0.0, clock() - deadline)
+            late_total += late
+            late_max = max(late_max, late)
+            writes += 1
+
+    delay = started + len(table) * period - clock()
+    if delay > 0:
+        sleep(delay)
+    actual = clock() - started
+    planned = len(table) * period
+
+    return {
+        'profile': name,
+        'samples': len(table),
+        'writes': writes,
+        'planned': round(planned, 4),
+        'actual': round(actual, 4),
+        'error': round(actual - planned, 4),
+        'max_late': round(late_max, 4),
+        'mean_late': round(late_total / writes, 4) if writes else 0.0,
+    }
+
+
+def load_profiles(config):
+    """Profile wbudowane nadpisane sekcją "profiles" z config.json"""
+    rate = config.get('motion_rate', DEFAULT_RATE)
+    specs = dict(BUILTIN_PROFILES)
+    specs.update(config.get('profiles') or {})
+    profiles = {}
+    for name, spec in specs.items():
+        try:
+            profiles[name] = MotionProfile.from_spec(name, spec, rate)
+        except (KeyError, TypeError, ValueError) as e:
+            log.error(f"Pominięto profil ruchu {name}: {e}")
+    return profiles
+
+
+def resolve_profile(profiles, name):
+    """Profil o podanej nazwie, domyślny gdy nazwa jest pusta lub nieznana"""
+    if name and name in profiles:
+        return profiles[name]
+    if name:
+        log.warning(f"Nieznany profil ruchu: {name}, używam {DEFAULT_PROFILE}")
+    return profiles.get(DEFAULT_PROFILE) or MotionProfile.from_spec(DEFAULT_PROFILE, BUILTIN_PROFILES[DEFAULT_PROFILE])
+
+
+class SimulatedServo:
+    def __init__(self, max_speed=SERVO_MAX_SPEED, clock=time.monotonic):
+        """
+        Servo bez sprzętu - zapisuje polecenia i modeluje ramię z ograniczoną prędkością.
+        tracking_error pokazuje, o ile ramię najbardziej zostało w tyle za profilem.
+        """
+        self.max_speed = max_speed
+        self.clock = clock
+        self.command = None
+        self.position = None
+        self.updated = None
+        self.tracking_error = 0.0
+        self.commands = []
+
+    def _advance(self, now):
+        """Przesuń modelowane ramię w stronę ostatniego polecenia"""
+        if self.command is not None and self.position is not None:
+            step = self.max_speed * (now - self.updated)
+            gap = self.command - self.position
+            self.position = self.command if abs(gap) <= step else self.position + math.copysign(step, gap)
+        self.updated = now
+
+    @property
+    def value(self):
+        return self.command
+
+    @value.setter
+    def value(self, position):
+        now = self.clock()
+        self._advance(now)
+        if self.position is None:
+            self.position = position
+        if self.command is not None:
+            self.tracking_error = max(self.tracking_error, abs(self.command - self.position))
+        self.command = position
+        self.commands.append((now, position))
+
+    def detach(self):
+        self._advance(self.clock())
+        self.command = None
+
+    def close(self):
+        self.detach()
+
+
+def simulate(profile, max_speed=SERVO_MAX_SPEED):
+    """Odtwórz profil na symulatorze - raport czasu i nadążania ramienia"""
+    servo = SimulatedServo(max_speed)
+    report = profile.play(servo)
+    report['tracking_error'] = round(servo.tracking_error, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile ruchu servo karmnika')
+    parser.add_argument('profiles', nargs='*', help='nazwy profili (domyślnie wszystkie)')
+    parser.add_argument('--config', help='config.json z dodatkowymi profilami')
+    parser.add_argument('--pin', type=int, help='odtwórz na servo podłączonym do GPIO zamiast symulacji')
+    parser.add_argument('--list', action='store_true', help='pokaż dostępne profile')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    profiles = load_profiles(config)
+
+    if args.list:
+        for name, profile in profiles.items():
+            print(f"{name:15s} {profile.shape:10s} {profile.duration:.2f} s, {len(profile.moves)} ruchów")
+        return
+
+    selected = args.profiles or list(profiles)
+    unknown = [name for name in selected if name not in profiles]
+    if unknown:
+        parser.error(f"nieznane profile: {', '.join(unknown)}")
+
+    servo = None
+    if args.pin is not None:
+        from gpiozero import Servo
+        from gpiozero.pins.pigpio import PiGPIOFactory
+        servo = Servo(args.pin, pin_factory=PiGPIOFactory(),
+                      min_pulse_width=0.5 / 1000, max_pulse_width=2.5 / 1000)
+
+    try:
+        for name in selected:
+            report = profiles[name].play(servo) if servo else simulate(profiles[name])
+            print(json.dumps(report))
+    finally:
+        if servo:
+            servo.detach()
+
+
+if __name__ == '__main__':
+    main()
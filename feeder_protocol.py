@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Protokół Bluetooth karmnika
+
+Wersja 1 (domyślna, aplikacja Android): komendy i odpowiedzi jako linie tekstu.
+Wersja 2: klient wysyła linię "HELLO:2", serwer odpowiada "HELLO:<wersja>" i od tej
+chwili obie strony wymieniają ramki: 4 bajty długości (big-endian) + JSON w UTF-8.
+
+  żądanie:    {"id": 7, "cmd": "FEED_NOW", "args": {}}
+  odpowiedź:  {"id": 7, "ok": true, "result": {...}}
+              {"id": 7, "ok": false, "error": "BUSY", "message": "..."}
+  zdarzenie:  {"event": "feed", "data": {...}}   (bez id)
+
+Odpowiedzi mogą przychodzić w innej kolejności niż żądania - klient dopasowuje je po id.
+"""
+
+import json
+import struct
+
+PROTOCOL_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 1024 * 1024
+MAX_LINE_SIZE = 64 * 1024
+
+# json.dumps z własnymi opcjami tworzy koder przy każdym wywołaniu - ten jest wspólny
+_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+class ProtocolError(Exception):
+    """Uszkodzona lub zbyt duża ramka - połączenie należy zamknąć"""
+
+
+def negotiate(requested):
+    """Najwyższa wersja obsługiwana przez obie strony (ValueError dla śmieci)"""
+    requested = int(requested)
+    if requested < 1:
+        raise ValueError(f"Nieprawidłowa wersja protokołu: {requested}")
+    return max(v for v in SUPPORTED_VERSIONS if v <= requested)
+
+
+def encode_frame(message):
+    """Zakoduj słownik jako ramkę z nagłówkiem długości"""
+    payload = _ENCODER.encode(message).encode('utf-8')
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Ramka za duża: {len(payload)} B")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def read_frame(buffer, offset):
+    """
+    Wytnij jedną ramkę z bufora zaczynając od offset.
+    Zwraca (wiadomość, nowy offset) albo (None, offset) gdy ramka jest niekompletna.
+    Bufor nie jest kopiowany ani skracany - robi to wywołujący raz na odczyt.
+    """
+    start = offset + FRAME_HEADER.size
+    if len(buffer) < start:
+        return None, offset
+    (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Ramka za duża: {length} B")
+    end = start + length
+    if len(buffer) < end:
+        return None, offset
+
+    with memoryview(buffer) as view:
+        try:
+            message = json.loads(str(view[start:end], 'utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ProtocolError(f"Nieprawidłowa ramka: {e}")
+    if not isinstance(message, dict):
+        raise ProtocolError("Ramka nie jest obiektem JSON")
+    return message, end
+
+
+def read_line(buffer, offset):
+    """
+    Wytnij jedną linię (tryb zgodności) zaczynając od offset.
+    Dekodujemy całą linię naraz, więc znak UTF-8 podzielony między odczyty nie psuje komendy.
+    """
+    end = buffer.find(b'\n', offset)
+    if end < 0:
+        if len(buffer) - offset > MAX_LINE_SIZE:
+            raise ProtocolError(f"Linia za długa: {len(buffer) - offset} B")
+        return None, offset
+    with memoryview(buffer) as view:
+        line = str(view[offset:end], 'utf-8', errors='replace')
+    return line.strip(), end + 1
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Koordynator przeładowań konfiguracji
+Zgłoszenia zmian (obserwator pliku, API sterujące) z okresu ciszy scalane w jedno przeładowanie,
+wykonywane dopiero gdy żadne servo nie jest w trakcie cyklu
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+
+log = logging.getLogger('feeder.config')
+
+# Tyle sekund bez nowych zgłoszeń przed przeładowaniem (feeder.sh add w pętli to kilka zapisów na sekundę)
+DEFAULT_QUIET_PERIOD = 0.5
+# Ciągłe zgłoszenia nie mogą odkładać przeładowania w nieskończoność
+DEFAULT_MAX_DELAY = 5.0
+# Jak długo API sterujące czeka na przeładowanie obejmujące jego zgłoszenie
+DEFAULT_REQUEST_TIMEOUT = 8.0
+RECENT_RELOADS = 16
+
+
+class ReloadCoordinator:
+    def __init__(self, reload, quiet_period=DEFAULT_QUIET_PERIOD, max_delay=DEFAULT_MAX_DELAY, hold=None,
+                 recent=RECENT_RELOADS):
+        """
+        reload - reload(detected_at) wykonujące przeładowanie, zwraca True/False;
+                 detected_at - pierwsze zgłoszenie na zegarze monotonicznym
+        quiet_period - ile sekund bez nowych zgłoszeń przed przeładowaniem
+        max_delay - najdłuższe odłożenie przeładowania od pierwszego zgłoszenia (s)
+        hold - hold() zwraca kontekst, w którym servo nie wykonuje cykli (czeka na trwający)
+        """
+        self.reload = reload
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.hold = hold or nullcontext
+        self.running = True
+        self.reloads = 0
+        self.changes = 0
+        self.recent = deque(maxlen=recent)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._sources = Counter()
+        self._first = None
+        self._last = None
+        self._requested = 0
+        self._applied = 0
+        self._result = None
+        # Najnowsze zgłoszenie, którego zgłaszający nie doczekał się przeładowania (np. długie karmienie)
+        self._overdue = 0
+        self._thread = None
+
+    def set_quiet_period(self, value):
+        """Okres ciszy (s) - z config.json"""
+        try:
+            value = float(value)
+            if value < 0:
+                raise ValueError(value)
+        except (TypeError, ValueError):
+            log.error(f"Nieprawidłowy okres ciszy przeładowania: {value}, używam {DEFAULT_QUIET_PERIOD:g} s")
+            value = DEFAULT_QUIET_PERIOD
+        with self._cond:
+            self.quiet_period = value
+            self._cond.notify_all()
+
+    def notify(self, source='watch', detected_at=None):
+        """Zgłoś zmianę konfiguracji - zwraca numer zgłoszenia dla wait()"""
+        now = time.monotonic()
+        with self._cond:
+            self._requested += 1
+            self._pending += 1
+            self._sources[source] += 1
+            if self._first is None:
+                self._first = detected_at if detected_at is not None else now
+            self._last = now
+            self._cond.notify_all()
+            return self._requested
+
+    def wait(self, ticket, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Wynik przeładowania obejmującego zgłoszenie albo None, gdy jeszcze go nie było"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._applied >= ticket or not self.running, timeout)
+            if self._applied >= ticket:
+                return self._result_for(ticket)
+            if self.running:
+                self._overdue = max(self._overdue, ticket)
+            return None
+
+    def request(self, source='control', timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Zgłoś zmianę i poczekaj na przeładowanie (API sterujące) - zwraca (numer, wynik albo None)"""
+        ticket = self.notify(source)
+        return ticket, self.wait(ticket, timeout)
+
+    def state(self, ticket):
+        """Stan zgłoszenia: czy objęło je już przeładowanie i z jakim wynikiem"""
+        with self._cond:
+            applied = self._applied >= ticket
+            return {'ticket': ticket, 'applied': applied, 'pending': not applied and ticket <= self._requested,
+                    'result': self._result_for(ticket) if applied else None}
+
+    def _result_for(self, ticket):
+        """Wynik przeładowania, które objęło zgłoszenie (wymaga blokady)"""
+        for record in self.recent:
+            if record['ticket'] >= ticket:
+                return record['success']
+        return self._result
+
+    def _due(self):
+        """Chwila przeładowania: cisza po ostatnim zgłoszeniu, najpóźniej max_delay po pierwszym"""
+        return min(self._last + self.quiet_period, self._first + self.max_delay)
+
+    def _wait_for_batch(self):
+        """Czekaj na zgłoszenia i okres ciszy - False po stop() (wymaga blokady)"""
+        while self.running and not self._pending:
+            self._cond.wait()
+        while self.running:
+            remaining = self._due() - time.monotonic()
+            if remaining <= 0:
+                return True
+            self._cond.wait(remaining)
+        return False
+
+    def run(self):
+        """Pętla koordynatora - jedno przeładowanie na serię zgłoszeń"""
+        while True:
+            with self._cond:
+                if not self._wait_for_batch():
+                    break
+
+            waiting = time.monotonic()
+            with self.hold():
+                # Zgłoszenia z czasu czekania na servo też wchodzą do tego przeładowania
+                with self._cond:
+                    changes, sources, first = self._pending, dict(self._sources), self._first
+                    ticket = self._requested
+                    self._pending = 0
+                    self._sources = Counter()
+                    self._first = self._last = None
+                started = time.monotonic()
+                try:
+                    result = bool(self.reload(first))
+                except Exception as e:
+                    log.error(f"Błąd przeładowania konfiguracji: {e}")
+                    result = False
+            finished = time.monotonic()
+
+            record = {
+                'ticket': ticket,
+                'time': time.time(),
+                'changes': changes,
+                'sources': sources,
+                'success': result,
+                'delay': round(started - first, 4),
+                'servo_wait': round(started - waiting, 4),
+                'duration': round(finished - started, 4),
+            }
+            with self._cond:
+                self.reloads += 1
+                self.changes += changes
+                self.recent.append(record)
+                self._applied = ticket
+                self._result = result
+                overdue = 0 < self._overdue <= ticket
+                if overdue:
+                    self._overdue = 0
+                self._cond.notify_all()
+            if overdue:
+                log.info(f"Zaległe przeładowanie zastosowane po cyklu servo "
+                         f"({'powodzenie' if result else 'błąd'}, {record['delay']:.1f} s od zgłoszenia)")
+            if changes > 1:
+                log.info(f"Przeładowanie objęło {changes} zgłoszeń "
+                         f"({', '.join(f'{s}: {n}' for s, n in sources.items())}), "
+                         f"czekanie na servo {record['servo_wait'] * 1000:.0f} ms")
+
+    def stats(self):
+        """Liczniki dla API: przeładowania, scalone zgłoszenia i ostatnie przeładowania"""
+        with self._cond:
+            return {
+                'quiet_period': self.quiet_period,
+                'reloads': self.reloads,
+                'changes': self.changes,
+                'absorbed': self.changes - self.reloads,
+                'pending': self._pending,
+                'recent': [dict(record) for record in self.recent],
+            }
+
+    def start(self):
+        """Uruchom koordynator w osobnym wątku"""
+        self._thread = threading.Thread(target=self.run, name='config-reload', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Zatrzymaj koordynator - oczekujący na wait() dostają None"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Reguły harmonogramu karmienia
+
+Każdy wpis listy "schedules" to jedna reguła (tekst):
+
+    07:00                          codziennie o 7:00 (dotychczasowy format)
+    pn-pt 07:30                    dni tygodnia: pn wt sr cz pt so nd (albo mon..sun), listy i zakresy
+    so,nd 09:00                    tylko w weekend (równoważnie: weekend 09:00)
+    co 90m 06:00-22:00             co 90 minut w oknie (od początku okna), bez okna przez całą dobę
+    pn,sr,pt co 2h                 odstęp tylko w wybrane dni (jednostki: m, h)
+    cron 0 */2 * * 1-5             wyrażenie cron: minuta godzina dzień miesiąc dzień_tygodnia
+    07:00 oprócz 12-24..12-26      wyjątki: MM-DD (co roku) albo RRRR-MM-DD, zakresy przez '..'
+
+Reguła kompilowana jest raz na dni (filtr dnia) i godziny w ciągu doby. NextFire
+przelicza z nich najbliższe terminy na znaczniki czasu w posortowanej tablicy
+i zwraca kolejny termin przez wyszukiwanie binarne. Terminy liczone są z czasu
+lokalnego dzień po dniu, więc zmiana czasu letniego nie przesuwa karmień.
+"""
+
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, time as dt_time, timedelta
+from functools import lru_cache
+
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):([0-5]\d)(?::([0-5]\d))?$')
+WINDOW_PATTERN = re.compile(r'^(\d\d:\d\d)-(\d\d:\d\d)$')
+INTERVAL_PATTERN = re.compile(r'^(\d+)(m|h)$')
+DATE_PATTERN = re.compile(r'^(?:(\d{4})-)?(\d\d)-(\d\d)$')
+
+WEEKDAYS = {
+    'pn': 0, 'wt': 1, 'sr': 2, 'śr': 2, 'cz': 3, 'pt': 4, 'so': 5, 'sb': 5, 'nd': 6,
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+WEEKDAY_ALIASES = {'weekend': 'so,nd', 'robocze': 'pn-pt'}
+ALL_DAYS = 0b1111111
+EXCEPT_WORDS = ('oprócz', 'oprocz', 'except')
+INTERVAL_WORDS = ('co', 'every')
+
+DAY_SECONDS = 86400
+# Terminy liczone z góry: co najmniej tyle dni albo tyle terminów (częste odstępy)
+HORIZON_DAYS = 14
+MAX_FIRES = 512
+# Reguła, która nie wypada przez tyle dni (np. 29 lutego), uznawana jest za nieaktywną
+MAX_SCAN_DAYS = 8 * 366
+
+CRON_FIELDS = (('minuta', 0, 59), ('godzina', 0, 23), ('dzień', 1, 31), ('miesiąc', 1, 12),
+               ('dzień tygodnia', 0, 7))
+
+
+def _seconds(time_str, allow_midnight_end=False):
+    """Sekunda doby dla 'HH:MM[:SS]' ('24:00' jako koniec okna)"""
+    if allow_midnight_end and time_str == '24:00':
+        return DAY_SECONDS
+    match = TIME_PATTERN.match(time_str)
+    if not match:
+        raise ValueError(f"nieprawidłowa godzina: {time_str} (oczekiwano HH:MM)")
+    hour, minute, second = match.groups()
+    return int(hour) * 3600 + int(minute) * 60 + int(second or 0)
+
+
+def _weekday_mask(text):
+    """Maska dni (bit 0 = poniedziałek) z 'pn-pt', 'so,nd', 'weekend'"""
+    text = WEEKDAY_ALIASES.get(text, text)
+    mask = 0
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        if first not in WEEKDAYS or (last and last not in WEEKDAYS):
+            raise ValueError(f"nieznany dzień tygodnia: {part}")
+        start = WEEKDAYS[first]
+        end = WEEKDAYS[last] if last else start
+        day = start
+        while True:
+            mask |= 1 << day
+            if day == end:
+                break
+            day = (day + 1) % 7
+    return mask
+
+
+def _is_weekday_spec(token):
+    token = WEEKDAY_ALIASES.get(token, token)
+    return all(part.partition('-')[0] in WEEKDAYS for part in token.split(','))
+
+
+def _cron_field(text, name, low, high):
+    """Zbiór wartości pola cron: *, liczby, zakresy a-b, listy i krok /n"""
+    values = set()
+    for part in text.split(','):
+        base, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if base == '*':
+                start, end = low, high
+            else:
+                first, _, last = base.partition('-')
+                start = int(first)
+                end = int(last) if last else (high if step > 1 else start)
+        except ValueError:
+            raise ValueError(f"nieprawidłowe pole {name}: {part}")
+        if step < 1:
+            raise ValueError(f"krok pola {name} musi być dodatni")
+        if not low <= start <= end <= high:
+            raise ValueError(f"pole {name} poza zakresem {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def _parse_exceptions(text):
+    """(daty, dni roku) z listy 'MM-DD', 'RRRR-MM-DD' i zakresów 'a..b'"""
+    dates, yearly = set(), set()
+    for part in text.split(','):
+        try:
+            _add_exception(part, dates, yearly)
+        except ValueError:
+            raise ValueError(f"nieprawidłowa data wyjątku: {part}")
+    return frozenset(dates), frozenset(yearly)
+
+
+def _add_exception(part, dates, yearly):
+    """Dopisz jedną datę albo zakres wyjątku do zbiorów"""
+    first, _, last = part.partition('..')
+    start, end = DATE_PATTERN.match(first), DATE_PATTERN.match(last or first)
+    if not start or not end or bool(start.group(1)) != bool(end.group(1)):
+        raise ValueError(part)
+    if start.group(1):
+        day = date(int(start.group(1)), int(start.group(2)), int(start.group(3)))
+        stop = date(int(end.group(1)), int(end.group(2)), int(end.group(3)))
+        if not 0 <= (stop - day).days <= 366:
+            raise ValueError(part)
+        while day <= stop:
+            dates.add(day)
+            day += timedelta(days=1)
+    else:
+        # Rok przestępny, żeby 02-29 było poprawną datą; zakres może przechodzić przez Nowy Rok
+        day = date(2000, int(start.group(2)), int(start.group(3)))
+        stop = date(2000, int(end.group(2)), int(end.group(3)))
+        if stop < day:
+            stop = stop.replace(year=2001)
+        while day <= stop:
+            yearly.add((day.month, day.day))
+            day += timedelta(days=1)
+
+
+@lru_cache(maxsize=1024)
+def _day_start(day):
+    """(znacznik czasu północy, czy doba ma 24 h) - wspólne dla wszystkich reguł"""
+    midnight = datetime.combine(day, dt_time())
+    start = midnight.timestamp()
+    return start, (midnight + timedelta(days=1)).timestamp() - start == DAY_SECONDS
+
+
+class Rule:
+    def __init__(self, text, times, weekdays=ALL_DAYS, cron=None, except_dates=frozenset(),
+                 except_yearly=frozenset()):
+        """
+        Skompilowana reguła: sekundy doby `times` w dniach przechodzących filtr.
+        cron - (dni miesiąca, miesiące, dni tygodnia cron, czy ograniczono dzień miesiąca, czy tygodnia)
+        """
+        self.text = text
+        self.times = times
+        self.weekdays = weekdays
+        self.cron = cron
+        self.except_dates = except_dates
+        self.except_yearly = except_yearly
+
+    def matches_day(self, day):
+        """Czy w tym dniu reguła karmi"""
+        if not self.weekdays >> day.weekday() & 1:
+            return False
+        if day in self.except_dates or (day.month, day.day) in self.except_yearly:
+            return False
+        if self.cron is not None:
+            days, months, cron_weekdays, dom_limited, dow_limited = self.cron
+            if day.month not in months:
+                return False
+            in_month = day.day in days
+            in_week = (day.weekday() + 1) % 7 in cron_weekdays
+            # Jak w cron: przy obu ograniczonych polach wystarczy zgodność jednego z nich
+            if dom_limited and dow_limited:
+                return in_month or in_week
+            return in_month and in_week
+        return True
+
+    def fires_on(self, day):
+        """Znaczniki czasu karmień w danym dniu (czas lokalny, także w dniu zmiany czasu)"""
+        if not self.matches_day(day):
+            return []
+        start, regular = _day_start(day)
+        if regular:
+            return [start + second for second in self.times]
+        midnight = datetime.combine(day, dt_time())
+        # Dzień zmiany czasu: każda godzina osobno; godzina z przeskoku wiosennego
+        # przesuwa się za przeskok, a z jesiennego wypada raz - duplikaty usuwamy
+        return sorted({(midnight + timedelta(seconds=second)).timestamp() for second in self.times})
+
+
+def _split_exceptions(tokens):
+    for i, token in enumerate(tokens):
+        if token in EXCEPT_WORDS:
+            if i + 1 != len(tokens) - 1:
+                raise ValueError("po 'oprócz' podaj listę dat bez spacji")
+            return tokens[:i], tokens[i + 1]
+    return tokens, None
+
+
+def parse_rule(text):
+    """Reguła z tekstu wpisu harmonogramu - ValueError z opisem błędu"""
+    if not isinstance(text, str):
+        raise ValueError(f"Nieprawidłowa reguła harmonogramu: {text}")
+    return _cached_rule(text)
+
+
+@lru_cache(maxsize=4096)
+def _cached_rule(text):
+    # Ta sama reguła w wielu zasobnikach i po każdym przeładowaniu kompilowana jest raz
+    try:
+        return _parse_rule(text)
+    except ValueError as e:
+        raise ValueError(f"Nieprawidłowa reguła harmonogramu: {text} ({e})")
+
+
+def _parse_rule(text):
+    tokens, exceptions = _split_exceptions(text.lower().split())
+    if not tokens:
+        raise ValueError("pusta reguła")
+    except_dates, except_yearly = _parse_exceptions(exceptions) if exceptions else (frozenset(), frozenset())
+
+    if tokens[0] == 'cron':
+        if len(tokens) != 6:
+            raise ValueError("cron wymaga 5 pól: minuta godzina dzień miesiąc dzień_tygodnia")
+        minutes, hours, days, months, weekdays = (
+            _cron_field(field, *spec) for field, spec in zip(tokens[1:], CRON_FIELDS))
+        # 7 to także niedziela
+        weekdays = frozenset(day % 7 for day in weekdays)
+        times = tuple(sorted(h * 3600 + m * 60 for h in hours for m in minutes))
+        cron = (days, months, weekdays, tokens[3] != '*', tokens[5] != '*')
+        return Rule(text, times, cron=cron, except_dates=except_dates, except_yearly=except_yearly)
+
+    weekdays = ALL_DAYS
+    if _is_weekday_spec(tokens[0]) and len(tokens) > 1:
+        weekdays = _weekday_mask(tokens[0])
+        tokens = tokens[1:]
+
+    if tokens[0] in INTERVAL_WORDS:
+        if len(tokens) not in (2, 3):
+            raise ValueError("odstęp: co <liczba>m|h [HH:MM-HH:MM]")
+        match = INTERVAL_PATTERN.match(tokens[1])
+        if not match:
+            raise ValueError(f"nieprawidłowy odstęp: {tokens[1]}")
+        step = int(match.group(1)) * (3600 if match.group(2) == 'h' else 60)
+        if not 60 <= step <= DAY_SECONDS:
+            raise ValueError("odstęp musi wynosić od 1 minuty do 24 godzin")
+        start, end = 0, DAY_SECONDS
+        if len(tokens) == 3:
+            window = WINDOW_PATTERN.match(tokens[2])
+            if not window:
+                raise ValueError(f"nieprawidłowe okno: {tokens[2]}")
+            start = _seconds(window.group(1))
+            end = _seconds(window.group(2), allow_midnight_end=True)
+            if end <= start:
+                raise ValueError("koniec okna musi być po jego początku")
+        # Koniec okna włącznie (co 2h 06:00-22:00 karmi też o 22:00), doba bez północy następnego dnia
+        last = end if end < DAY_SECONDS else DAY_SECONDS - 1
+        times = tuple(range(start, last + 1, step))
+    elif len(tokens) == 1:
+        times = (_seconds(tokens[0]),)
+    else:
+        raise ValueError("oczekiwano: [dni] HH:MM, [dni] co <odstęp> [okno] albo cron ...")
+
+    return Rule(text, times, weekdays=weekdays, except_dates=except_dates, except_yearly=except_yearly)
+
+
+class NextFire:
+    def __init__(self, rule, horizon_days=HORIZON_DAYS, max_fires=MAX_FIRES):
+        """Najbliższe terminy reguły w posortowanej tablicy, uzupełniane po wyczerpaniu"""
+        self.rule = rule
+        self.horizon_days = horizon_days
+        self.max_fires = max_fires
+        self.fills = 0
+        self._fires = array('d')
+        self._start = None
+        self._valid_until = None
+        self._lock = threading.Lock()
+
+    def _fill(self, ts):
+        """Policz terminy po `ts` na co najmniej horizon_days dni (albo max_fires terminów)"""
+        self.fills += 1
+        fires = array('d')
+        day = datetime.fromtimestamp(ts).date()
+        scanned = 0
+        while scanned < MAX_SCAN_DAYS:
+            fires.extend(t for t in self.rule.fires_on(day) if t > ts)
+            scanned += 1
+            day += timedelta(days=1)
+            if len(fires) >= self.max_fires or (fires and scanned >= self.horizon_days):
+                break
+
+        self._fires = fires
+        self._start = ts
+        # Po ostatnim policzonym terminie trzeba liczyć dalej; bez terminów - do końca przeszukania
+        self._valid_until = fires[-1] if fires else datetime.combine(day, dt_time()).timestamp()
+
+    def next_after(self, ts):
+        """Najbliższy termin (znacznik czasu) po `ts` albo None, gdy reguła już nie wypada"""
+        with self._lock:
+            if self._start is None or not self._start <= ts < self._valid_until:
+                self._fill(ts)
+            index = bisect_right(self._fires, ts)
+            return self._fires[index] if index < len(self._fires) else None
+
+    def upcoming(self, ts, count=5):
+        """Kilka kolejnych terminów po `ts` (podgląd w API)"""
+        result = []
+        while len(result) < count:
+            ts = self.next_after(ts)
+            if ts is None:
+                break
+            result.append(ts)
+        return result
+
+
+def compile_rule(text):
+    """Reguła z kalkulatorem terminów (każde zadanie ma własny kursor)"""
+    return NextFire(parse_rule(text))
+
+
+def validate_rule(text):
+    """Sprawdź wpis harmonogramu - ValueError dla nieprawidłowej reguły"""
+    parse_rule(text)
+    return text
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Harmonogram karmienia sterowany zdarzeniami
+Kopiec najbliższych terminów + zmienna warunkowa zamiast odpytywania co sekundę
+Terminy z reguł (feeder_rules) - dni tygodnia, odstępy, cron i wyjątki
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from feeder_metrics import Histogram
+from feeder_rules import compile_rule
+
+log = logging.getLogger('feeder.scheduler')
+
+# Górne granice przedziałów histogramu opóźnień (s) - stałe, żeby liczniki
+# z różnych dni i różnych karmników dało się porównywać i sumować
+LATENESS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_LATE_WARNING = 5.0
+RECENT_FIRES = 16
+
+
+class FireStats:
+    def __init__(self, warn_after=DEFAULT_LATE_WARNING, recent=RECENT_FIRES):
+        """
+        Pomiary uruchomień zadań: opóźnienie startu względem terminu i czas do końca karmienia.
+        warn_after - opóźnienie startu (s), powyżej którego logowane jest ostrzeżenie
+        """
+        self.warn_after = warn_after
+        # termin -> wywołanie zadania przez wątek harmonogramu
+        self.lateness = Histogram(LATENESS_BUCKETS)
+        # termin -> koniec karmienia w wątku servo (z czekaniem w kolejce)
+        self.completion = Histogram(LATENESS_BUCKETS)
+        self.late = 0
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def fired(self, job, due, deadline):
+        """Zapisz start zadania - zwraca rekord uzupełniany przez finished()"""
+        lateness = max(0.0, time.monotonic() - deadline)
+        key = '/'.join(map(str, job.key)) if isinstance(job.key, tuple) else str(job.key)
+        record = {
+            'job': key,
+            'planned': due.timestamp(),
+            'started': time.time(),
+            'lateness': round(lateness, 4),
+            'thread': threading.current_thread().name,
+            'ended': None,
+            'completion': None,
+            'actuation_thread': None,
+        }
+        with self._lock:
+            self.lateness.observe(lateness)
+            self.recent.append(record)
+            late = lateness > self.warn_after
+            if late:
+                self.late += 1
+        if late:
+            log.warning(f"Zadanie {key} uruchomione {lateness:.2f} s po terminie "
+                        f"(próg {self.warn_after:g} s)")
+        return record
+
+    def finished(self, record, deadline):
+        """Zapisz koniec karmienia zleconego przez zadanie (wątek, który je wykonał)"""
+        completion = max(0.0, time.monotonic() - deadline)
+        with self._lock:
+            record['ended'] = time.time()
+            record['completion'] = round(completion, 4)
+            record['actuation_thread'] = threading.current_thread().name
+            self.completion.observe(completion)
+
+    def summary(self):
+        """Skrót do statusu: liczba spóźnionych uruchomień, średnie i największe opóźnienie"""
+        with self._lock:
+            return {
+                'late': self.late,
+                'lateness_mean': round(self.lateness.sum / self.lateness.count, 4) if self.lateness.count else 0.0,
+                'lateness_max': round(self.lateness.max, 4),
+                'completion_max': round(self.completion.max, 4),
+            }
+
+    def snapshot(self):
+        """Histogramy i ostatnie uruchomienia dla API"""
+        with self._lock:
+            return {
+                'warn_after': self.warn_after,
+                'late': self.late,
+                'lateness': self.lateness.snapshot(),
+                'completion': self.completion.snapshot(),
+                'recent': [dict(record) for record in self.recent],
+            }
+
+
+class ScheduledJob:
+    def __init__(self, time_str, callback, args, key=None):
+        """Zadanie według reguły (np. '07:00', 'pn-pt 07:30'); key rozróżnia tę samą regułę w kilku zasobnikach"""
+        self.time_str = time_str
+        self.key = key if key is not None else time_str
+        self.fire_times = compile_rule(time_str)
+        self.callback = callback
+        self.args = args
+        self.due = None          # najbliższy termin (czas ścienny)
+        self.deadline = None     # ten sam termin na zegarze monotonicznym
+        self.last_fired = None   # termin ostatniego uruchomienia
+        self.generation = 0
+
+    def next_due(self, now):
+        """Najbliższy termin po `now` z pominięciem już obsłużonego albo None, gdy reguła nie wypada"""
+        ts = now.timestamp()
+        while True:
+            ts = self.fire_times.next_after(ts)
+            if ts is None:
+                return None
+            due = datetime.fromtimestamp(ts)
+            # Zegar cofnięty po karmieniu - ten sam termin nie może wypaść drugi raz
+            if due != self.last_fired:
+                return due
+
+
+class FeedScheduler:
+    def __init__(self, max_sleep=900.0, resync_threshold=2.0, grace=60.0, late_warning=DEFAULT_LATE_WARNING):
+        """
+        max_sleep - najdłuższy sen bez sprawdzenia zegara ściennego (s)
+        resync_threshold - skok zegara ściennego wymuszający przeliczenie terminów (s)
+        grace - jak długo po terminie zadanie może jeszcze zostać uruchomione po skoku zegara (s)
+        late_warning - opóźnienie uruchomienia (s), powyżej którego logowane jest ostrzeżenie
+        """
+        self.max_sleep = max_sleep
+        self.resync_threshold = resync_threshold
+        self.grace = grace
+        self.running = True
+        self.wakeups = 0
+        self.fires = 0
+        self.resyncs = 0
+        self.fire_stats = FireStats(late_warning)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._offset = self._clock_offset()
+        self._thread = None
+
+    @staticmethod
+    def _clock_offset():
+        """Różnica między zegarem ściennym a monotonicznym"""
+        return time.time() - time.monotonic()
+
+    def _push(self, job, due, now_wall, now_mono):
+        """Wstaw zadanie na kopiec (wymaga trzymania blokady); bez terminu zadanie czeka poza kopcem"""
+        job.generation += 1
+        job.due = due
+        if due is None:
+            job.deadline = None
+            return
+        # Różnica znaczników czasu, nie czasu lokalnego - zmiana czasu letniego nie przesuwa terminu
+        job.deadline = now_mono + (due.timestamp() - now_wall.timestamp())
+        heapq.heappush(self._heap, (job.deadline, next(self._seq), job.generation, job))
+
+    def add(self, time_str, callback, *args, key=None):
+        """Dodaj zadanie według reguły (key domyślnie = tekst reguły) - ValueError dla błędnej reguły"""
+        job = ScheduledJob(time_str, callback, args, key)
+        with self._cond:
+            old = self._jobs.get(job.key)
+            if old is not None:
+                old.generation += 1
+            self._jobs[job.key] = job
+            now_wall, now_mono = datetime.now(), time.monotonic()
+            self._push(job, job.next_due(now_wall), now_wall, now_mono)
+            self._cond.notify()
+        return job
+
+    def remove(self, key):
+        """Usuń zadanie (godzina lub klucz z add) - zwraca False gdy nie istniało"""
+        with self._cond:
+            job = self._jobs.pop(key, None)
+            if job is None:
+                return False
+            # Wpis na kopcu zostaje, ale zostanie pominięty przy zdjęciu
+            job.generation += 1
+            self._cond.notify()
+            return True
+
+    def clear(self):
+        """Usuń wszystkie zadania"""
+        with self._cond:
+            self._jobs.clear()
+            self._heap.clear()
+            self._cond.notify()
+
+    def times(self):
+        """Posortowana lista godzin w harmonogramie"""
+        with self._cond:
+            return sorted(job.time_str for job in self._jobs.values())
+
+    def next_run(self):
+        """Najbliższy termin karmienia (czas ścienny) lub None"""
+        with self._cond:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            return self._heap[0][3].due
+
+    def set_late_warning(self, value):
+        """Próg ostrzeżenia o opóźnionym uruchomieniu (s) - z config.json"""
+        try:
+            value = float(value)
+            if value <= 0:
+                raise ValueError(value)
+        except (TypeError, ValueError):
+            log.error(f"Nieprawidłowy próg opóźnienia: {value}, używam {DEFAULT_LATE_WARNING:g} s")
+            value = DEFAULT_LATE_WARNING
+        self.fire_stats.warn_after = value
+
+    def stats(self):
+        """Liczniki do diagnostyki"""
+        with self._cond:
+            stats = {
+                'jobs': len(self._jobs),
+                'wakeups': self.wakeups,
+                'fires': self.fires,
+                'resyncs': self.resyncs,
+            }
+        stats.update(self.fire_stats.summary())
+        return stats
+
+    def timing(self):
+        """Histogramy opóźnień i ostatnie uruchomienia"""
+        return self.fire_stats.snapshot()
+
+    def _drop_stale(self):
+        """Zdejmij z wierzchołka kopca unieważnione wpisy"""
+        while self._heap:
+            _, _, generation, job = self._heap[0]
+            if self._jobs.get(job.key) is job and generation == job.generation:
+                return
+            heapq.heappop(self._heap)
+
+    def _resync(self, now_wall, now_mono):
+        """Przelicz terminy po skoku zegara ściennego (NTP, brak RTC)"""
+        self.resyncs += 1
+        self._heap.clear()
+        due_now = []
+        for job in self._jobs.values():
+            missed_by = now_wall.timestamp() - job.due.timestamp() if job.due else None
+            if missed_by is not None and 0 <= missed_by <= self.grace \
+                    and job.due != job.last_fired:
+                # Termin minął tuż przed skokiem - uruchom od razu zamiast pominąć
+                self._push(job, job.due, job.due, now_mono)
+                due_now.append(job.time_str)
+            else:
+                self._push(job, job.next_due(now_wall), now_wall, now_mono)
+        log.warning(f"Skok zegara systemowego - przeliczono harmonogram ({len(self._jobs)} zadań)")
+        if due_now:
+            log.info(f"Zaległe zadania po skoku zegara: {', '.join(due_now)}")
+
+    def _collect_due(self):
+        """Zdejmij zadania, których termin minął, i zaplanuj kolejne (wymaga blokady)"""
+        now_mono = time.monotonic()
+        now_wall = datetime.now()
+        offset = self._clock_offset()
+        if abs(offset - self._offset) > self.resync_threshold:
+            self._offset = offset
+            self._resync(now_wall, now_mono)
+
+        due = []
+        while self._heap:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now_mono:
+                break
+            deadline, _, _, job = heapq.heappop(self._heap)
+            job.last_fired = job.due
+            # Termin zapamiętany przed przeliczeniem na następny
+            due.append((job, job.due, deadline))
+            self._push(job, job.next_due(now_wall), now_wall, now_mono)
+        return due
+
+    def _timeout(self):
+        """Czas snu do najbliższego terminu (wymaga blokady)"""
+        self._drop_stale()
+        if not self._heap:
+            return self.max_sleep
+        return max(0.0, min(self._heap[0][0] - time.monotonic(), self.max_sleep))
+
+    def run(self):
+        """Pętla harmonogramu - śpi do najbliższego terminu"""
+        while self.running:
+            with self._cond:
+                due = self._collect_due()
+                if not due:
+                    self._cond.wait(self._timeout())
+                    self.wakeups += 1
+                    continue
+                self.fires += len(due)
+
+            for job, planned, deadline in due:
+                record = self.fire_stats.fired(job, planned, deadline)
+                try:
+                    result = job.callback(*job.args)
+                except Exception as e:
+                    log.error(f"Błąd zadania {job.time_str}: {e}")
+                    continue
+                # Zadanie zwracające Future (zlecenie karmienia) kończy się w wątku servo
+                if hasattr(result, 'add_done_callback'):
+                    result.add_done_callback(lambda _, record=record, deadline=deadline:
+                                             self.fire_stats.finished(record, deadline))
+                else:
+                    self.fire_stats.finished(record, deadline)
+
+    def start(self):
+        """Uruchom pętlę harmonogramu w osobnym wątku"""
+        self._thread = threading.Thread(target=self.run, name='scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Zatrzymaj pętlę harmonogramu"""
+        with self._cond:
+            self.running = False
+            self._cond.notify()
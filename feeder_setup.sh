@@ -14,8 +14,29 @@ mkdir -p "$FEEDER_DIR"
 cd "$FEEDER_DIR"
 
 echo "1. Kopiowanie pliku feeder_simple.py..."
-cp /home/admin/karmnik/Animal-auto-feeder/feeder.py "$FEEDER_DIR/"
-chmod +x feeder.py
+cp /home/admin/karmnik/Animal-auto-feeder/feeder.py "$FEEDER_DIR/feeder_simple.py"
+chmod +x feeder_simple.py
+
+echo "   Kopiowanie modułów pomocniczych..."
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_scheduler.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_rules.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_reload.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_watch.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_control.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_actuator.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_hopper.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_motion.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_status.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_store.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_history.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_logging.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_protocol.py "$FEEDER_DIR/"
+cp /home/admin/karmnik/Animal-auto-feeder/feeder_metrics.py "$FEEDER_DIR/"
+
+# Gniazdo sterujące (feeder.sock) dostępne tylko dla grupy feeder - panel web działa jako admin
+echo "   Grupa feeder dla API sterującego..."
+sudo groupadd -f feeder
+sudo usermod -aG feeder admin
 
 echo "2. Tworzenie domyślnego config.json..."
 cat > config.json << 'EOF'
@@ -40,6 +61,8 @@ Requires=pigpiod.service
 Type=simple
 User=root
 WorkingDirectory=/home/admin/feeder
+RuntimeDirectory=feeder
+RuntimeDirectoryMode=0755
 ExecStart=/usr/bin/python3 /home/admin/feeder/feeder_simple.py
 Restart=always
 RestartSec=10
@@ -72,9 +95,9 @@ echo "  sudo journalctl -u feeder.service -f"
 echo ""
 echo "Aby edytować harmonogram:"
 echo "  nano /home/admin/feeder/config.json"
-echo "  sudo systemctl restart feeder.service"
+echo "  (zmiany są wczytywane automatycznie)"
 echo ""
 echo "Aby przetestować servo ręcznie:"
 echo "  cd /home/admin/feeder"
-echo "  python3 -c 'from feeder_simple import SimpleFeeder; f = SimpleFeeder(); f.feed()'"
+echo "  python3 -c 'from feeder_control import ControlClient; print(ControlClient().feed())'"
 echo ""
\ No newline at end of file
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Migawka stanu karmnika w pliku mapowanym w pamięci
+Usługa zapisuje rekord w miejscu, panel web i feeder.sh czytają go bez forkowania
+"""
+
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+log = logging.getLogger('feeder.status')
+
+DEFAULT_STATUS_FILE = '/run/feeder/status'
+
+MAGIC = b'FDST'
+LAYOUT_VERSION = 1
+
+# Nagłówek: magic, wersja układu, licznik sekwencji (seqlock)
+HEADER = struct.Struct('<4sHxxQ')
+# Treść: heartbeat, start, następne karmienie, ostatnie karmienie, pid,
+# wynik ostatniego karmienia (-1 brak, 0 błąd, 1 ok), liczba karmień, liczba błędów
+BODY = struct.Struct('<ddddIbxxxQQ')
+SEQ_OFFSET = 8
+SEQ = struct.Struct('<Q')
+RECORD_SIZE = HEADER.size + BODY.size
+
+FIELDS = ('heartbeat', 'started', 'next_feed', 'last_feed', 'pid', 'last_result', 'feeds', 'failures')
+
+
+class StatusWriter:
+    def __init__(self, path=DEFAULT_STATUS_FILE):
+        """Otwórz (lub utwórz) plik migawki o stałym rozmiarze"""
+        self.path = path
+        self.seq = 0
+        self.values = {
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            'started': time.time(),
+            'next_feed': 0.0,
+            'last_feed': 0.0,
+            'last_result': -1,
+            'feeds': 0,
+            'failures': 0,
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, RECORD_SIZE)
+            self._map = mmap.mmap(fd, RECORD_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, self.seq)
+        self._write()
+
+    def _write(self):
+        """Zapisz rekord pod seqlockiem (wymaga blokady albo konstruktora)"""
+        # Nieparzysty licznik = zapis w toku, czytelnik ponawia odczyt
+        self.seq += 1
+        SEQ.pack_into(self._map, SEQ_OFFSET, self.seq)
+        BODY.pack_into(self._map, HEADER.size, *(self.values[name] for name in FIELDS))
+        self.seq += 1
+        SEQ.pack_into(self._map, SEQ_OFFSET, self.seq)
+
+    def update(self, **values):
+        """Zmień wybrane pola i opublikuj rekord"""
+        with self._lock:
+            self.values.update(values)
+            self.values['heartbeat'] = time.time()
+            self._write()
+
+    def record_feed(self, success, when=None):
+        """Zapisz wynik karmienia i zwiększ liczniki"""
+        with self._lock:
+            self.values['last_feed'] = when or time.time()
+            self.values['last_result'] = 1 if success else 0
+            self.values['feeds'] += 1
+            if not success:
+                self.values['failures'] += 1
+            self.values['heartbeat'] = time.time()
+            self._write()
+
+    def start_heartbeat(self, interval=30.0, refresh=None):
+        """Odświeżaj heartbeat co `interval` sekund; refresh() zwraca dodatkowe pola"""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.update(**(refresh() if refresh else {}))
+                except Exception as e:
+                    log.error(f"Błąd aktualizacji stanu: {e}")
+
+        self._thread = threading.Thread(target=loop, name='status-heartbeat', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Zatrzymaj heartbeat i zamknij mapowanie"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._lock:
+            self._map.close()
+
+
+class StatusReader:
+    def __init__(self, path=DEFAULT_STATUS_FILE):
+        """Czytelnik migawki - plik otwierany leniwie"""
+        self.path = path
+        self._map = None
+        self._inode = None
+
+    def _open(self):
+        """Zmapuj plik (ponownie, gdy usługa utworzyła go na nowo)"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._close()
+            return False
+        if self._map is not None and st.st_ino == self._inode:
+            return True
+        self._close()
+        if st.st_size < RECORD_SIZE:
+            return False
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), RECORD_SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        self._inode = st.st_ino
+        return True
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def read(self, retries=100):
+        """Spójny odczyt rekordu - None gdy usługa nie publikuje stanu"""
+        if not self._open():
+            return None
+
+        magic, version, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            return None
+
+        for _ in range(retries):
+            before = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+            if not before & 1:
+                body = BODY.unpack_from(self._map, HEADER.size)
+                if SEQ.unpack_from(self._map, SEQ_OFFSET)[0] == before:
+                    record = dict(zip(FIELDS, body))
+                    record['seq'] = before
+                    return record
+            # Zapis w toku - oddaj procesor piszącemu
+            time.sleep(0.001)
+        return None
+
+
+def open_writer(path=DEFAULT_STATUS_FILE):
+    """Utwórz StatusWriter lub None, gdy katalog jest niedostępny"""
+    try:
+        return StatusWriter(path)
+    except OSError as e:
+        log.warning(f"Migawka stanu wyłączona ({path}): {e}")
+        return None
+
+
+def format_time(timestamp):
+    """Czytelna data lub '-' dla pustego pola"""
+    if not timestamp:
+        return '-'
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def main():
+    """Wypisz stan karmnika (feeder.sh info)"""
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_STATUS_FILE
+    record = StatusReader(path).read()
+    if record is None:
+        print("Brak migawki stanu - karmnik nie działa?")
+        sys.exit(1)
+
+    age = time.time() - record['heartbeat']
+    results = {-1: '-', 0: 'BŁĄD', 1: 'OK'}
+    print(f"PID:                 {record['pid']}")
+    print(f"Heartbeat:           {age:.0f} s temu")
+    print(f"Uruchomiony:         {format_time(record['started'])}")
+    print(f"Następne karmienie:  {format_time(record['next_feed'])}")
+    print(f"Ostatnie karmienie:  {format_time(record['last_feed'])} ({results.get(record['last_result'], '?')})")
+    print(f"Karmienia / błędy:   {record['feeds']} / {record['failures']}")
+
+
+if __name__ == '__main__':
+    main()
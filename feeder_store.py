@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Wspólny magazyn konfiguracji (config.json)
+Kopia w pamięci odświeżana po mtime/inode, zapis pod blokadą fcntl przez plik tymczasowy + rename.
+Zmiany harmonogramu dopisywane są do dziennika config.json.journal i co jakiś czas scalane z plikiem.
+"""
+
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+log = logging.getLogger('feeder.config')
+
+# Po tylu wpisach dziennik jest scalany z config.json
+COMPACT_AFTER = 32
+
+SCHEDULE_OPS = ('add', 'remove', 'replace')
+
+# Karmnik w starym układzie config.json (jedno servo, lista "schedules" na górze pliku)
+DEFAULT_FEEDER = 'main'
+DEFAULT_PIN = 18
+
+# Największa dawka (liczba porcji) jednego karmienia
+MAX_DOSE = 10
+
+
+class ConflictError(Exception):
+    """Plik zmienił się od wersji, na której pracował zapisujący"""
+
+
+def apply_schedule_op(schedules, op, times, strict=False):
+    """
+    Nowa lista godzin po operacji add/remove/replace.
+    strict - ValueError przy dodaniu istniejącej lub usunięciu nieistniejącej godziny
+    """
+    if op not in SCHEDULE_OPS:
+        raise ValueError(f"Nieznana operacja harmonogramu: {op}")
+    if op == 'replace':
+        return list(dict.fromkeys(times))
+
+    result = list(schedules)
+    for feed_time in times:
+        if op == 'add':
+            if feed_time not in result:
+                result.append(feed_time)
+            elif strict:
+                raise ValueError(f"Godzina już istnieje: {feed_time}")
+        elif feed_time in result:
+            result.remove(feed_time)
+        elif strict:
+            raise ValueError(f"Godzina nie istnieje: {feed_time}")
+    return result
+
+
+def parse_dose(value):
+    """Dawka jako liczba porcji 1..MAX_DOSE (ValueError dla innych wartości)"""
+    try:
+        dose = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Nieprawidłowa dawka: {value}")
+    if not 1 <= dose <= MAX_DOSE:
+        raise ValueError(f"Dawka poza zakresem 1-{MAX_DOSE}: {dose}")
+    return dose
+
+
+def apply_dose_op(doses, op, times, dose=None):
+    """
+    Dawki {godzina: porcje} po operacji harmonogramu.
+    Usunięta godzina traci dawkę; dose podane przy add/replace ustawia dawkę tych godzin.
+    """
+    if op == 'replace':
+        result = {t: n for t, n in doses.items() if t in times}
+    elif op == 'remove':
+        result = {t: n for t, n in doses.items() if t not in times}
+    else:
+        result = dict(doses)
+    if dose is not None and op != 'remove':
+        for feed_time in times:
+            result[feed_time] = dose
+    return result
+
+
+def schedule_tag(schedules):
+    """Krótki skrót zestawu godzin (niezależny od kolejności) - klient porównuje go zamiast listy"""
+    return hashlib.sha1(json.dumps(sorted(schedules)).encode('utf-8')).hexdigest()[:12]
+
+
+def default_feeder(config):
+    """Karmnik, którego dotyczą komendy bez podanego identyfikatora"""
+    feeders = config.get('feeders')
+    if not feeders or DEFAULT_FEEDER in feeders:
+        return DEFAULT_FEEDER
+    return next(iter(feeders))
+
+
+def feeder_configs(config, default_pin=DEFAULT_PIN):
+    """
+    Ustawienia wszystkich zasobników: {id: {'pin', 'schedules', 'doses', 'portions', 'profile'}}.
+    doses - dawki wybranych godzin {godzina: porcje}; pozostałe godziny dostają 'portions'.
+    Bez sekcji "feeders" plik opisuje jeden zasobnik 'main' (dotychczasowy układ).
+    """
+    feeders = config.get('feeders')
+    if not feeders:
+        feeders = {DEFAULT_FEEDER: {
+            'pin': config.get('servo_pin', default_pin),
+            'schedules': config.get('schedules', []),
+            'doses': config.get('doses', {}),
+            'portions': config.get('portions', 1),
+            'profile': config.get('profile'),
+        }}
+    return {
+        name: {
+            'pin': int(settings['pin']),
+            'schedules': list(settings.get('schedules', [])),
+            'doses': {t: int(n) for t, n in (settings.get('doses') or {}).items()},
+            'portions': int(settings.get('portions', 1)),
+            'profile': settings.get('profile', config.get('profile')),
+        }
+        for name, settings in feeders.items()
+    }
+
+
+def _feeder_section(config, feeder):
+    """Słownik, w którym leży lista godzin danego karmnika (ValueError dla nieznanego)"""
+    feeder = feeder or default_feeder(config)
+    feeders = config.get('feeders')
+    if not feeders:
+        if feeder != DEFAULT_FEEDER:
+            raise ValueError(f"Nieznany karmnik: {feeder}")
+        return config
+    if feeder not in feeders:
+        raise ValueError(f"Nieznany karmnik: {feeder}")
+    return feeders[feeder]
+
+
+def feeder_schedules(config, feeder=None):
+    """Lista godzin karmnika (domyślnego, gdy feeder=None)"""
+    return list(_feeder_section(config, feeder).get('schedules', []))
+
+
+def set_feeder_schedules(config, feeder, schedules):
+    """Podmień listę godzin karmnika w słowniku konfiguracji"""
+    _feeder_section(config, feeder)['schedules'] = schedules
+
+
+def feeder_doses(config, feeder=None):
+    """Dawki godzin karmnika {godzina: porcje}"""
+    return dict(_feeder_section(config, feeder).get('doses') or {})
+
+
+def set_feeder_doses(config, feeder, doses):
+    """Podmień dawki karmnika (pusta mapa usuwa klucz z pliku)"""
+    section = _feeder_section(config, feeder)
+    if doses:
+        section['doses'] = doses
+    else:
+        section.pop('doses', None)
+
+
+def apply_operation(config, operation, strict=False):
+    """
+    Nałóż jedną operację {'op', 'times', 'feeder', 'dose'} na słownik konfiguracji.
+    Zwraca zmieniony zasobnik albo None, gdy operacja niczego nie zmieniła.
+    """
+    op, times, dose = operation['op'], operation['times'], operation.get('dose')
+    feeder = operation.get('feeder') or default_feeder(config)
+    old = feeder_schedules(config, feeder)
+    schedules = apply_schedule_op(old, op, times, strict=strict)
+    old_doses = feeder_doses(config, feeder)
+    doses = apply_dose_op(old_doses, op, times, dose)
+    if schedules == old and doses == old_doses:
+        return None
+    set_feeder_schedules(config, feeder, schedules)
+    set_feeder_doses(config, feeder, doses)
+    return feeder
+
+
+class ConfigStore:
+    def __init__(self, path):
+        """path - plik JSON; obok powstaje plik blokady <path>.lock"""
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.journal_path = path + '.journal'
+        self._cache = None
+        self._signature = None
+        self._journal_entries = 0
+        self._lock = threading.RLock()
+
+    def _stat(self):
+        """Sygnatura pliku i dziennika - zmienia się przy każdym zapisie i dopisaniu"""
+        st = os.stat(self.path)
+        try:
+            jst = os.stat(self.journal_path)
+            journal = jst.st_ino, jst.st_size
+        except FileNotFoundError:
+            journal = None
+        return st.st_mtime_ns, st.st_ino, st.st_size, journal
+
+    def _load(self):
+        """Zwróć sparsowaną zawartość, czytając pliki tylko gdy się zmieniły (wymaga blokady)"""
+        signature = self._stat()
+        if signature != self._signature:
+            with open(self.path, 'r') as f:
+                config = json.load(f)
+            self._journal_entries = self._replay(config)
+            self._cache = config
+            self._signature = signature
+        return self._cache
+
+    def _replay(self, config):
+        """Nałóż wpisy dziennika nowsze niż wersja pliku - zwraca liczbę nałożonych"""
+        try:
+            with open(self.journal_path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+
+        applied = 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Niedokończony wpis po zaniku zasilania
+                continue
+            if entry['version'] <= config.get('version', 0):
+                continue
+            # Wpis zbiorczy (apply_batch) niesie kilka operacji jednej wersji
+            for operation in entry.get('batch', [entry]):
+                try:
+                    apply_operation(config, operation)
+                except ValueError as e:
+                    # Karmnik usunięty z pliku - wpis nie ma już czego dotyczyć
+                    log.warning(f"Pominięto wpis dziennika {entry['version']}: {e}")
+            config['version'] = entry['version']
+            applied += 1
+        return applied
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self):
+        """Kopia aktualnej konfiguracji - FileNotFoundError gdy pliku nie ma"""
+        with self._lock:
+            return copy.deepcopy(self._load())
+
+    def version(self):
+        """Numer wersji zapisany w pliku (0 dla plików sprzed magazynu)"""
+        try:
+            with self._lock:
+                return self._load().get('version', 0)
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def locked(self):
+        """Wyłączna blokada między procesami (panel web, feeder.sh, usługa)"""
+        with self._lock:
+            fd = os.open(self.lock_path, os.O_RDONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def update(self, mutate, expected_version=None, default=None):
+        """
+        Odczyt-modyfikacja-zapis pod blokadą.
+        mutate(config) zmienia słownik w miejscu; wyjątek przerywa zapis,
+        zwrócone False oznacza brak zmian (plik nie jest przepisywany).
+        expected_version - wersja, na której pracował wywołujący (ConflictError gdy nieaktualna)
+        default - zawartość startowa, gdy pliku jeszcze nie ma
+        Zwraca zapisaną konfigurację.
+        """
+        with self.locked():
+            try:
+                current = self._load()
+            except FileNotFoundError:
+                if default is None:
+                    raise
+                current = default
+
+            version = current.get('version', 0)
+            if expected_version is not None and expected_version != version:
+                raise ConflictError(f"Konfiguracja zmieniona w międzyczasie (wersja {version}, oczekiwano {expected_version})")
+
+            config = copy.deepcopy(current)
+            if mutate(config) is False:
+                return copy.deepcopy(current)
+            config['version'] = version + 1
+            self._write(config)
+            return copy.deepcopy(config)
+
+    def append(self, op, times, expected_version=None, default=None, strict=True, feeder=None, dose=None):
+        """
+        Zmiana harmonogramu (add/remove/replace) dopisana do dziennika zamiast przepisywania pliku.
+        Parametry jak w update(); strict - patrz apply_schedule_op;
+        feeder - identyfikator zasobnika (domyślny, gdy None);
+        dose - liczba porcji dla dodawanych godzin (None - domyślna zasobnika).
+        Zwraca konfigurację po zmianie.
+        """
+        times = list(times)
+        with self.locked():
+            try:
+                current = self._load()
+            except FileNotFoundError:
+                if default is None:
+                    raise
+                current = default
+
+            version = current.get('version', 0)
+            if expected_version is not None and expected_version != version:
+                raise ConflictError(f"Konfiguracja zmieniona w międzyczasie (wersja {version}, oczekiwano {expected_version})")
+
+            feeder = feeder or default_feeder(current)
+            config = copy.deepcopy(current)
+            operation = {'op': op, 'times': times, 'feeder': feeder, 'dose': dose}
+            if apply_operation(config, operation, strict=strict) is None:
+                return copy.deepcopy(current)
+            config['version'] = version + 1
+
+            if current is default or self._journal_entries >= COMPACT_AFTER:
+                # Brak pliku bazowego albo długi dziennik - zapisz całość
+                self._write(config)
+            else:
+                entry = {'version': version + 1, 'op': op, 'times': times, 'feeder': feeder}
+                if dose is not None:
+                    entry['dose'] = dose
+                self._append_journal(entry)
+                self._journal_entries += 1
+                self._cache = config
+                self._signature = self._stat()
+            return copy.deepcopy(config)
+
+    def apply_batch(self, operations, expected_version=None, default=None, strict=True):
+        """
+        Kilka zmian harmonogramu (także różnych zasobników) jako jedna transakcja:
+        sprawdzane razem, jedna nowa wersja i jeden wpis dziennika.
+        operations - lista {'op', 'times', 'feeder', 'dose'} nakładanych po kolei;
+        ValueError w którejkolwiek nie zapisuje niczego.
+        Zwraca (konfiguracja po zmianie, lista zmienionych zasobników).
+        """
+        with self.locked():
+            try:
+                current = self._load()
+            except FileNotFoundError:
+                if default is None:
+                    raise
+                current = default
+
+            version = current.get('version', 0)
+            if expected_version is not None and expected_version != version:
+                raise ConflictError(f"Konfiguracja zmieniona w międzyczasie (wersja {version}, oczekiwano {expected_version})")
+
+            config = copy.deepcopy(current)
+            batch, changed = [], []
+            for operation in operations:
+                if operation.get('op') not in SCHEDULE_OPS:
+                    raise ValueError(f"Nieznana operacja harmonogramu: {operation.get('op')}")
+                entry = {'op': operation['op'], 'times': list(operation['times']),
+                         'feeder': operation.get('feeder') or default_feeder(config)}
+                if operation.get('dose') is not None:
+                    entry['dose'] = operation['dose']
+                feeder = apply_operation(config, entry, strict=strict)
+                batch.append(entry)
+                if feeder is not None and feeder not in changed:
+                    changed.append(feeder)
+            if not changed:
+                return copy.deepcopy(current), []
+            config['version'] = version + 1
+
+            if current is default or self._journal_entries >= COMPACT_AFTER:
+                self._write(config)
+            else:
+                # Jedna linia dziennika - po zaniku zasilania cała partia jest albo jej nie ma
+                self._append_journal({'version': version + 1, 'batch': batch})
+                self._journal_entries += 1
+                self._cache = config
+                self._signature = self._stat()
+            return copy.deepcopy(config), changed
+
+    def _append_journal(self, entry):
+        """Dopisz jeden wpis i fsync - kilkadziesiąt bajtów zamiast całego pliku"""
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b'\n':
+                # Urwany ostatni wpis - nowy musi zacząć się od nowej linii
+                line = b'\n' + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write(self, config):
+        """Zapis odporny na zanik zasilania: plik tymczasowy, fsync, rename, fsync katalogu"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(config, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        # Plik zawiera już wszystkie zmiany z dziennika (wpisy o niższej wersji i tak są pomijane)
+        try:
+            os.unlink(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self._cache = config
+        self._signature = self._stat()
+        self._journal_entries = 0
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Obserwowanie pliku konfiguracji
+inotify (Linux) z zapasowym odpytywaniem mtime
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+log = logging.getLogger('feeder.config')
+
+# Stałe z <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """Zwróć libc z funkcjami inotify lub None gdy niedostępne"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class ConfigWatcher:
+    def __init__(self, path, callback, poll_interval=2.0, companions=()):
+        """
+        path - obserwowany plik
+        callback - wywoływany jako callback(detected_at) po zmianie pliku,
+                   detected_at to czas wykrycia na zegarze monotonicznym
+        companions - pliki w tym samym katalogu, których zmiana też się liczy (dziennik)
+        """
+        self.path = os.path.abspath(path)
+        self.paths = [self.path] + [os.path.abspath(p) for p in companions]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.running = True
+        self.mode = None
+        self._signature = self._stat()
+        self._fd = None
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = None
+
+    def _stat(self):
+        """Sygnatura plików - zmienia się przy zapisie i przy podmianie przez rename"""
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_ino, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _changed(self):
+        """Sprawdź czy plik faktycznie się zmienił od ostatniego wywołania"""
+        signature = self._stat()
+        if signature == self._signature or signature[0] is None:
+            return False
+        self._signature = signature
+        return True
+
+    def _notify(self, detected_at):
+        """Wywołaj callback, błędy tylko logujemy"""
+        try:
+            self.callback(detected_at)
+        except Exception as e:
+            log.error(f"Błąd przeładowania konfiguracji: {e}")
+
+    def _init_inotify(self):
+        """Załóż obserwację katalogu (pliki podmieniane przez rename zmieniają inode)"""
+        libc = _load_inotify()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        directory = os.path.dirname(self.path)
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def _read_events(self):
+        """Odczytaj zdarzenia inotify - True gdy dotyczą obserwowanego pliku"""
+        names = {os.path.basename(path).encode() for path in self.paths}
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return False
+        offset = 0
+        hit = False
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            event_name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if event_name in names:
+                hit = True
+        return hit
+
+    def _run_inotify(self):
+        """Pętla oparta o inotify - śpi aż jądro zgłosi zmianę"""
+        while self.running:
+            ready, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in ready:
+                break
+            if self._read_events() and self._changed():
+                self._notify(time.monotonic())
+
+    def _run_polling(self):
+        """Zapasowa pętla - porównanie mtime co poll_interval sekund"""
+        while self.running:
+            ready, _, _ = select.select([self._stop_r], [], [], self.poll_interval)
+            if ready:
+                break
+            if self._changed():
+                self._notify(time.monotonic())
+
+    def run(self):
+        """Obserwuj plik aż do stop()"""
+        if self._init_inotify():
+            self.mode = 'inotify'
+            log.info(f"Obserwuję {self.path} (inotify)")
+            self._run_inotify()
+        else:
+            self.mode = 'polling'
+            log.info(f"Obserwuję {self.path} (odpytywanie co {self.poll_interval}s)")
+            self._run_polling()
+
+    def start(self):
+        """Uruchom obserwację w osobnym wątku"""
+        self._thread = threading.Thread(target=self.run, name='config-watcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Zatrzymaj obserwację"""
+        self.running = False
+        try:
+            os.write(self._stop_w, b'x')
+        except OSError:
+            pass
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -4,17 +4,65 @@ Strona do zarządzania karmnikiem
 http://raspberry-pi-ip:5000
 """
 
-from flask import Flask, render_template_string, request, jsonify
-import json
+from flask import Flask, Response, render_template_string, request, jsonify
+import argparse
+import logging
 import os
 import subprocess
+import time
 from datetime import datetime
+from feeder_control import ControlClient, ControlError
+from feeder_status import StatusReader, DEFAULT_STATUS_FILE
+from feeder_events import EventHub, EventStreamServer
+from feeder_store import (ConfigStore, ConflictError, schedule_tag, feeder_configs, feeder_schedules,
+                          feeder_doses, default_feeder, parse_dose, SCHEDULE_OPS)
+from feeder_rules import validate_rule
+from feeder_fleet import Fleet, load_nodes
+from feeder_metrics import Registry, sample_lines, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from feeder_http import StaticPage, PanelServer, compress_response, stream_limit, DEFAULT_THREADS
 
 app = Flask(__name__)
 
-FEEDER_DIR = '/home/admin/feeder'
+FEEDER_DIR = os.environ.get('FEEDER_DIR', '/home/admin/feeder')
 CONFIG_FILE = os.path.join(FEEDER_DIR, 'config.json')
 LOG_FILE = os.path.join(FEEDER_DIR, 'feeder.log')
+CONTROL_SOCKET = os.path.join(FEEDER_DIR, 'feeder.sock')
+# Lista innych karmników dla widoku floty: {"nazwa": "http://ip:5000", ...}
+FLEET_FILE = os.path.join(FEEDER_DIR, 'fleet.json')
+# Usługa odświeża heartbeat co 30 s
+HEARTBEAT_TIMEOUT = 90
+# Limit operacji w jednym żądaniu /api/schedules/bulk
+MAX_BULK_OPERATIONS = 100
+
+# Wspólny z usługą i feeder.sh magazyn config.json (blokada + zapis atomowy)
+store = ConfigStore(CONFIG_FILE)
+
+# Trwałe połączenie z działającym karmnikiem
+control = ControlClient(CONTROL_SOCKET)
+# Migawka stanu publikowana przez usługę w /run/feeder
+status_reader = StatusReader(DEFAULT_STATUS_FILE)
+# Jedna subskrypcja zdarzeń usługi współdzielona przez wszystkie otwarte panele
+events = EventHub(ControlClient(CONTROL_SOCKET))
+# Port EventStreamServer (strumienie poza pulą wątków serwera) albo None - wtedy /api/events
+events_port = None
+# Strumienie /api/events trzymające wątki serwera - reszta puli zostaje dla zwykłych żądań
+max_streams = stream_limit(DEFAULT_THREADS)
+
+
+# Metryki samego panelu - dopisywane pod /metrics do metryk usługi
+web_metrics = Registry()
+web_requests = web_metrics.counter('feeder_web_requests_total', 'Żądania panelu wg endpointu i kodu HTTP',
+                                   ('endpoint', 'status'))
+
+
+def create_fleet(source):
+    """Fleet dla listy węzłów (plik lub tekst) albo None, gdy tryb floty jest wyłączony"""
+    nodes = load_nodes(source)
+    return Fleet(nodes) if nodes else None
+
+
+# Widok floty - węzły z FEEDER_FLEET albo fleet.json, jeśli istnieje
+fleet = create_fleet(os.environ.get('FEEDER_FLEET') or (FLEET_FILE if os.path.exists(FLEET_FILE) else None))
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -162,6 +210,41 @@ HTML_TEMPLATE = '''
             font-size: 1em;
         }
 
+        input[type="text"] {
+            flex: 2;
+            padding: 12px;
+            border: 1px solid #ddd;
+            font-size: 1em;
+        }
+
+        input[type="number"] {
+            width: 90px;
+            padding: 12px;
+            border: 1px solid #ddd;
+            font-size: 1em;
+        }
+
+        .schedule-dose {
+            color: #666;
+            margin-left: 10px;
+        }
+
+        .schedule-item.selected {
+            background: #ffebee;
+            text-decoration: line-through;
+        }
+
+        .schedule-item.pending {
+            border-style: dashed;
+            background: #e3f2fd;
+        }
+
+        .schedule-item input[type="checkbox"] {
+            width: 20px;
+            height: 20px;
+            margin-right: 12px;
+        }
+
         .actions {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
@@ -191,8 +274,9 @@ HTML_TEMPLATE = '''
     <div class="container">
         <div class="card">
             <h1>Karmnik - Panel Sterowania</h1>
-            <p class="subtitle">Zarządzaj harmonogramem karmienia</p>
+            <p class="subtitle">Zarządzaj harmonogramem karmienia{% if fleet %} · <a href="/fleet">flota</a>{% endif %}</p>
             <div id="status-badge"></div>
+            <p class="subtitle" id="ration"></p>
 
             <div class="actions">
                 <button class="btn btn-success" onclick="testFeed()">Test Karmienia</button>
@@ -204,10 +288,29 @@ HTML_TEMPLATE = '''
         <div class="card">
             <h2 style="margin-bottom: 20px;">Harmonogram Karmienia</h2>
 
+            <div class="input-group" id="feeder-group" style="display: none;">
+                <select id="feeder" onchange="selectFeeder(this.value)"></select>
+            </div>
+
             <div class="input-group">
                 <input type="time" id="newTime" placeholder="Dodaj godzinę">
+                <input type="number" id="newDose" min="1" max="10" value="1" title="Dawka (porcje)">
                 <button class="btn btn-primary" onclick="addSchedule()">Dodaj</button>
             </div>
+            <div class="input-group">
+                <input type="text" id="newRule" placeholder="albo reguła: pn-pt 07:30, co 90m 06:00-22:00, cron 0 */4 * * *"
+                       title="Dni tygodnia, odstęp, cron i wyjątki (07:00 oprócz 12-24..12-26)">
+            </div>
+
+            <div class="input-group">
+                <button class="btn btn-secondary btn-small" id="edit-toggle" onclick="toggleEditMode()">Edytuj wiele</button>
+            </div>
+            <!-- Tryb edycji: zaznaczone godziny do usunięcia i nowe godziny wysyłane jednym żądaniem -->
+            <div class="input-group" id="edit-bar" style="display: none;">
+                <button class="btn btn-primary" onclick="applyBulk()">Zastosuj zmiany</button>
+                <button class="btn btn-secondary" onclick="toggleEditMode()">Anuluj</button>
+                <span class="schedule-dose" id="edit-summary"></span>
+            </div>
 
             <div class="schedule-list" id="schedules">
                 <div class="empty-state">Ładowanie...</div>
@@ -227,24 +330,169 @@ HTML_TEMPLATE = '''
             }, 3000);
         }
 
-        async function loadSchedules() {
+        // Strumień zdarzeń (SSE); odpytywanie tylko gdy strumień nie działa
+        let eventStream = null;
+        let streamAlive = false;
+        let pollTimer = null;
+        let schedulesTag = null;
+        let currentFeeder = null;
+
+        function feederQuery() {
+            return currentFeeder ? '?feeder=' + encodeURIComponent(currentFeeder) : '';
+        }
+
+        async function loadFeeders() {
             try {
-                const response = await fetch('/api/schedules');
+                const response = await fetch('/api/feeders');
                 const data = await response.json();
+                if (!data.success) return;
+                if (currentFeeder === null) currentFeeder = data.default;
+                const select = document.getElementById('feeder');
+                select.innerHTML = data.feeders.map(f =>
+                    `<option value="${f.id}">${f.id} (GPIO ${f.pin})</option>`).join('');
+                select.value = currentFeeder;
+                // Wybór zasobnika pokazujemy tylko przy kilku serwach
+                document.getElementById('feeder-group').style.display = data.feeders.length > 1 ? '' : 'none';
+            } catch (error) {
+                console.error('Błąd listy zasobników');
+            }
+        }
+
+        function selectFeeder(feeder) {
+            // Zaznaczenia dotyczą poprzedniego zasobnika
+            if (editMode) toggleEditMode();
+            currentFeeder = feeder;
+            schedulesTag = null;
+            loadSchedules();
+            loadRation();
+        }
+
+        // Tryb edycji wielu godzin - zmiany zbierane lokalnie i wysyłane razem do /api/schedules/bulk
+        let editMode = false;
+        let selected = new Set();
+        let pending = [];
+        let schedulesVersion = null;
+        let lastSchedules = [];
+        let lastDoses = {};
+
+        function toggleEditMode() {
+            editMode = !editMode;
+            selected = new Set();
+            pending = [];
+            document.getElementById('edit-bar').style.display = editMode ? '' : 'none';
+            document.getElementById('edit-toggle').textContent = editMode ? 'Zakończ edycję' : 'Edytuj wiele';
+            renderSchedules(lastSchedules, lastDoses);
+        }
+
+        function toggleSelected(time, checked) {
+            if (checked) selected.add(time); else selected.delete(time);
+            renderSchedules(lastSchedules, lastDoses);
+        }
+
+        function dropPending(index) {
+            pending.splice(index, 1);
+            renderSchedules(lastSchedules, lastDoses);
+        }
+
+        function renderEditList(container, schedules, doses) {
+            // Zaznaczenie znikniętych w międzyczasie godzin nie ma już czego dotyczyć
+            selected = new Set([...selected].filter(time => schedules.includes(time)));
+            const existing = schedules.slice().sort().map(time => `
+                <label class="schedule-item${selected.has(time) ? ' selected' : ''}">
+                    <span>
+                        <input type="checkbox" ${selected.has(time) ? 'checked' : ''}
+                               onchange="toggleSelected('${time}', this.checked)">
+                        <span class="schedule-time">${time}</span>
+                        ${doses[time] ? `<span class="schedule-dose">× ${doses[time]}</span>` : ''}
+                    </span>
+                </label>
+            `);
+            const added = pending.map((item, index) => `
+                <div class="schedule-item pending">
+                    <span>
+                        <span class="schedule-time">${item.time}</span>
+                        ${item.dose > 1 ? `<span class="schedule-dose">× ${item.dose}</span>` : ''}
+                        <span class="schedule-dose">nowa</span>
+                    </span>
+                    <button class="btn btn-secondary btn-small" onclick="dropPending(${index})">Cofnij</button>
+                </div>
+            `);
+            container.innerHTML = existing.concat(added).join('') ||
+                '<div class="empty-state">Brak harmonogramu. Dodaj godziny i zastosuj zmiany.</div>';
+            document.getElementById('edit-summary').textContent =
+                `do usunięcia: ${selected.size}, do dodania: ${pending.length}`;
+        }
+
+        async function applyBulk() {
+            const operations = [];
+            if (selected.size) operations.push({op: 'remove', times: [...selected]});
+            for (const item of pending) {
+                operations.push({op: 'add', time: item.time, dose: item.dose > 1 ? item.dose : null});
+            }
+            if (operations.length === 0) {
+                showToast('Brak zmian do zastosowania');
+                return;
+            }
 
-                const container = document.getElementById('schedules');
-                if (data.schedules.length === 0) {
-                    container.innerHTML = '<div class="empty-state">Brak harmonogramu. Dodaj pierwszą godzinę!</div>';
+            try {
+                const response = await fetch('/api/schedules/bulk', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({operations: operations, feeder: currentFeeder, version: schedulesVersion})
+                });
+                const data = await response.json();
+                if (data.success) {
+                    showToast(`Zastosowano: -${selected.size} +${pending.length}`);
+                    toggleEditMode();
+                    schedulesTag = null;
+                    loadSchedules();
+                } else if (response.status === 409) {
+                    // Ktoś zmienił harmonogram w międzyczasie - pokazujemy aktualny, zmiany zostają zaznaczone
+                    showToast('Harmonogram zmienił się w międzyczasie - sprawdź i zastosuj ponownie');
+                    schedulesTag = null;
+                    loadSchedules();
                 } else {
-                    container.innerHTML = data.schedules.map(time => `
-                        <div class="schedule-item">
-                            <span class="schedule-time">${time}</span>
-                            <button class="btn btn-danger btn-small" onclick="removeSchedule('${time}')">
-                                Usuń
-                            </button>
-                        </div>
-                    `).join('');
+                    showToast(data.message);
                 }
+            } catch (error) {
+                showToast('Błąd zapisu zmian');
+            }
+        }
+
+        function renderSchedules(schedules, doses) {
+            const container = document.getElementById('schedules');
+            doses = doses || {};
+            lastSchedules = schedules;
+            lastDoses = doses;
+            if (editMode) {
+                renderEditList(container, schedules, doses);
+            } else if (schedules.length === 0) {
+                container.innerHTML = '<div class="empty-state">Brak harmonogramu. Dodaj pierwszą godzinę!</div>';
+            } else {
+                container.innerHTML = schedules.slice().sort().map(time => `
+                    <div class="schedule-item">
+                        <span>
+                            <span class="schedule-time">${time}</span>
+                            ${doses[time] ? `<span class="schedule-dose">× ${doses[time]}</span>` : ''}
+                        </span>
+                        <button class="btn btn-danger btn-small" onclick="removeSchedule('${time}')">
+                            Usuń
+                        </button>
+                    </div>
+                `).join('');
+            }
+        }
+
+        async function loadSchedules() {
+            try {
+                // Odpowiedź 304 przeglądarka podmienia na zapamiętaną - nie rysujemy listy ponownie
+                const response = await fetch('/api/schedules' + feederQuery(), {cache: 'no-cache'});
+                const etag = response.headers.get('ETag');
+                if (etag !== null && etag === schedulesTag) return;
+                const data = await response.json();
+                schedulesTag = etag;
+                schedulesVersion = data.version;
+                renderSchedules(data.schedules, data.doses);
             } catch (error) {
                 showToast('Błąd wczytywania harmonogramu');
             }
@@ -252,10 +500,23 @@ HTML_TEMPLATE = '''
 
         async function addSchedule() {
             const timeInput = document.getElementById('newTime');
-            const time = timeInput.value;
+            const ruleInput = document.getElementById('newRule');
+            const time = ruleInput.value.trim() || timeInput.value;
+            const dose = parseInt(document.getElementById('newDose').value, 10) || 1;
 
             if (!time) {
-                showToast('Wybierz godzinę');
+                showToast('Wybierz godzinę lub wpisz regułę');
+                return;
+            }
+
+            if (editMode) {
+                // W trybie edycji godzina czeka na "Zastosuj zmiany"
+                if (!lastSchedules.includes(time) && !pending.some(item => item.time === time)) {
+                    pending.push({time: time, dose: dose});
+                }
+                timeInput.value = '';
+                ruleInput.value = '';
+                renderSchedules(lastSchedules, lastDoses);
                 return;
             }
 
@@ -263,14 +524,15 @@ HTML_TEMPLATE = '''
                 const response = await fetch('/api/schedules', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({time: time})
+                    body: JSON.stringify({time: time, feeder: currentFeeder, dose: dose > 1 ? dose : null})
                 });
 
                 const data = await response.json();
                 if (data.success) {
                     showToast('Dodano: ' + time);
                     timeInput.value = '';
-                    loadSchedules();
+                    ruleInput.value = '';
+                    if (!streamAlive) loadSchedules();
                 } else {
                     showToast(data.message);
                 }
@@ -284,13 +546,13 @@ HTML_TEMPLATE = '''
                 const response = await fetch('/api/schedules', {
                     method: 'DELETE',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({time: time})
+                    body: JSON.stringify({time: time, feeder: currentFeeder})
                 });
 
                 const data = await response.json();
                 if (data.success) {
                     showToast('Usunięto: ' + time);
-                    loadSchedules();
+                    if (!streamAlive) loadSchedules();
                 } else {
                     showToast(data.message);
                 }
@@ -302,12 +564,17 @@ HTML_TEMPLATE = '''
         async function testFeed() {
             showToast('Testowanie karmienia...');
             try {
-                const response = await fetch('/api/test');
+                const dose = parseInt(document.getElementById('newDose').value, 10) || 1;
+                const query = feederQuery();
+                const response = await fetch('/api/test' + query + (query ? '&' : '?') + 'portions=' + dose);
                 const data = await response.json();
-                if (data.success) {
+                if (data.success && data.queued) {
+                    // Wynik pokaże zdarzenie 'feed'
+                    showToast(`Karmienie zlecone (ok. ${Math.ceil(data.eta || 1)} s)`);
+                } else if (data.success) {
                     showToast('Test zakończony pomyślnie!');
                 } else {
-                    showToast('Test nie powiódł się');
+                    showToast(data.message === 'BUSY' ? 'Kolejka karmień pełna' : 'Test nie powiódł się');
                 }
             } catch (error) {
                 showToast('Błąd testu');
@@ -332,99 +599,613 @@ HTML_TEMPLATE = '''
             }
         }
 
-        async function loadStatus() {
+        function renderStatus(data) {
+            const badge = document.getElementById('status-badge');
+            if (data.active) {
+                let html = '<span class="status active">Aktywny</span>';
+                if (data.next_feed) {
+                    const next = new Date(data.next_feed * 1000);
+                    html += ' <span class="subtitle">Następne karmienie: ' +
+                        next.toLocaleTimeString([], {hour: '2-digit', minute: '2-digit'}) + '</span>';
+                }
+                badge.innerHTML = html;
+            } else {
+                badge.innerHTML = '<span class="status inactive">Nieaktywny</span>';
+            }
+        }
+
+        async function loadRation() {
             try {
-                const response = await fetch('/api/status');
+                const response = await fetch('/api/ration' + feederQuery());
                 const data = await response.json();
+                const today = new Date().toLocaleDateString('sv-SE');
+                const total = (data.rations || []).filter(r => r.day === today)
+                    .reduce((sum, r) => sum + r.portions, 0);
+                document.getElementById('ration').textContent = data.success ? 'Dzisiaj wydano porcji: ' + total : '';
+            } catch (error) {
+                console.error('Błąd racji');
+            }
+        }
 
-                const badge = document.getElementById('status-badge');
-                if (data.active) {
-                    badge.innerHTML = '<span class="status active">Aktywny</span>';
-                } else {
-                    badge.innerHTML = '<span class="status inactive">Nieaktywny</span>';
-                }
+        async function loadStatus() {
+            try {
+                const response = await fetch('/api/status');
+                renderStatus(await response.json());
             } catch (error) {
                 console.error('Błąd status');
             }
         }
 
-        // Auto-refresh
-        setInterval(() => {
-            loadStatus();
-        }, 5000);
+        function startPolling() {
+            if (pollTimer === null) {
+                pollTimer = setInterval(() => {
+                    loadStatus();
+                    loadSchedules();
+                }, 5000);
+            }
+        }
+
+        function stopPolling() {
+            if (pollTimer !== null) {
+                clearInterval(pollTimer);
+                pollTimer = null;
+            }
+        }
+
+        function subscribeEvents() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+
+            // Strumień z osobnego portu nie zajmuje wątków serwera panelu
+            const eventsPort = {{ events_port }};
+            eventStream = new EventSource(eventsPort
+                ? `${location.protocol}//${location.hostname}:${eventsPort}/api/events`
+                : '/api/events');
+            eventStream.onopen = () => {
+                streamAlive = true;
+                stopPolling();
+                // Nadrabiamy zmiany z czasu bez strumienia
+                loadSchedules();
+                loadStatus();
+            };
+            eventStream.onerror = () => {
+                // EventSource sam wznawia połączenie, do tego czasu odpytujemy
+                streamAlive = false;
+                startPolling();
+                if (eventStream.readyState === EventSource.CLOSED) {
+                    // Odmowa (503 - za dużo strumieni) nie jest wznawiana - spróbujemy później
+                    setTimeout(subscribeEvents, 60000);
+                }
+            };
+            eventStream.addEventListener('status', () => loadStatus());
+            eventStream.addEventListener('schedules', (e) => {
+                const data = JSON.parse(e.data);
+                if (data.feeder && currentFeeder && data.feeder !== currentFeeder) return;
+                schedulesTag = null;
+                if (editMode) {
+                    // Zdarzenie nie niesie wersji - pobieramy listę razem z nią do zapisu zbiorczego
+                    loadSchedules();
+                } else {
+                    renderSchedules(data.schedules, data.doses);
+                }
+                loadStatus();
+            });
+            eventStream.addEventListener('feed', (e) => {
+                const data = JSON.parse(e.data);
+                showToast(data.success ? 'Karmienie wykonane' : 'Karmienie nie powiodło się');
+                loadStatus();
+                loadRation();
+            });
+        }
 
         // Initial load
-        loadSchedules();
+        loadFeeders().then(() => {
+            loadSchedules();
+            loadRation();
+        });
         loadStatus();
+        subscribeEvents();
     </script>
 </body>
 </html>
 '''
 
+FLEET_TEMPLATE = '''
+<!DOCTYPE html>
+<html lang="pl">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Karmniki - Flota</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
+            background: #f5f5f5;
+            min-height: 100vh;
+            padding: 20px;
+        }
+
+        .container {
+            max-width: 1100px;
+            margin: 0 auto;
+        }
+
+        .card {
+            background: white;
+            border: 1px solid #ddd;
+            padding: 30px;
+            margin-bottom: 20px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+
+        h1 {
+            color: #333;
+            margin-bottom: 10px;
+            font-size: 2em;
+        }
+
+        .subtitle {
+            color: #666;
+            margin-bottom: 20px;
+        }
+
+        table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+
+        th, td {
+            text-align: left;
+            padding: 10px;
+            border-bottom: 1px solid #e0e0e0;
+            font-size: 0.95em;
+        }
+
+        th {
+            color: #666;
+            font-weight: 600;
+        }
+
+        .ok {
+            color: #2e7d32;
+            font-weight: 600;
+        }
+
+        .down {
+            color: #c62828;
+            font-weight: 600;
+        }
+
+        .muted {
+            color: #999;
+        }
+
+        .input-group {
+            display: flex;
+            gap: 10px;
+            margin-top: 20px;
+        }
+
+        input[type="time"] {
+            flex: 1;
+            padding: 12px;
+            border: 1px solid #ddd;
+            font-size: 1em;
+        }
+
+        button {
+            padding: 12px 24px;
+            border: 1px solid #333;
+            background: white;
+            color: #333;
+            font-size: 1em;
+            cursor: pointer;
+        }
+
+        button:hover {
+            background: #333;
+            color: white;
+        }
+
+        #result {
+            margin-top: 15px;
+            color: #666;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="card">
+            <h1>Karmniki</h1>
+            <p class="subtitle">Flota: <span id="summary">...</span> · <a href="/">ten karmnik</a></p>
+
+            <table>
+                <thead>
+                    <tr>
+                        <th><input type="checkbox" id="select-all" onchange="selectAll(this.checked)"></th>
+                        <th>Węzeł</th>
+                        <th>Stan</th>
+                        <th>Ostatnie</th>
+                        <th>Następne</th>
+                        <th>Harmonogram</th>
+                        <th>Czas</th>
+                    </tr>
+                </thead>
+                <tbody id="nodes"></tbody>
+            </table>
+
+            <div class="input-group">
+                <input type="time" id="bulkTime">
+                <button onclick="pushSchedules('add')">Dodaj</button>
+                <button onclick="pushSchedules('remove')">Usuń</button>
+            </div>
+            <div id="result"></div>
+        </div>
+    </div>
+
+    <script>
+        const selected = new Set();
+
+        function formatTime(value) {
+            return value ? new Date(value).toLocaleString('pl-PL') : '-';
+        }
+
+        function renderNodes(nodes) {
+            const names = Object.keys(nodes);
+            const up = names.filter(name => nodes[name].ok && nodes[name].result.status.active).length;
+            document.getElementById('summary').textContent = `${up}/${names.length} aktywnych`;
+
+            document.getElementById('nodes').innerHTML = names.map(name => {
+                const node = nodes[name];
+                const checked = selected.has(name) ? 'checked' : '';
+                const box = `<td><input type="checkbox" ${checked} onchange="toggleNode('${name}', this.checked)"></td>`;
+                if (!node.ok) {
+                    return `<tr>${box}<td>${name}</td><td class="down">brak odpowiedzi</td>` +
+                           `<td colspan="3" class="muted">${node.error}</td><td>-</td></tr>`;
+                }
+                const status = node.result.status;
+                const schedules = node.result.schedules.schedules || [];
+                return `<tr>${box}<td>${name}</td>` +
+                       `<td class="${status.active ? 'ok' : 'down'}">${status.active ? 'aktywny' : 'zatrzymany'}</td>` +
+                       `<td>${formatTime(status.last_feed)}</td>` +
+                       `<td>${formatTime(status.next_feed)}</td>` +
+                       `<td>${schedules.join(', ') || '-'}</td>` +
+                       `<td class="muted">${Math.round(node.elapsed * 1000)} ms</td></tr>`;
+            }).join('');
+        }
+
+        function toggleNode(name, checked) {
+            if (checked) selected.add(name); else selected.delete(name);
+        }
+
+        function selectAll(checked) {
+            document.querySelectorAll('#nodes input[type="checkbox"]').forEach(box => {
+                box.checked = checked;
+                box.onchange();
+            });
+        }
+
+        async function loadFleet() {
+            try {
+                const response = await fetch('/api/fleet', {cache: 'no-cache'});
+                const data = await response.json();
+                if (data.success) renderNodes(data.nodes);
+            } catch (error) {
+                console.error('Błąd floty');
+            }
+        }
+
+        async function pushSchedules(op) {
+            const time = document.getElementById('bulkTime').value;
+            if (!time || selected.size === 0) {
+                alert('Wybierz godzinę i węzły');
+                return;
+            }
+            const response = await fetch('/api/fleet/schedules', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({op: op, times: [time], nodes: [...selected]})
+            });
+            const data = await response.json();
+            if (!data.success) {
+                document.getElementById('result').textContent = data.message;
+                return;
+            }
+            const failed = Object.keys(data.nodes).filter(name => !data.nodes[name].ok || !data.nodes[name].result.success);
+            document.getElementById('result').textContent = failed.length
+                ? 'Nie udało się: ' + failed.join(', ')
+                : 'Zmieniono na ' + Object.keys(data.nodes).length + ' węzłach';
+            loadFleet();
+        }
+
+        loadFleet();
+        setInterval(loadFleet, 5000);
+    </script>
+</body>
+</html>
+'''
+
+
+def notify_reload(config, feeders):
+    """Poproś karmnik o jedno przeładowanie config.json po zmianie podanych zasobników"""
+    try:
+        # Bez czekania - karmnik scali to zgłoszenie ze zmianą wykrytą przez obserwatora pliku
+        control.call('reload', wait=False)
+    except ControlError:
+        # Usługa nie działa - wczyta config przy starcie, panele powiadamiamy sami
+        for feeder in feeders:
+            events.publish('schedules', {'feeder': feeder, 'schedules': sorted(feeder_schedules(config, feeder)),
+                                         'doses': feeder_doses(config, feeder)})
+
+
+def request_feeder(data=None):
+    """Identyfikator zasobnika z parametru ?feeder= lub pola "feeder" (None = domyślny)"""
+    return request.args.get('feeder') or (data or {}).get('feeder') or None
+
+
+# Strony renderowane raz (treść nie zależy od żądania) razem z wersjami gzip/brotli
+pages = {}
+
+
+def static_page(key, template, **context):
+    """Odpowiedź z gotowej strony - szablon renderowany przy pierwszym żądaniu"""
+    page = pages.get(key)
+    if page is None:
+        page = pages[key] = StaticPage(render_template_string(template, **context))
+    return page.response(request, Response)
+
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return static_page(('index', fleet is not None), HTML_TEMPLATE, fleet=fleet is not None,
+                       events_port=events_port or 0)
+
+
+@app.route('/api/events')
+def event_stream():
+    # Każdy strumień trzyma wątek serwera - ponad limit 503, strona przechodzi na odpytywanie
+    subscriber = events.subscribe(limit=max_streams)
+    if subscriber is None:
+        response = jsonify({'success': False, 'message': 'Za dużo otwartych strumieni zdarzeń'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    response = Response(events.stream(subscriber, disconnected=request.environ.get('waitress.client_disconnected')),
+                        mimetype='text/event-stream')
+    # Strumień zamknięty przed pierwszą wiadomością nie dojdzie do finally w stream()
+    response.call_on_close(lambda: events.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        return jsonify({'success': True, 'schedules': sorted(config.get('schedules', []))})
+        config = store.read()
+        feeder = request_feeder() or default_feeder(config)
+        schedules = sorted(feeder_schedules(config, feeder))
+        version = config.get('version', 0)
+        tag = schedule_tag(schedules)
+        response = jsonify({
+            'success': True,
+            'feeder': feeder,
+            'schedules': schedules,
+            'doses': feeder_doses(config, feeder),
+            'version': version,
+            'tag': tag
+        })
+        # Przeglądarka odpytuje z If-None-Match - bez zmian odpowiadamy 304 bez treści
+        response.set_etag(f"{version}-{tag}")
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 
-@app.route('/api/schedules', methods=['POST'])
-def add_schedule():
+def change_schedules(op, times, data):
+    """Dopisz zmianę harmonogramu do dziennika i powiadom karmnik"""
     try:
-        data = request.json
-        time = data.get('time')
+        if op != 'remove':
+            for feed_time in times:
+                validate_rule(feed_time)
+
+        dose = data.get('dose')
+        if dose is not None:
+            dose = parse_dose(dose)
+
+        feeder = request_feeder(data)
+        config = store.append(op, times, expected_version=data.get('version'), feeder=feeder, dose=dose)
+        feeder = feeder or default_feeder(config)
+        schedules = sorted(feeder_schedules(config, feeder))
+        doses = feeder_doses(config, feeder)
+
+        # Karmnik przeładuje harmonogram bez restartu usługi
+        notify_reload(config, [feeder])
+
+        return jsonify({'success': True, 'feeder': feeder, 'schedules': schedules, 'doses': doses,
+                        'version': config['version']})
+    except ConflictError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
-        if not time:
-            return jsonify({'success': False, 'message': 'Brak godziny'})
 
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
+def request_times(data):
+    """Godziny z żądania: {"time": "07:00"} albo {"times": [...]}"""
+    if data.get('times') is not None:
+        return list(data['times'])
+    return [data['time']] if data.get('time') else []
 
-        if time in config['schedules']:
-            return jsonify({'success': False, 'message': 'Godzina już istnieje'})
 
-        config['schedules'].append(time)
-        config['schedules'].sort()
+@app.route('/api/schedules', methods=['POST'])
+def add_schedule():
+    data = request.json or {}
+    times = request_times(data)
+    if not times:
+        return jsonify({'success': False, 'message': 'Brak godziny'})
+    return change_schedules('add', times, data)
 
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
 
-        subprocess.run(['sudo', 'systemctl', 'restart', 'feeder.service'])
+@app.route('/api/schedules', methods=['DELETE'])
+def remove_schedule():
+    data = request.json or {}
+    times = request_times(data)
+    if not times:
+        return jsonify({'success': False, 'message': 'Brak godziny'})
+    return change_schedules('remove', times, data)
+
+
+@app.route('/api/schedules', methods=['PUT'])
+def replace_schedules():
+    data = request.json or {}
+    schedules = data.get('schedules')
+    if not isinstance(schedules, list):
+        return jsonify({'success': False, 'message': 'Brak listy godzin'})
+    return change_schedules('replace', sorted(schedules), data)
+
+
+def bulk_operations(data):
+    """
+    Operacje z żądania zbiorczego sprawdzone razem - ValueError przy pierwszej błędnej.
+    Każda: {"op": "add"|"remove", "time"/"times": ..., "dose": n, "feeder": id}
+    albo {"op": "replace", "schedules": [...]}; feeder domyślnie z żądania.
+    """
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Brak listy operacji')
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise ValueError(f"Za dużo operacji naraz (maks. {MAX_BULK_OPERATIONS})")
+
+    default = request_feeder(data)
+    result = []
+    for number, operation in enumerate(operations, 1):
+        if not isinstance(operation, dict) or operation.get('op') not in SCHEDULE_OPS:
+            raise ValueError(f"Operacja {number}: nieznany rodzaj (dozwolone: {', '.join(SCHEDULE_OPS)})")
+        op = operation['op']
+        times = operation.get('schedules') if op == 'replace' else request_times(operation)
+        if not isinstance(times, list) or (not times and op != 'replace'):
+            raise ValueError(f"Operacja {number}: brak godzin")
+        try:
+            if op != 'remove':
+                for feed_time in times:
+                    validate_rule(feed_time)
+            dose = parse_dose(operation['dose']) if operation.get('dose') is not None else None
+        except ValueError as e:
+            raise ValueError(f"Operacja {number}: {e}")
+        result.append({'op': op, 'times': times, 'dose': dose, 'feeder': operation.get('feeder') or default})
+    return result
+
+
+@app.route('/api/schedules/bulk', methods=['POST'])
+def bulk_schedules():
+    """Kilka zmian harmonogramu w jednej transakcji i jednym przeładowaniu karmnika"""
+    data = request.json or {}
+    try:
+        operations = bulk_operations(data)
+        config, changed = store.apply_batch(operations, expected_version=data.get('version'))
+        if changed:
+            notify_reload(config, changed)
+        return jsonify({
+            'success': True,
+            'version': config.get('version', 0),
+            'operations': len(operations),
+            'changed': {feeder: {'schedules': sorted(feeder_schedules(config, feeder)),
+                                 'doses': feeder_doses(config, feeder)}
+                        for feeder in changed},
+        })
+    except ConflictError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
-        return jsonify({'success': True})
+
+@app.route('/api/feeders', methods=['GET'])
+def get_feeders():
+    try:
+        config = store.read()
+        feeders = feeder_configs(config)
+        return jsonify({
+            'success': True,
+            'default': default_feeder(config),
+            'feeders': [{'id': name, 'pin': settings['pin'], 'schedules': len(settings['schedules'])}
+                        for name, settings in feeders.items()]
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 
-@app.route('/api/schedules', methods=['DELETE'])
-def remove_schedule():
+@app.route('/api/history', methods=['GET'])
+def get_history():
     try:
-        data = request.json
-        time = data.get('time')
+        result = control.call(
+            'history',
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            limit=request.args.get('limit', type=int),
+            feeder=request_feeder()
+        )
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
 
-        if time in config['schedules']:
-            config['schedules'].remove(time)
+@app.route('/api/ration', methods=['GET'])
+def get_ration():
+    try:
+        result = control.call(
+            'ration',
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            feeder=request_feeder()
+        )
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@app.after_request
+def count_request(response):
+    web_requests.inc(request.endpoint or 'unknown', response.status_code)
+    return response
 
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
 
-            subprocess.run(['sudo', 'systemctl', 'restart', 'feeder.service'])
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
 
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'message': 'Godzina nie istnieje'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metryki usługi (przez gniazdo sterujące, bez forkowania systemctl) i panelu"""
+    started = time.monotonic()
+    text = ''
+    try:
+        result = control.call('metrics')
+        up = 1 if result.get('success') else 0
+        text = result.get('text', '')
+    except ControlError:
+        # Usługa nie działa - Prometheus dostaje feeder_up 0 i metryki panelu
+        up = 0
+    lines = sample_lines('feeder_up', 'gauge', 'Usługa karmnika odpowiada przez gniazdo sterujące', up)
+    lines += sample_lines('feeder_web_scrape_duration_seconds', 'gauge', 'Czas pobrania metryk z usługi',
+                          round(time.monotonic() - started, 6))
+    body = text + web_metrics.render() + '\n'.join(lines) + '\n'
+    return Response(body, content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/api/timing', methods=['GET'])
+def get_timing():
+    try:
+        return jsonify(control.call('timing'))
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -432,13 +1213,13 @@ def remove_schedule():
 @app.route('/api/test', methods=['GET'])
 def test_feed():
     try:
-        result = subprocess.run(
-            ['python3', '-c', 'from feeder_simple import SimpleFeeder; f = SimpleFeeder(); f.feed()'],
-            cwd=FEEDER_DIR,
-            capture_output=True,
-            timeout=10
-        )
-        return jsonify({'success': result.returncode == 0})
+        # Karmienie wykonuje działająca usługa - bez nowego procesu i drugiego servo.
+        # Odpowiedź od razu po przyjęciu zlecenia (duża dawka trwa dłużej niż czekanie na gniazdo),
+        # wynik przychodzi zdarzeniem 'feed'
+        result = control.call('feed', feeder=request_feeder(), portions=request.args.get('portions', type=int),
+                              wait=False)
+        return jsonify({'success': result.get('success', False), 'queued': result.get('queued', False),
+                        'eta': result.get('eta'), 'message': result.get('message')})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -455,16 +1236,106 @@ def restart_service():
 @app.route('/api/status', methods=['GET'])
 def get_status():
     try:
-        result = subprocess.run(
-            ['systemctl', 'is-active', 'feeder.service'],
-            capture_output=True,
-            text=True
-        )
-        active = result.stdout.strip() == 'active'
-        return jsonify({'success': True, 'active': active})
+        record = status_reader.read()
+        if record is not None:
+            active = time.time() - record['heartbeat'] < HEARTBEAT_TIMEOUT
+            return jsonify({
+                'success': True,
+                'active': active,
+                'next_feed': record['next_feed'] or None,
+                'last_feed': record['last_feed'] or None,
+                'last_result': record['last_result'],
+                'feeds': record['feeds'],
+                'failures': record['failures'],
+            })
+
+        # Brak migawki (np. usługa uruchomiona ręcznie) - zapytaj przez gniazdo
+        result = control.call('status')
+        return jsonify({'success': True, 'active': result.get('active', False)})
+    except ControlError:
+        # Brak odpowiedzi z gniazda - usługa nie działa
+        return jsonify({'success': True, 'active': False})
     except Exception as e:
         return jsonify({'success': False, 'active': False})
 
 
+def fleet_disabled():
+    return jsonify({'success': False, 'message': 'Tryb floty wyłączony (brak fleet.json)'}), 404
+
+
+@app.route('/fleet')
+def fleet_page():
+    if fleet is None:
+        return fleet_disabled()
+    return static_page('fleet', FLEET_TEMPLATE)
+
+
+@app.route('/api/fleet', methods=['GET'])
+def fleet_overview():
+    if fleet is None:
+        return fleet_disabled()
+    return jsonify({'success': True, 'nodes': fleet.overview(feeder=request.args.get('feeder'))})
+
+
+@app.route('/api/fleet/history', methods=['GET'])
+def fleet_history():
+    if fleet is None:
+        return fleet_disabled()
+    try:
+        nodes = request.args.get('nodes')
+        history, errors = fleet.history(
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            limit=request.args.get('limit', type=int),
+            feeder=request.args.get('feeder'),
+            names=nodes.split(',') if nodes else None
+        )
+        return jsonify({'success': True, 'history': history, 'errors': errors})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@app.route('/api/fleet/schedules', methods=['POST'])
+def fleet_push_schedules():
+    if fleet is None:
+        return fleet_disabled()
+    data = request.json or {}
+    op = data.get('op', 'add')
+    times = data.get('schedules') if op == 'replace' else request_times(data)
+    if not times and op != 'replace':
+        return jsonify({'success': False, 'message': 'Brak godziny'})
+    try:
+        for feed_time in times or []:
+            validate_rule(feed_time)
+        results = fleet.push_schedules(data.get('nodes'), op, times or [], feeder=data.get('feeder'))
+        return jsonify({'success': True, 'nodes': results})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Panel karmnika')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--fleet', help='plik JSON albo lista "nazwa=http://ip:port,..." innych karmników')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help='wątki serwera waitress (strumienie /api/events w panelu dostają najwyżej '
+                             'tyle wątków ponad zarezerwowane dla zwykłych żądań)')
+    parser.add_argument('--events-port', type=int, default=5001,
+                        help='port strumienia zdarzeń obsługiwanego jednym wątkiem (0 - /api/events w panelu)')
+    parser.add_argument('--dev', action='store_true', help='serwer deweloperski Flask zamiast waitress')
+    args = parser.parse_args()
+
+    if args.fleet:
+        fleet = create_fleet(args.fleet)
+
+    max_streams = stream_limit(args.threads)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    if args.events_port:
+        stream_server = EventStreamServer(events, args.host, args.events_port)
+        stream_server.start()
+        events_port = stream_server.port
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+    else:
+        PanelServer(app, args.host, args.port, args.threads).serve()
\ No newline at end of file
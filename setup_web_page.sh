@@ -3,13 +3,23 @@
 echo "=== Instalacja panelu web dla karmnika ==="
 echo ""
 
-# Instalacja Flask
-echo "1. Instalacja Flask..."
-pip3 install flask --break-system-packages
+# Instalacja Flask i serwera waitress (brotli opcjonalnie - mniejsza strona dla przeglądarek)
+echo "1. Instalacja Flask i waitress..."
+pip3 install flask waitress --break-system-packages
+pip3 install brotli --break-system-packages || echo "   brotli niedostępne - strona będzie kompresowana gzip"
 
 # Kopiowanie pliku
 echo "2. Kopiowanie feeder_web_page.py..."
 cp feeder_web_page.py /home/admin/feeder/
+cp feeder_control.py /home/admin/feeder/
+cp feeder_status.py /home/admin/feeder/
+cp feeder_events.py /home/admin/feeder/
+cp feeder_store.py /home/admin/feeder/
+cp feeder_scheduler.py /home/admin/feeder/
+cp feeder_rules.py /home/admin/feeder/
+cp feeder_fleet.py /home/admin/feeder/
+cp feeder_metrics.py /home/admin/feeder/
+cp feeder_http.py /home/admin/feeder/
 chmod +x /home/admin/feeder/feeder_web_page.py
 
 # Nadaj uprawnienia sudo bez hasła dla restartu usługi
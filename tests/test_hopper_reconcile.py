@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Przeładowanie config.json: zasobnik usunięty z konfiguracji znika razem z zadaniami,
+zasobnik ze zmienionym pinem powstaje od nowa (MockFactory zamiast GPIO)
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feeder_bench  # noqa: E402
+
+BEFORE = {'feeders': {'a': {'pin': 17, 'schedules': ['08:00']},
+                      'b': {'pin': 18, 'schedules': ['09:00']}}}
+AFTER = {'feeders': {'a': {'pin': 22, 'schedules': ['08:00']}}}
+
+
+class ReconcileTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        feeder_bench.install_stand_ins()
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.workdir, 'config.json')
+        self.write_config(BEFORE)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write_config(self, config):
+        with open(self.config_file, 'w') as f:
+            json.dump(config, f)
+
+    def check_reconciled(self, feeder, old):
+        self.assertEqual(set(feeder.hoppers), {'a'})
+        self.assertEqual(feeder.hoppers['a'].pin, 22)
+        self.assertIsNot(feeder.hoppers['a'], old['a'])
+        self.assertFalse(old['a'].actuator.running)
+        self.assertFalse(old['b'].actuator.running)
+        self.assertEqual(set(feeder.scheduler._jobs), {('a', '08:00')})
+
+    def test_auto_feeder_reload(self):
+        import feeder_main
+        feeder = feeder_main.AutoFeeder(config_file=self.config_file,
+                                        history_file=os.path.join(self.workdir, 'history.db'),
+                                        coalesce_window=0, pin_factory=feeder_bench.mock_factory())
+        try:
+            feeder.load_schedules()
+            self.assertEqual(set(feeder.scheduler._jobs), {('a', '08:00'), ('b', '09:00')})
+            old = dict(feeder.hoppers)
+            self.write_config(AFTER)
+            feeder.load_schedules()
+            self.check_reconciled(feeder, old)
+        finally:
+            feeder.cleanup()
+
+    def test_simple_feeder_reload(self):
+        import feeder
+        simple = feeder.SimpleFeeder(config_file=self.config_file,
+                                     control_socket=os.path.join(self.workdir, 'feeder.sock'),
+                                     history_file=os.path.join(self.workdir, 'history.db'),
+                                     coalesce_window=0, pin_factory=feeder_bench.mock_factory())
+        try:
+            old = dict(simple.hoppers)
+            self.write_config(AFTER)
+            simple.reload_config()
+            self.check_reconciled(simple, old)
+        finally:
+            simple.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Budżet szybkiego startu feeder_main: import, uruchomienie harmonogramu i RSS w osobnym procesie
+Na wolniejszej płytce czasy skaluje FEEDER_BUDGET_SCALE, np. FEEDER_BUDGET_SCALE=4 na Pi Zero
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feeder_bench  # noqa: E402
+
+BUDGET_SCALE = float(os.environ.get('FEEDER_BUDGET_SCALE', '1'))
+
+
+class StartupBudgetTest(unittest.TestCase):
+    def test_fast_start_within_budget(self):
+        results = feeder_bench.bench_startup(None, feeder_bench.STARTUP_RUNS)
+        self.assertEqual(feeder_bench.check_budget(results, BUDGET_SCALE), [])
+
+    def test_budget_violations_are_reported(self):
+        over = {
+            'startup.import': {'p50': feeder_bench.STARTUP_BUDGET['import_ms'] + 1},
+            'startup.online': {'p50': feeder_bench.STARTUP_BUDGET['online_ms'] + 1},
+            'startup.rss_mb': {'p50': feeder_bench.STARTUP_BUDGET['rss_mb'] + 1, 'modules': ['gpiozero']},
+        }
+        self.assertEqual(len(feeder_bench.check_budget(over)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()